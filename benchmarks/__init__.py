@@ -0,0 +1,6 @@
+# benchmarks/__init__.py
+"""
+上傳路徑的效能量測工具（不屬於主程式）
+
+於專案根目錄執行：python -m benchmarks.run_bench --help
+"""
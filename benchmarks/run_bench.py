@@ -0,0 +1,335 @@
+# benchmarks/run_bench.py
+"""
+量測各種上傳方式在不同資料夾形狀與網路條件下的表現
+
+範例（於專案根目錄執行）：
+    python -m benchmarks.run_bench --tree dist --rtt 20 --bandwidth 100
+    python -m benchmarks.run_bench --tree small --scale 0.1 --strategies parallel,tar --repeat 5
+
+結果存於 benchmarks/results/，並與相同條件的上一次結果比較，方便發現效能退步。
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import paramiko
+
+from benchmarks.stand_in_server import StandInServer
+from benchmarks.trees import SHAPES, cached_tree
+from deploy_sync import DeploySync
+from resumable_upload import RESUMABLE_MIN_SIZE, upload_resumable
+from sftp_uploader import ParallelUploader, plan_tree
+from ssh_transport import connect, normalize_transport
+from tar_transfer import TarUploader
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# 與上一次相比慢超過此比例時標示為退步
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(RESULTS_DIR),
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+class SkipStrategy(Exception):
+    """
+    測試資料夾不適用此上傳方式（例如沒有大檔案可測續傳）
+    """
+
+
+# ── 各種上傳方式：fn(ssh, local_dir, remote_root, workers) → (耗時, 每個檔案的耗時, 檔案數, 位元組) ──
+
+def strategy_sequential(ssh, local_dir, remote_root, workers):
+    """
+    單一 channel 逐檔 put（平行化之前的做法，也是 SftpTab.upload_file 的單檔路徑）
+    """
+    remote_dirs, files = plan_tree(local_dir, remote_root)
+    latencies = []
+    start = time.perf_counter()
+    sftp = ssh.open_sftp()
+    try:
+        for remote_dir in remote_dirs:
+            sftp.mkdir(remote_dir)
+        for local_path, remote_path, _ in files:
+            file_start = time.perf_counter()
+            sftp.put(local_path, remote_path)
+            latencies.append(time.perf_counter() - file_start)
+    finally:
+        sftp.close()
+    return time.perf_counter() - start, latencies, len(files), sum(f[2] for f in files)
+
+
+def strategy_parallel(ssh, local_dir, remote_root, workers):
+    """
+    多個 SFTP channel 並行上傳（CmdTab.upload_directory、deploy_mode full）
+    """
+    start = time.perf_counter()
+    report = ParallelUploader(ssh, workers).upload_tree(local_dir, remote_root)
+    if report.failed:
+        raise RuntimeError(f"{len(report.failed)} 個檔案上傳失敗：{report.failed[0].error}")
+    return time.perf_counter() - start, [r.elapsed for r in report.results], len(report.results), report.total_bytes
+
+
+def strategy_tar(ssh, local_dir, remote_root, workers):
+    """
+    tar.gz 單一串流（transfer_mode tar）；逐檔耗時無意義，只回傳整體耗時
+    """
+    start = time.perf_counter()
+    report = TarUploader(ssh, workers).upload_tree(local_dir, remote_root)
+    if report.failed:
+        raise RuntimeError(f"tar 串流失敗：{report.failed[0].error}")
+    elapsed = time.perf_counter() - start
+    return elapsed, [elapsed], len(report.results), report.total_bytes
+
+
+def strategy_sync_noop(ssh, local_dir, remote_root, workers):
+    """
+    差異同步在沒有任何變更時的成本（先完整同步一次，只量測第二次；位元組為 0）
+    """
+    sftp = ssh.open_sftp()
+    try:
+        first = DeploySync(ssh, sftp, workers).sync(local_dir, remote_root)
+        start = time.perf_counter()
+        result = DeploySync(ssh, sftp, workers).sync(local_dir, remote_root)
+        elapsed = time.perf_counter() - start
+        if result.report.uploaded:
+            raise RuntimeError(f"未變更卻上傳了 {len(result.report.uploaded)} 個檔案")
+        return elapsed, [elapsed], len(first.report.results), 0
+    finally:
+        sftp.close()
+
+
+def strategy_resumable(ssh, local_dir, remote_root, workers):
+    """
+    大檔案的可續傳上傳（含 sha256 驗證與改名）；只量測 RESUMABLE_MIN_SIZE 以上的檔案
+    """
+    remote_dirs, files = plan_tree(local_dir, remote_root)
+    big = [item for item in files if item[2] >= RESUMABLE_MIN_SIZE]
+    if not big:
+        raise SkipStrategy(f"沒有 {RESUMABLE_MIN_SIZE // 1024 // 1024} MB 以上的檔案")
+    latencies = []
+    start = time.perf_counter()
+    sftp = ssh.open_sftp()
+    try:
+        for remote_dir in remote_dirs:
+            sftp.mkdir(remote_dir)
+        for local_path, remote_path, _ in big:
+            latencies.append(upload_resumable(sftp, local_path, remote_path, ssh).elapsed)
+    finally:
+        sftp.close()
+    return time.perf_counter() - start, latencies, len(big), sum(f[2] for f in big)
+
+
+STRATEGIES = {
+    "sequential": strategy_sequential,
+    "parallel": strategy_parallel,
+    "tar": strategy_tar,
+    "sync_noop": strategy_sync_noop,
+    "resumable": strategy_resumable,
+}
+
+
+def run_strategy(name, server, local_dir, repeat, workers, transport=None):
+    """
+    重複執行一種上傳方式，每次上傳到全新的遠端資料夾；SSH 連線時間另外計算
+    """
+    walls = []
+    connects = []
+    latencies = []
+    files = total_bytes = 0
+    for attempt in range(repeat):
+        remote_root = f"bench/{name}-{attempt}"
+        shutil.rmtree(os.path.join(server.root, "bench"), ignore_errors=True)
+        os.makedirs(os.path.join(server.root, "bench"))
+
+        start = time.perf_counter()
+        ssh, sftp = connect("127.0.0.1", server.port, "bench", "bench", transport)
+        sftp.close()
+        connects.append(time.perf_counter() - start)
+        try:
+            elapsed, file_latencies, files, total_bytes = STRATEGIES[name](ssh, local_dir, remote_root, workers)
+            walls.append(elapsed)
+            latencies.extend(file_latencies)
+        finally:
+            ssh.close()
+
+    median = statistics.median(walls)
+    return {
+        "runs": [round(wall, 4) for wall in walls],
+        "connect_median": round(statistics.median(connects), 4),
+        "wall_median": round(median, 4),
+        "wall_min": round(min(walls), 4),
+        "files": files,
+        "bytes": total_bytes,
+        "mb_per_sec": round(total_bytes / 1024 / 1024 / median, 3) if median else 0.0,
+        "files_per_sec": round(files / median, 2) if median else 0.0,
+        "latency_p50": round(percentile(latencies, 50), 4),
+        "latency_p90": round(percentile(latencies, 90), 4),
+        "latency_p99": round(percentile(latencies, 99), 4),
+        "samples": len(latencies),
+    }
+
+
+def previous_result(current, results_dir):
+    """
+    找出相同資料夾形狀與網路條件的上一次結果
+    """
+    for path in sorted(glob.glob(os.path.join(results_dir, "*.json")), reverse=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if (data.get("tree") == current["tree"] and data.get("link") == current["link"]
+                and data.get("transport") == current["transport"]):
+            return data
+    return None
+
+
+def compare(current, previous):
+    """
+    :return: (輸出文字, 是否有退步)
+    """
+    lines = [f"📈 與 {previous['revision']}（{previous['created_at']}）比較："]
+    regressed = False
+    for name, stats in current["strategies"].items():
+        old = previous["strategies"].get(name)
+        if not old or "wall_median" not in old or "wall_median" not in stats or not old["wall_median"]:
+            continue
+        change = (stats["wall_median"] - old["wall_median"]) / old["wall_median"]
+        flag = ""
+        if change > REGRESSION_THRESHOLD:
+            flag = "  ⚠️ 退步"
+            regressed = True
+        elif change < -REGRESSION_THRESHOLD:
+            flag = "  ✅ 進步"
+        lines.append(f"   {name:<11} {old['wall_median']:.3f}s → {stats['wall_median']:.3f}s（{change:+.1%}）{flag}")
+    return "\n".join(lines), regressed
+
+
+def format_table(result):
+    lines = [
+        f"🏁 {result['tree']['shape']}（{result['tree']['files']} 檔 / "
+        f"{result['tree']['bytes'] / 1024 / 1024:.1f} MB），RTT {result['link']['rtt_ms']} ms，"
+        f"頻寬 {result['link']['bandwidth_mbps'] or '不限'} Mbit/s",
+        f"   {'方式':<11} {'中位數':>9} {'MB/秒':>9} {'檔/秒':>9} {'p50':>8} {'p90':>8} {'p99':>8}",
+    ]
+    for name, stats in result["strategies"].items():
+        if "error" in stats:
+            lines.append(f"   {name:<11} ❌ {stats['error']}")
+            continue
+        if "skipped" in stats:
+            lines.append(f"   {name:<11} ⏭ {stats['skipped']}")
+            continue
+        lines.append(
+            f"   {name:<11} {stats['wall_median']:>8.3f}s {stats['mb_per_sec']:>9.2f} {stats['files_per_sec']:>9.1f} "
+            f"{stats['latency_p50']:>8.4f} {stats['latency_p90']:>8.4f} {stats['latency_p99']:>8.4f}"
+        )
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_bench", description="上傳方式效能量測")
+    parser.add_argument("--tree", choices=sorted(SHAPES), default="dist", help="測試資料夾形狀")
+    parser.add_argument("--scale", type=float, default=1.0, help="檔案數與大小的比例（例如 0.1 快速試跑）")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES),
+                        help=f"以逗號分隔（可用：{', '.join(STRATEGIES)}）")
+    parser.add_argument("--repeat", type=int, default=3, help="每種方式重複次數，取中位數")
+    parser.add_argument("--workers", type=int, default=4, help="並行 channel 數")
+    parser.add_argument("--rtt", type=float, default=0.0, help="模擬來回延遲（毫秒）")
+    parser.add_argument("--bandwidth", type=float, default=None, help="模擬頻寬（Mbit/s）")
+    parser.add_argument("--compress", action="store_true", help="啟用 SSH 壓縮")
+    parser.add_argument("--cipher", default=None, help="指定 cipher（例如 aes128-gcm@openssh.com）")
+    parser.add_argument("--window", type=int, default=None, help="SSH channel window 大小（bytes）")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="結果存放資料夾")
+    parser.add_argument("--no-save", action="store_true", help="不儲存結果")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help=f"比上一次慢超過 {REGRESSION_THRESHOLD:.0%} 時以結束代碼 1 結束")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    names = [name.strip() for name in args.strategies.split(",") if name.strip()]
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        print(f"未知的上傳方式：{', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    try:
+        transport = normalize_transport({"compress": args.compress, "ciphers": args.cipher, "window_size": args.window})
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    print(f"📁 準備測試資料夾 {args.tree}（比例 {args.scale:g}）…", file=sys.stderr)
+    local_dir, tree_stats = cached_tree(args.tree, args.scale)
+
+    result = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "paramiko": paramiko.__version__,
+        "tree": {"shape": args.tree, "scale": args.scale, **tree_stats},
+        "link": {"rtt_ms": args.rtt, "bandwidth_mbps": args.bandwidth},
+        "transport": transport,
+        "workers": args.workers,
+        "repeat": args.repeat,
+        "strategies": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="cmd_tool_bench_") as remote_root:
+        with StandInServer(remote_root, args.rtt, args.bandwidth) as server:
+            for name in names:
+                print(f"⏱ {name}…", file=sys.stderr)
+                try:
+                    result["strategies"][name] = run_strategy(
+                        name, server, local_dir, args.repeat, args.workers, transport
+                    )
+                except SkipStrategy as e:
+                    result["strategies"][name] = {"skipped": str(e)}
+                except Exception as e:
+                    result["strategies"][name] = {"error": str(e)}
+
+    print(format_table(result))
+    regressed = False
+    previous = previous_result(result, args.results_dir)
+    if previous:
+        text, regressed = compare(result, previous)
+        print(text)
+
+    if not args.no_save:
+        os.makedirs(args.results_dir, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}_{result['revision']}_{args.tree}.json"
+        path = os.path.join(args.results_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 已儲存：{path}", file=sys.stderr)
+
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
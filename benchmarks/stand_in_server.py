@@ -0,0 +1,315 @@
+# benchmarks/stand_in_server.py
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+from paramiko import (
+    AUTH_SUCCESSFUL, OPEN_SUCCEEDED, SFTP_OK, SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+)
+
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def host_key():
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.ECDSAKey.generate()
+        return _host_key
+
+
+class _Handle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            SFTPServer.set_file_attr(self.filename, attr)
+            return SFTP_OK
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class LocalSFTP(SFTPServerInterface):
+    """
+    將 SFTP 路徑對應到本地 root 資料夾（"/" 與相對路徑都從 root 開始）
+    """
+
+    root = None
+
+    def _path(self, path):
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def canonicalize(self, path):
+        return os.path.normpath("/" + path.lstrip("/")).replace("\\", "/")
+
+    def _call(self, fn, *args):
+        try:
+            fn(*args)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def list_folder(self, path):
+        path = self._path(path)
+        try:
+            entries = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(self._path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = self._path(path)
+        try:
+            mode = getattr(attr, "st_mode", None)
+            fd = os.open(path, flags | getattr(os, "O_BINARY", 0), mode if mode is not None else 0o666)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            fmode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            fmode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            fmode = "rb"
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, fmode)
+        return handle
+
+    def remove(self, path):
+        return self._call(os.remove, self._path(path))
+
+    def rename(self, old, new):
+        if os.path.exists(self._path(new)):
+            return SFTPServer.convert_errno(17)
+        return self._call(os.rename, self._path(old), self._path(new))
+
+    def posix_rename(self, old, new):
+        return self._call(os.replace, self._path(old), self._path(new))
+
+    def mkdir(self, path, attr):
+        return self._call(os.mkdir, self._path(path))
+
+    def rmdir(self, path):
+        return self._call(os.rmdir, self._path(path))
+
+    def chattr(self, path, attr):
+        return self._call(SFTPServer.set_file_attr, self._path(path), attr)
+
+    def symlink(self, target, path):
+        return self._call(os.symlink, target, self._path(path))
+
+    def readlink(self, path):
+        try:
+            return os.readlink(self._path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """
+    接受任何帳號密碼；exec 以 sh -c 在 root 資料夾內執行（遠端路徑請使用相對路徑）
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def check_auth_password(self, username, password):
+        return AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode("utf-8")), daemon=True).start()
+        return True
+
+    def _exec(self, channel, command):
+        process = subprocess.Popen(
+            ["sh", "-c", command], cwd=self.root,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+        def feed():
+            for data in iter(lambda: channel.recv(32768), b""):
+                process.stdin.write(data)
+            process.stdin.close()
+
+        def drain_stderr():
+            for data in iter(lambda: process.stderr.read(4096), b""):
+                channel.sendall_stderr(data)
+
+        threads = [threading.Thread(target=feed, daemon=True), threading.Thread(target=drain_stderr, daemon=True)]
+        for thread in threads:
+            thread.start()
+        for data in iter(lambda: process.stdout.read(4096), b""):
+            channel.sendall(data)
+        threads[1].join()
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+
+class LinkShaper:
+    """
+    夾在 client 與 server 之間的 TCP 轉送，模擬網路延遲與頻寬
+
+    每個方向各自排隊：資料在收到後延遲 rtt/2 才送出，並依頻寬限制依序傳送，
+    因此 pipeline 的請求仍可重疊，行為接近真實的長距離連線。
+    """
+
+    def __init__(self, upstream_port, rtt_ms=0.0, bandwidth_mbps=None):
+        """
+        :param upstream_port: 實際 SSH server 的連接埠
+        :param rtt_ms: 來回延遲（毫秒）
+        :param bandwidth_mbps: 每個方向的頻寬（Mbit/s），None 表示不限制
+        """
+        self.upstream_port = upstream_port
+        self.delay = rtt_ms / 1000 / 2
+        self.bytes_per_sec = bandwidth_mbps * 1000 * 1000 / 8 if bandwidth_mbps else None
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self._closed = False
+        threading.Thread(target=self._accept, name="link-shaper", daemon=True).start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.upstream_port))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._pipe(client, upstream)
+            self._pipe(upstream, client)
+
+    def _pipe(self, source, dest):
+        pending = queue.Queue()
+
+        def reader():
+            while True:
+                try:
+                    data = source.recv(65536)
+                except OSError:
+                    data = b""
+                pending.put((time.monotonic() + self.delay, data))
+                if not data:
+                    return
+
+        def writer():
+            link_free_at = 0.0
+            while True:
+                deliver_at, data = pending.get()
+                if not data:
+                    try:
+                        dest.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        pass
+                    return
+                if self.bytes_per_sec:
+                    # 頻寬：上一段資料傳完後才開始傳這一段
+                    link_free_at = max(link_free_at, time.monotonic()) + len(data) / self.bytes_per_sec
+                    deliver_at = max(deliver_at, link_free_at)
+                wait = deliver_at - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    dest.sendall(data)
+                except OSError:
+                    return
+
+        threading.Thread(target=reader, daemon=True).start()
+        threading.Thread(target=writer, daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        self.sock.close()
+
+
+class StandInServer:
+    """
+    於同一個行程內執行的 SSH/SFTP server，供效能量測使用
+
+    用法：
+        with StandInServer("/tmp/remote", rtt_ms=20, bandwidth_mbps=100) as server:
+            ssh.connect("127.0.0.1", server.port, "bench", "bench")
+    """
+
+    def __init__(self, root, rtt_ms=0.0, bandwidth_mbps=None):
+        """
+        :param root: 模擬遠端檔案系統的本地資料夾
+        """
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.sftp_class = type("BenchSFTP", (LocalSFTP,), {"root": self.root})
+        self.sock = socket.create_server(("127.0.0.1", 0), backlog=100)
+        self.server_port = self.sock.getsockname()[1]
+        self.transports = []
+        self._closed = False
+        threading.Thread(target=self._accept, name="stand-in-sftp", daemon=True).start()
+
+        self.shaper = None
+        if rtt_ms or bandwidth_mbps:
+            self.shaper = LinkShaper(self.server_port, rtt_ms, bandwidth_mbps)
+
+    @property
+    def port(self):
+        """
+        client 應連線的連接埠（有模擬網路時為轉送的連接埠）
+        """
+        return self.shaper.port if self.shaper else self.server_port
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.add_server_key(host_key())
+            # 與 OpenSSH 相同，client 要求時才啟用壓縮
+            transport.use_compression(True)
+            transport.set_subsystem_handler("sftp", SFTPServer, self.sftp_class)
+            transport.start_server(server=_ServerInterface(self.root))
+            self.transports.append(transport)
+
+    def close(self):
+        self._closed = True
+        if self.shaper:
+            self.shaper.close()
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,93 @@
+# benchmarks/trees.py
+import json
+import os
+import random
+import shutil
+
+# 產生的測試資料夾暫存位置，相同形狀與比例只產生一次
+TREE_CACHE = os.path.join(os.path.expanduser("~"), ".cmd_tool", "bench", "trees")
+
+KB = 1024
+MB = 1024 * 1024
+
+# 資料夾形狀：(相對資料夾, 檔案數, 最小大小, 最大大小, 內容類型)
+SHAPES = {
+    # 一萬個小檔案（例如大量 i18n / icon）
+    "small": [(f"assets/group{g:03d}", 100, 1 * KB, 8 * KB, "text") for g in range(100)],
+    # 少數大檔案（影片、壓縮檔）
+    "big": [("media", 4, 64 * MB, 64 * MB, "binary")],
+    # 很深的巢狀資料夾，每層少量檔案
+    "deep": [("/".join(f"level{d:02d}" for d in range(depth + 1)), 5, 1 * KB, 16 * KB, "text")
+             for depth in range(24)],
+    # 接近 ng build 的輸出：數十個 chunk、幾個大 vendor 檔、上千個小資源
+    "dist": (
+        [("", 40, 50 * KB, 500 * KB, "text"), ("", 3, 2 * MB, 5 * MB, "text")]
+        + [(f"assets/{kind}", 250, 1 * KB, 20 * KB, "text") for kind in ("i18n", "icons", "img", "fonts")]
+    ),
+}
+
+
+def _text_blocks(rng, count=16, size=64 * KB):
+    # 類似原始碼的可壓縮內容（gzip 約 3~4 倍），讓 tar 傳輸的結果接近實際情況
+    words = ["function", "return", "const", "this", "export", "import", "=>", "{", "}", "(", ")",
+             "value", "data", "index", "component", "module", "true", "false", "null", ";"]
+    words += ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+              for _ in range(200)]
+    blocks = []
+    for _ in range(count):
+        text = " ".join(rng.choice(words) for _ in range(size // 5))
+        blocks.append(text.encode("ascii")[:size])
+    return blocks
+
+
+def _write(path, size, kind, rng, blocks):
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = min(remaining, 64 * KB)
+            f.write(rng.randbytes(chunk) if kind == "binary" else rng.choice(blocks)[:chunk])
+            remaining -= chunk
+
+
+def make_tree(shape, root, scale=1.0, seed=1):
+    """
+    在 root 下產生指定形狀的資料夾（內容以 seed 決定，可重現）
+
+    :param scale: 檔案數與大小的比例，小於 1 可快速試跑
+    :return: {"files", "bytes"}
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"未知的資料夾形狀：{shape}（可用：{', '.join(SHAPES)}）")
+    rng = random.Random(seed)
+    blocks = _text_blocks(rng)
+    files = 0
+    total = 0
+    for rel_dir, count, min_size, max_size, kind in SHAPES[shape]:
+        directory = os.path.join(root, *rel_dir.split("/")) if rel_dir else root
+        os.makedirs(directory, exist_ok=True)
+        for index in range(max(1, round(count * scale))):
+            size = max(1, int(rng.randint(min_size, max_size) * min(scale, 1.0)))
+            extension = ".bin" if kind == "binary" else ".js"
+            _write(os.path.join(directory, f"file{index:04d}{extension}"), size, kind, rng, blocks)
+            files += 1
+            total += size
+    return {"files": files, "bytes": total}
+
+
+def cached_tree(shape, scale=1.0, cache_dir=TREE_CACHE):
+    """
+    回傳已產生的資料夾路徑與統計；不存在或不完整時重新產生
+    """
+    root = os.path.join(cache_dir, f"{shape}-{scale:g}")
+    # 統計檔放在資料夾外，不會被當成要上傳的檔案
+    marker = root + ".json"
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            return root, json.load(f)
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(root, ignore_errors=True)
+    stats = make_tree(shape, root, scale)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    return root, stats
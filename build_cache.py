@@ -0,0 +1,163 @@
+# build_cache.py
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+
+# 每個工作目錄 + 指令的指紋記錄
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cmd_tool", "build_cache.json")
+# 未指定 build_inputs 時，工作目錄下所有檔案都算輸入
+DEFAULT_INPUTS = ("**/*",)
+# 套件目錄由 package-lock.json 等檔案代表即可，不逐一計算
+# （build 輸出資料夾 output_dir 不在此清單中，而是由 BuildCache.scan 走訪時另外略過）
+DEFAULT_EXCLUDE = (".git/**", "node_modules/**", ".angular/**", "__pycache__/**")
+
+_cache_lock = threading.Lock()
+
+
+def match_any(rel_path, patterns):
+    """
+    以 / 分隔的相對路徑比對 glob；"**/" 開頭的樣式也比對最上層的檔案
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatch(rel_path, pattern):
+            return True
+        if pattern.startswith("**/") and fnmatch.fnmatch(rel_path, pattern[3:]):
+            return True
+    return False
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def output_signature(output_dir):
+    """
+    build 輸出的簡易簽章（檔案數、總大小、最新修改時間），用來確認輸出未被刪除或改動
+    """
+    count = 0
+    total = 0
+    newest = 0
+    for dirpath, _, filenames in os.walk(output_dir):
+        for name in filenames:
+            stat = os.stat(os.path.join(dirpath, name))
+            count += 1
+            total += stat.st_size
+            newest = max(newest, stat.st_mtime_ns)
+    return {"files": count, "bytes": total, "mtime_ns": newest}
+
+
+class BuildCache:
+    """
+    以輸入檔案內容 + 指令字串計算指紋，指紋相同且輸出仍在時可略過 build
+
+    每個輸入檔的 sha256 會連同大小、修改時間一起記錄，下次只重新計算大小或時間有變的檔案。
+    """
+
+    def __init__(self, working_dir, command, output_dir, inputs=None, exclude=None, path=CACHE_PATH):
+        """
+        :param working_dir: 執行 build 的資料夾（cmd_working_dir）
+        :param command: build 指令（cmd_command）
+        :param output_dir: build 輸出資料夾（cmd_copy_source）
+        :param inputs: 相對於 working_dir 的 glob 清單
+        :param exclude: 要排除的 glob 清單
+        """
+        self.working_dir = os.path.abspath(working_dir)
+        self.command = command
+        self.output_dir = os.path.abspath(output_dir)
+        self.inputs = tuple(inputs or DEFAULT_INPUTS)
+        self.exclude = tuple(exclude if exclude is not None else DEFAULT_EXCLUDE)
+        self.path = path
+        self.key = f"{self.working_dir}|{command}"
+        self.fingerprint = None
+        self.files = {}
+
+    def scan(self, previous=None):
+        """
+        計算目前的輸入指紋
+
+        :param previous: 上次記錄的 {相對路徑: [size, mtime_ns, sha256]}
+        """
+        previous = previous or {}
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.working_dir):
+            rel_dir = os.path.relpath(dirpath, self.working_dir).replace("\\", "/")
+            # 輸出資料夾與排除的資料夾整個略過，不必走訪
+            dirnames[:] = [
+                d for d in dirnames
+                if os.path.join(dirpath, d) != self.output_dir
+                and not match_any(f"{d}/" if rel_dir == "." else f"{rel_dir}/{d}/", self.exclude)
+            ]
+            for name in filenames:
+                rel_path = name if rel_dir == "." else f"{rel_dir}/{name}"
+                if not match_any(rel_path, self.inputs) or match_any(rel_path, self.exclude):
+                    continue
+                full_path = os.path.join(dirpath, name)
+                stat = os.stat(full_path)
+                cached = previous.get(rel_path)
+                if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                    sha256 = cached[2]
+                else:
+                    sha256 = file_sha256(full_path)
+                files[rel_path] = [stat.st_size, stat.st_mtime_ns, sha256]
+
+        digest = hashlib.sha256(self.command.encode("utf-8"))
+        for rel_path in sorted(files):
+            digest.update(f"\0{rel_path}\0{files[rel_path][2]}".encode("utf-8"))
+        self.files = files
+        self.fingerprint = digest.hexdigest()
+        return self.fingerprint
+
+    def check(self):
+        """
+        :return: (是否可略過 build, 原因)
+        """
+        with _cache_lock:
+            entry = load_cache(self.path).get(self.key)
+        self.scan(entry.get("files") if entry else None)
+
+        if not entry:
+            return False, "沒有先前的 build 記錄"
+        if entry.get("fingerprint") != self.fingerprint:
+            return False, "輸入檔案或指令已變更"
+        if not os.path.isdir(self.output_dir):
+            return False, "build 輸出資料夾不存在"
+        if output_signature(self.output_dir) != entry.get("output"):
+            return False, "build 輸出已被改動"
+        return True, f"輸入未變更（{len(self.files)} 個檔案，指紋 {self.fingerprint[:12]}…）"
+
+    def record(self):
+        """
+        build 成功後記錄 build 前計算的指紋；build 期間若有檔案被修改，下次會重新 build
+        """
+        if self.fingerprint is None:
+            self.scan()
+        with _cache_lock:
+            cache = load_cache(self.path)
+            cache[self.key] = {
+                "fingerprint": self.fingerprint,
+                "files": self.files,
+                "output": output_signature(self.output_dir),
+            }
+            save_cache(cache, self.path)
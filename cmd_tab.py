@@ -1,24 +1,30 @@
 # cmd_tab.py
 import os
-import shutil
-import subprocess
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QLineEdit, QPushButton, QTextEdit, QFileDialog
+    QLineEdit, QPushButton, QTextEdit, QFileDialog, QCheckBox
 )
 from PyQt6.QtCore import Qt
 
+from local_copy import ParallelCopier, plan_copy
+from log_sink import LogSink
+from stream_runner import StreamingCommand
+from task_runner import shared_executor
+
 class CmdTab(QWidget):
     def __init__(self, output, sftp_tab=None):
         """
         :param output: QTextEdit，用來顯示主輸出
-        :param sftp_tab: FtpTab 實例，可使用其 FTP 上傳功能
+        :param sftp_tab: FtpTab 實例，或回傳實例的函式（分頁延後建立時），可使用其 FTP 上傳功能
         """
         super().__init__()
         self.output = output
-        self.sftp_tab = sftp_tab
+        self._sftp_tab = sftp_tab
         self.working_dir = None
+        self.tasks = []
         self.init_ui()
+        # 訊息會合併後定時寫入兩個輸出區，並同步寫入記錄檔
+        self.sink = LogSink([self.output_display, self.output], parent=self)
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -44,9 +50,14 @@ class CmdTab(QWidget):
         self.cmd_input.returnPressed.connect(self.run_command)
         layout.addWidget(self.cmd_input)
 
+        run_layout = QHBoxLayout()
         run_button = QPushButton("執行")
         run_button.clicked.connect(self.run_command)
-        layout.addWidget(run_button)
+        cancel_button = QPushButton("⏹ 取消")
+        cancel_button.clicked.connect(self.cancel_tasks)
+        run_layout.addWidget(run_button)
+        run_layout.addWidget(cancel_button)
+        layout.addLayout(run_layout)
 
         # ── 複製功能區 ──
         layout.addWidget(QLabel("📦 複製檔案或資料夾："))
@@ -81,13 +92,25 @@ class CmdTab(QWidget):
         # 按鈕：本地複製、FTP 上傳
         btn_layout = QHBoxLayout()
         copy_button = QPushButton("📋 本地複製")
-        copy_button.clicked.connect(self.copy_item)
+        copy_button.clicked.connect(lambda: self.copy_item())
+
+        dry_run_button = QPushButton("🔍 試算")
+        dry_run_button.clicked.connect(lambda: self.copy_item(dry_run=True))
+
+        # 目標已存在時只複製大小或修改時間不同的檔案
+        self.incremental_checkbox = QCheckBox("只複製變更")
 
         upload_button = QPushButton("🌐 上傳到 FTP")
         upload_button.clicked.connect(self.upload_to_ftp)
 
+        # 大量小檔案時改以 tar.gz 串流上傳，遠端沒有 tar 會自動改回逐檔上傳
+        self.tar_mode_checkbox = QCheckBox("📦 tar 壓縮傳輸")
+
         btn_layout.addWidget(copy_button)
+        btn_layout.addWidget(dry_run_button)
+        btn_layout.addWidget(self.incremental_checkbox)
         btn_layout.addWidget(upload_button)
+        btn_layout.addWidget(self.tar_mode_checkbox)
         layout.addLayout(btn_layout)
 
         # 自己區塊內部 log 輸出（可選）
@@ -112,21 +135,49 @@ class CmdTab(QWidget):
         else:
             self.log("⚠️ 請選擇一個有效的資料夾！\n")
 
+    def track(self, task):
+        """
+        記錄由此分頁排入的背景工作，供「取消」按鈕使用
+        """
+        if task is None:
+            return
+        self.tasks.append(task)
+        task.signals.cancelled.connect(lambda: self.log(f"⏹ 已取消：{task.name}\n"))
+        task.signals.done.connect(lambda: self.tasks.remove(task))
+
+    def submit(self, fn, *args, name=""):
+        executor = shared_executor()
+        if executor.pending:
+            self.log(f"⏳ 已排入佇列（前方還有 {executor.pending} 個工作）\n")
+        self.track(executor.submit(
+            fn, *args, name=name,
+            on_failed=lambda error: self.log(f"❌ {name}失敗：{error}\n")
+        ))
+
+    def cancel_tasks(self):
+        for task in self.tasks:
+            task.cancel()
+
     def run_command(self):
         cmd = self.cmd_input.text().strip()
         if not cmd:
             return
+        self.submit(self.execute_command, cmd, self.working_dir or None, name=cmd)
+        self.cmd_input.clear()
+
+    def execute_command(self, task, cmd, cwd):
+        self.log(f"> {cmd}")
         try:
-            result = subprocess.run(
-                cmd, shell=True, capture_output=True, text=True,
-                cwd=self.working_dir or None
-            )
-            output = f"> {cmd}\n{result.stdout}{result.stderr}\n"
+            # 輸出會分批即時顯示，取消時終止整個行程樹
+            result = StreamingCommand(cmd, cwd=cwd).run(self.log, task.cancel_event)
         except Exception as e:
-            output = f"執行錯誤：{e}\n"
+            self.log(f"執行錯誤：{e}\n")
+            return
 
-        self.log(output)
-        self.cmd_input.clear()
+        if result.killed:
+            self.log(f"⏹ 指令已終止（{result.elapsed:.1f} 秒）\n")
+        else:
+            self.log(f"（結束代碼 {result.returncode}，耗時 {result.elapsed:.1f} 秒）\n")
 
     def select_copy_source(self):
         path = QFileDialog.getExistingDirectory(self, "選擇來源資料夾")
@@ -138,7 +189,7 @@ class CmdTab(QWidget):
         if path:
             self.to_input.setText(path)
 
-    def copy_item(self):
+    def copy_item(self, dry_run=False):
         source = self.from_input.text().strip()
         target = self.to_input.text().strip()
 
@@ -146,22 +197,59 @@ class CmdTab(QWidget):
             self.log("⚠️ 請選擇來源與目標資料夾！\n")
             return
 
+        incremental = self.incremental_checkbox.isChecked()
+        self.submit(
+            self.execute_copy, source, target, incremental, dry_run,
+            name="試算複製" if dry_run else "本地複製"
+        )
+
+    def execute_copy(self, task, source, target, incremental=False, dry_run=False):
         try:
             dest_path = os.path.join(target, os.path.basename(source))
-            if os.path.isdir(source):
-                if os.path.exists(dest_path):
-                    self.log(f"⚠️ 目標已存在：{dest_path}。\n")
-                    return
-                shutil.copytree(source, dest_path)
-            elif os.path.isfile(source):
-                shutil.copy2(source, dest_path)
-            else:
+            if not os.path.isdir(source) and not os.path.isfile(source):
                 self.log("⚠️ 來源不是檔案也不是資料夾。\n")
                 return
-            self.log(f"✅ 複製成功：\n{source} ➡️ {dest_path}\n")
+            if os.path.isdir(source) and os.path.exists(dest_path) and not incremental:
+                self.log(f"⚠️ 目標已存在：{dest_path}。（可勾選「只複製變更」）\n")
+                return
+
+            plan = plan_copy(source, dest_path, incremental)
+            if dry_run:
+                self.log(plan.summary() + "\n")
+                return
+
+            report = ParallelCopier(cancel_event=task.cancel_event).copy(
+                plan, on_progress=self.progress_logger()
+            )
+            for result in report.failed:
+                self.log(f"❌ 複製失敗：{result.source}：{result.error}")
+            self.log(report.summary())
+            if report.cancelled:
+                self.log(f"⏹ 已取消，{len(report.cancelled)} 個檔案未複製\n")
+            elif not report.failed:
+                self.log(f"✅ 複製成功：\n{source} ➡️ {dest_path}\n")
         except Exception as e:
             self.log(f"❌ 複製失敗：{e}\n")
 
+    def progress_logger(self):
+        """
+        回傳 on_progress 函式，每 10% 輸出一次進度
+        """
+        last = [-1]
+
+        def on_progress(done, total):
+            percent = done * 100 // total if total else 100
+            if percent // 10 > last[0]:
+                last[0] = percent // 10
+                self.log(f"📋 複製進度：{percent}%（{done / 1024 / 1024:.1f} MB）")
+        return on_progress
+
+    @property
+    def sftp_tab(self):
+        if callable(self._sftp_tab):
+            self._sftp_tab = self._sftp_tab()
+        return self._sftp_tab
+
     def upload_to_ftp(self):
         if not self.sftp_tab:
             self.log("❌ 未設定 FTP 模組，無法上傳！\n")
@@ -176,27 +264,20 @@ class CmdTab(QWidget):
 
         if os.path.isdir(source):
             # 遞迴上傳資料夾
-            self.upload_directory(source, ftp_target)
+            self.track(self.upload_directory(source, ftp_target))
         else:
             # 單檔上傳
-            self.sftp_tab.upload_file(source, ftp_target)
+            self.track(self.sftp_tab.upload_file(source, ftp_target))
 
     def upload_directory(self, local_dir, remote_dir):
         """
-        遞迴上傳整個資料夾到 FTP
+        遞迴上傳整個資料夾到 FTP（由 SftpTab 以多個 channel 於背景並行處理）
         """
-        for root, dirs, files in os.walk(local_dir):
-            relative_path = os.path.relpath(root, local_dir)
-            remote_subdir = os.path.join(remote_dir, relative_path).replace("\\", "/")
-            for file in files:
-                full_local_path = os.path.join(root, file)
-                self.sftp_tab.upload_file(full_local_path, remote_subdir)
+        transfer_mode = "tar" if self.tar_mode_checkbox.isChecked() else "sftp"
+        return self.sftp_tab.upload_directory(local_dir, remote_dir, transfer_mode)
 
     def log(self, message: str):
         """
-        統一輸出到 CmdTab 的 output + 主視窗 output
+        統一輸出到 CmdTab 的 output + 主視窗 output（可於任何執行緒呼叫）
         """
-        if self.output_display:
-            self.output_display.append(message)
-        if self.output:
-            self.output.append(message)
+        self.sink.write(message)
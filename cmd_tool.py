@@ -1,44 +1,68 @@
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QTabWidget, QTextEdit, QLabel
-from cmd_tab import CmdTab
-from sftp_tab import SftpTab
-from settings_tab import SettingsTab
+import os
+import sys
+import time
 
+_started = time.perf_counter()
 
-class CMDTool(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("CMD 控制工具 - 模組化版")
-        self.resize(800, 700)
 
-        layout = QVBoxLayout()
-        self.output = QTextEdit()
-        self.output.setReadOnly(True)
+def main(argv=None):
+    """
+    程式進入點
 
-        tabs = QTabWidget()
+    無參數時啟動 GUI；``run <設定檔.json>`` 以命令列執行 JSON 自動化流程，
+    ``rollback <設定檔.json>`` 切換回前一個部署版本；``profile`` / ``queue`` 管理具名設定檔與部署佇列。
+    命令列模式不會載入 PyQt6，適合在 cron / CI 的 build agent 上使用。
 
-        # 初始化 FTP Tab，並將 output 傳入
-        self.sftp_tab = SftpTab(self.output)
+    ``--startup-profile``（或設定環境變數 CMD_TOOL_STARTUP_PROFILE）會在視窗第一次顯示後
+    輸出各階段啟動耗時；``--startup-profile=exit`` 輸出後自動結束，方便重複量測。
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in ("run", "rollback"):
+        from deploy_cli import main as cli_main
+        return cli_main(argv[1:], argv[0])
+    if argv and argv[0] in ("profile", "queue"):
+        from job_cli import main as job_main
+        return job_main(argv[1:], argv[0])
 
-        # 初始化 CMD Tab，傳入 output 及 sftp_tab 實例（用來使用 FTP 功能）
-        self.cmd_tab = CmdTab(self.output, self.sftp_tab)
+    from startup_profile import PROFILE_ENV, profile
+    profile.origin = _started
+    mode = os.environ.get(PROFILE_ENV, "")
+    for arg in argv:
+        if arg.startswith("--startup-profile"):
+            mode = arg.partition("=")[2] or "1"
+    if mode:
+        profile.enable(exit_after_report=mode == "exit")
 
-        # 初始化 Settings Tab
-        self.settings_tab = SettingsTab(self.output)
+    with profile.step("import PyQt6"):
+        from PyQt6.QtCore import QTimer
+        from PyQt6.QtWidgets import QApplication
+    with profile.step("import main_window"):
+        from main_window import CMDTool
 
-        tabs.addTab(self.cmd_tab, "CMD 控制")
-        tabs.addTab(self.sftp_tab, "SFTP 設定")
-        tabs.addTab(self.settings_tab, "json自動化 設定")
+    with profile.step("QApplication"):
+        app = QApplication(sys.argv)
+    with profile.step("CMDTool"):
+        window = CMDTool()
+    with profile.step("show"):
+        window.show()
+    if profile.enabled:
+        # 事件迴圈處理完第一次繪製後才輸出報告
+        QTimer.singleShot(0, lambda: report_startup(app, window))
+    return app.exec()
 
-        layout.addWidget(tabs)
-        layout.addWidget(QLabel("輸出結果："))
-        layout.addWidget(self.output)
 
-        self.setLayout(layout)
+def report_startup(app, window):
+    from startup_profile import profile
+
+    lines = profile.finish()
+    print("\n".join(lines), file=sys.stderr)
+    window.output.append("\n".join(lines))
+    if profile.exit_after_report:
+        app.quit()
+        return
+    # 之後延後載入的分頁 / paramiko 只輸出到 stderr（可能在背景執行緒完成，不直接操作視窗）
+    profile.on_deferred = lambda message: print(message, file=sys.stderr)
 
 
 if __name__ == "__main__":
-    import sys
-    app = QApplication(sys.argv)
-    window = CMDTool()
-    window.show()
-    sys.exit(app.exec())
+    sys.exit(main())
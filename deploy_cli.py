@@ -0,0 +1,118 @@
+# deploy_cli.py
+import argparse
+import json
+import sys
+import threading
+
+from deploy_config import load_config
+from deploy_pipeline import DeployPipeline
+from sftp_pool import shared_pool
+
+# 命令列模式的結束代碼
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_CONFIG_ERROR = 2
+EXIT_CANCELLED = 130
+
+
+def build_parser(action="run"):
+    if action == "rollback":
+        parser = argparse.ArgumentParser(
+            prog="cmd_tool.py rollback",
+            description="將每台主機切換回前一個部署版本（需使用 release 或 pipelined 模式部署）",
+        )
+    else:
+        parser = argparse.ArgumentParser(
+            prog="cmd_tool.py run",
+            description="不開啟視窗，直接執行 JSON 自動化流程（build → 清除 → 上傳）",
+        )
+    parser.add_argument("config", help="JSON 設定檔路徑（格式同 input_config.json）")
+    parser.add_argument("-o", "--output", help="另將 JSON 結果寫入此檔案")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不輸出執行過程，只輸出最後結果")
+    if action == "run":
+        parser.add_argument("--metrics", metavar="PATH", help="匯出各階段耗時統計（副檔名 .csv 或 .json）")
+    if action == "rollback":
+        parser.add_argument("--to", metavar="RELEASE", help="切換到指定版本（例如 20260101-120000）")
+    else:
+        parser.add_argument("--force-rebuild", action="store_true", help="忽略 build 快取，一定執行 cmd_command")
+        parser.add_argument("--retune", action="store_true", help="\"transport\": \"auto\" 時忽略快取，重新調校傳輸設定")
+    return parser
+
+
+def stderr_log(message):
+    sys.stderr.write(message.rstrip("\n") + "\n")
+    sys.stderr.flush()
+
+
+def emit_result(result, output_path=None):
+    """
+    結果以單一 JSON 物件輸出到 stdout（執行過程的訊息都在 stderr）
+    """
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    sys.stdout.write(text + "\n")
+    sys.stdout.flush()
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+def exit_code_for(result):
+    return {
+        "success": EXIT_OK,
+        "cancelled": EXIT_CANCELLED,
+        "config_error": EXIT_CONFIG_ERROR,
+    }.get(result.get("status"), EXIT_FAILED)
+
+
+def main(argv, action="run"):
+    """
+    :param action: run 執行部署；rollback 回復版本
+    """
+    for stream in (sys.stdout, sys.stderr):
+        # Windows 主控台編碼無法顯示 emoji 時以替代字元輸出，避免整個流程失敗
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(errors="replace")
+
+    args = build_parser(action).parse_args(argv)
+    try:
+        config = load_config(args.config)
+        if getattr(args, "force_rebuild", False):
+            config["force_rebuild"] = True
+        if getattr(args, "retune", False):
+            config["transport_retune"] = True
+    except (OSError, ValueError) as e:
+        result = {"status": "config_error", "ok": False, "error": str(e)}
+        emit_result(result, args.output)
+        return exit_code_for(result)
+
+    log = (lambda message: None) if args.quiet else stderr_log
+    cancel_event = threading.Event()
+    result = {}
+    pipeline = DeployPipeline(config, log, cancel_event)
+
+    def run():
+        try:
+            result.update(pipeline.rollback(args.to) if action == "rollback" else pipeline.run())
+        except Exception as e:
+            result.update({"status": "error", "ok": False, "error": str(e)})
+
+    # 在背景執行緒執行，讓主執行緒能接收 Ctrl+C 並通知流程取消
+    worker = threading.Thread(target=run, name="deploy-pipeline", daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.2)
+    except KeyboardInterrupt:
+        stderr_log("⏹ 收到中斷訊號，正在取消…")
+        cancel_event.set()
+        worker.join()
+    finally:
+        shared_pool.close_all()
+
+    emit_result(result, args.output)
+    if getattr(args, "metrics", None):
+        try:
+            pipeline.metrics.export(args.metrics)
+        except OSError as e:
+            stderr_log(f"⚠️ 無法匯出統計：{e}")
+    return exit_code_for(result)
@@ -0,0 +1,124 @@
+# deploy_config.py
+import json
+
+from remote_exec import normalize_commands
+from ssh_transport import normalize_transport
+from transfer_scheduler import UPLOAD_ORDERS
+
+# JSON 自動化設定的預設值
+DEFAULTS = {
+    "sftp_port": 22,
+    "sftp_workers": 4,
+    "deploy_mode": "sync",
+    "transfer_mode": "sftp",
+    "cmd_timeout": None,
+    "max_parallel_targets": 4,
+    # release / pipelined 模式保留的舊版本數
+    "keep_releases": 5,
+    # 設為 true 時，輸入未變更即略過 cmd_command（需自行確認 build 不依賴 build_inputs 以外的檔案）；
+    # force_rebuild 可強制重新 build
+    "build_cache": False,
+    "force_rebuild": False,
+    "build_inputs": None,
+    "build_exclude": None,
+    # 上傳排程：總頻寬上限（Mbit/s，所有主機共用）、自動調整並行數、檔案順序
+    "bandwidth_limit_mbps": None,
+    "adaptive_workers": False,
+    "upload_order": "walk",
+    "upload_priority": None,
+    "upload_last": None,
+    # 每台主機的 "transport" 為 "auto" 時，是否忽略快取重新調校
+    "transport_retune": False,
+    # 部署前後在每台主機執行的遠端指令；清單中的清單為同時執行的一組
+    "pre_deploy_commands": None,
+    "post_deploy_commands": None,
+    "remote_max_parallel": 4,
+}
+
+REQUIRED_KEYS = ("cmd_working_dir", "cmd_command", "cmd_copy_source")
+
+# 每台主機各自的設定；targets 中未填的欄位沿用最外層的值
+TARGET_KEYS = ("sftp_host", "sftp_port", "sftp_user", "sftp_pass", "sftp_target_path", "sftp_workers", "transport")
+REQUIRED_TARGET_KEYS = ("sftp_host", "sftp_user", "sftp_pass", "sftp_target_path")
+
+DEPLOY_MODES = ("sync", "full", "release", "pipelined")
+TRANSFER_MODES = ("sftp", "tar")
+
+
+def normalize_config(data):
+    """
+    補上預設值並檢查必要欄位，回傳新的 dict
+
+    單一主機可直接寫在最外層（sftp_host 等）；多台主機時使用 targets 清單，
+    正規化後一律展開為 config["targets"]。有 targets 時只部署清單中的主機，
+    最外層的 sftp_host 等欄位只作為各項未填欄位的預設值，本身不會被部署。
+
+    :raises ValueError: 缺少必要欄位或數值格式錯誤
+    """
+    config = dict(DEFAULTS)
+    config.update({k: v for k, v in data.items() if v not in (None, "")})
+
+    missing = [key for key in REQUIRED_KEYS if not config.get(key)]
+    if missing:
+        raise ValueError(f"設定檔缺少欄位：{', '.join(missing)}")
+
+    config["targets"] = [
+        normalize_target(config, target, index)
+        for index, target in enumerate(config.get("targets") or [{}])
+    ]
+
+    try:
+        config["max_parallel_targets"] = max(1, int(config["max_parallel_targets"]))
+        config["keep_releases"] = max(0, int(config["keep_releases"]))
+        config["remote_max_parallel"] = max(1, int(config["remote_max_parallel"]))
+        if config["cmd_timeout"] is not None:
+            config["cmd_timeout"] = float(config["cmd_timeout"])
+        if config["bandwidth_limit_mbps"] is not None:
+            config["bandwidth_limit_mbps"] = max(0.0, float(config["bandwidth_limit_mbps"]))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"設定值格式錯誤：{e}")
+
+    if config["deploy_mode"] not in DEPLOY_MODES:
+        raise ValueError(f"不支援的 deploy_mode：{config['deploy_mode']}（可用：{', '.join(DEPLOY_MODES)}）")
+    if config["transfer_mode"] not in TRANSFER_MODES:
+        raise ValueError(
+            f"不支援的 transfer_mode：{config['transfer_mode']}（可用：{', '.join(TRANSFER_MODES)}）"
+        )
+    if config["upload_order"] not in UPLOAD_ORDERS:
+        raise ValueError(
+            f"不支援的 upload_order：{config['upload_order']}（可用：{', '.join(UPLOAD_ORDERS)}）"
+        )
+    for key in ("upload_priority", "upload_last"):
+        if isinstance(config[key], str):
+            config[key] = [config[key]]
+    for key in ("pre_deploy_commands", "post_deploy_commands"):
+        config[key] = normalize_commands(config[key], key)
+    return config
+
+
+def normalize_target(config, target, index=0):
+    """
+    合併單台主機設定與最外層的預設值
+    """
+    merged = {key: config.get(key) for key in TARGET_KEYS}
+    merged.update({k: v for k, v in target.items() if v not in (None, "")})
+
+    missing = [key for key in REQUIRED_TARGET_KEYS if not merged.get(key)]
+    if missing:
+        raise ValueError(f"第 {index + 1} 個部署目標缺少欄位：{', '.join(missing)}")
+
+    try:
+        merged["sftp_port"] = int(merged["sftp_port"])
+        merged["sftp_workers"] = max(1, int(merged["sftp_workers"]))
+        merged["transport"] = normalize_transport(merged.get("transport"))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"第 {index + 1} 個部署目標設定值格式錯誤：{e}")
+    return merged
+
+
+def load_config(path):
+    """
+    讀取 JSON 設定檔並正規化
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return normalize_config(json.load(f))
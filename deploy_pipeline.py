@@ -0,0 +1,618 @@
+# deploy_pipeline.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from build_cache import BuildCache
+from deploy_sync import DeploySync
+from instrumentation import RunMetrics
+from pipelined_deploy import PipelinedUpload
+from releases import ReleaseManager
+from remote_exec import RemoteExecutor, run_command
+from sftp_pool import shared_pool
+from sftp_uploader import UploadCancelled
+from ssh_transport import describe_transport, tuned_options
+from stream_runner import StreamingCommand
+from tar_transfer import TarUploader, make_uploader
+from transfer_scheduler import TransferScheduler
+
+
+class TargetDeploy:
+    """
+    單一部署目標（一台主機）的連線與上傳
+    """
+
+    def __init__(self, config, target, log, cancel_event=None, metrics=None, scheduler=None):
+        """
+        :param config: 正規化後的完整設定
+        :param target: config["targets"] 中的一項
+        :param metrics: 共用的 RunMetrics，記錄各階段耗時
+        :param scheduler: 共用的 TransferScheduler（所有主機共用限速）
+        """
+        self.sftp_host = target["sftp_host"]
+        self.sftp_port = target["sftp_port"]
+        self.sftp_user = target["sftp_user"]
+        self.sftp_pass = target["sftp_pass"]
+        self.sftp_workers = target["sftp_workers"]
+        self.sftp_target_path = target["sftp_target_path"]
+        self.transport = target["transport"]
+        self.transport_retune = config["transport_retune"]
+        self.cmd_copy_source = config["cmd_copy_source"]
+        self.deploy_mode = config["deploy_mode"]
+        self.transfer_mode = config["transfer_mode"]
+        self.keep_releases = config["keep_releases"]
+        self.hooks = {"pre_deploy": config["pre_deploy_commands"], "post_deploy": config["post_deploy_commands"]}
+        self.remote_max_parallel = config["remote_max_parallel"]
+        self.log = log
+        self.cancel_event = cancel_event
+        self.metrics = metrics or RunMetrics("deploy")
+        self.scheduler = scheduler or TransferScheduler.from_config(config)
+        self.label = f"{self.sftp_host}:{self.sftp_port}"
+
+        self.session = None
+        self.ssh = None
+        self.sftp = None
+        self.uploader = None
+        self.status = "pending"
+        self.failed_step = None
+        self.timings = {}
+        self.upload_stats = {}
+        self.release_id = None
+
+    def timed(self, name, step):
+        start = time.monotonic()
+        try:
+            ok = step()
+        finally:
+            elapsed = time.monotonic() - start
+            self.timings[name] = round(elapsed, 3)
+        self.metrics.add_stage(name, elapsed, bool(ok), self.label)
+        if not ok:
+            self.status = "failed"
+            # 巢狀步驟（例如 upload 中的 pre_deploy）保留最內層的失敗步驟
+            self.failed_step = self.failed_step or name
+        return ok
+
+    def result(self):
+        return {
+            "host": self.sftp_host,
+            "port": self.sftp_port,
+            "target": self.sftp_target_path,
+            "status": self.status,
+            "ok": self.status == "success",
+            "failed_step": self.failed_step,
+            "elapsed": round(sum(self.timings.values()), 3),
+            "timings": self.timings,
+            "upload": self.upload_stats,
+            "release": self.release_id,
+        }
+
+    def connect_ssh(self):
+        try:
+            if self.transport == "auto":
+                self.transport = tuned_options(
+                    self.sftp_host, self.sftp_port, self.sftp_user, self.sftp_pass,
+                    self.cmd_copy_source, self.log, self.transport_retune
+                )
+                self.log(describe_transport(self.transport) + "\n")
+            self.session = shared_pool.acquire(
+                self.sftp_host,
+                self.sftp_port,
+                self.sftp_user,
+                self.sftp_pass,
+                self.transport
+            )
+            self.ssh = self.session.ssh
+            self.sftp = self.session.sftp
+            self.log(f"✅ SSH & SFTP 連線成功（port: {self.sftp_port}）\n")
+            return True
+        except Exception as e:
+            self.log(f"❌ SSH/SFTP 連線失敗：{e}\n")
+            return False
+
+    def release_ssh(self):
+        if self.session is not None:
+            shared_pool.release(self.session)
+        self.session = None
+        self.ssh = None
+        self.sftp = None
+
+    def remote_cleanup_and_upload(self):
+        if self.deploy_mode == "sync":
+            return self.remote_sync()
+        if self.deploy_mode == "release":
+            return self.remote_release()
+
+        cleanup_cmd = f"rm -rf {self.sftp_target_path}/pspf"
+        if not self.run_remote_command(cleanup_cmd, "🗑️ 刪除遠端 pspf 資料夾", stage="cleanup"):
+            return False
+        self.session.dir_cache.forget(f"{self.sftp_target_path}/pspf")
+
+        mkdir_cmd = f"mkdir -p {self.sftp_target_path}"
+        if not self.run_remote_command(mkdir_cmd, "✅ 建立遠端目標資料夾", stage="mkdir"):
+            return False
+        self.session.dir_cache.learn(self.sftp_target_path)
+
+        try:
+            report = self.upload_folder_sftp(self.cmd_copy_source, self.sftp_target_path)
+            self.record_upload(report)
+            self.log_transfer_mode(self.uploader)
+            self.log(report.summary() + "\n")
+            if report.failed:
+                self.log(f"❌ 有 {len(report.failed)} 個檔案上傳失敗\n")
+                return False
+            self.log(f"✅ 資料夾已透過 SFTP 上傳至遠端：{self.sftp_target_path}\n")
+            return True
+        except Exception as e:
+            self.log(f"❌ SFTP 上傳失敗：{e}\n")
+            return False
+
+    def remote_sync(self):
+        mkdir_cmd = f"mkdir -p {self.sftp_target_path}"
+        if not self.run_remote_command(mkdir_cmd, "✅ 建立遠端目標資料夾", stage="mkdir"):
+            return False
+        self.session.dir_cache.learn(self.sftp_target_path)
+
+        # target_root 已是 release 模式的 symlink 時，直接同步會改動保留中的版本（回復時不再是原本內容）
+        current = ReleaseManager(self.ssh, self.sftp, self.target_root(), self.keep_releases).current()
+        if current:
+            self.log(f"⚠️ {self.target_root()} 目前指向版本 {current}，改以 release 模式部署成新版本\n")
+            return self.remote_release()
+
+        try:
+            if not self.sync_into(self.target_root()):
+                return False
+            self.log(f"✅ 資料夾已同步至遠端：{self.target_root()}\n")
+            return True
+        except Exception as e:
+            self.log(f"❌ SFTP 同步失敗：{e}\n")
+            return False
+
+    def sync_into(self, remote_root):
+        syncer = DeploySync(
+            self.ssh, self.sftp, self.sftp_workers, self.cancel_event, self.transfer_mode, self.session.dir_cache,
+            self.scheduler
+        )
+        result = syncer.sync(self.cmd_copy_source, remote_root, self.log_upload_result)
+        for name, elapsed in result.timings.items():
+            self.metrics.add_stage(f"sync_{name}", elapsed, target=self.label)
+        self.log_transfer_mode(syncer.uploader)
+        self.record_upload(result.report, skipped=result.skipped, deleted=len(result.deleted))
+        self.log(result.summary() + "\n")
+        self.log(result.report.summary() + "\n")
+        if result.failed:
+            self.log(f"❌ 有 {len(result.failed)} 個檔案上傳失敗\n")
+            return False
+        return True
+
+    def remote_release(self):
+        """
+        上傳到新的版本資料夾（以目前版本為基礎差異同步），完成後才切換 symlink
+        """
+        manager = ReleaseManager(self.ssh, self.sftp, self.target_root(), self.keep_releases)
+        release_id = manager.new_release_id()
+        try:
+            path, seeded = manager.prepare(release_id)
+            self.log(f"📁 建立新版本 {release_id}{'（複製目前版本為基礎）' if seeded else ''}\n")
+            ok = self.sync_into(path)
+            if not ok or (self.cancel_event is not None and self.cancel_event.is_set()):
+                self.log(f"⚠️ 未完成，刪除新版本 {release_id}，維持目前版本\n")
+                manager.remove(release_id)
+                return False
+            self.activate_release(manager, release_id)
+            return True
+        except Exception as e:
+            self.log(f"❌ 版本部署失敗：{e}\n")
+            manager.remove(release_id)
+            return False
+
+    def activate_release(self, manager, release_id):
+        """
+        切換到新版本並清除超過保留數量的舊版本
+        """
+        previous = manager.current()
+        migrated = manager.activate(release_id)
+        self.release_id = release_id
+        if migrated:
+            self.log(f"📦 原本的資料夾已保留為版本 {migrated}\n")
+        self.log(f"🔀 {manager.root} ➜ {release_id}（前一版：{previous or migrated or '無'}）\n")
+        try:
+            removed = manager.prune()
+            if removed:
+                self.log(f"🧹 已刪除舊版本：{', '.join(removed)}\n")
+        except Exception as e:
+            self.log(f"⚠️ 清除舊版本失敗：{e}\n")
+
+    def rollback(self, release_id=None):
+        manager = ReleaseManager(self.ssh, self.sftp, self.target_root(), self.keep_releases)
+        try:
+            previous, current = manager.rollback(release_id)
+            self.release_id = current
+            self.log(f"↩️ {manager.root} ➜ {current}（原本：{previous or '一般資料夾'}）\n")
+            return True
+        except Exception as e:
+            self.log(f"❌ 回復版本失敗：{e}\n")
+            return False
+
+    def target_root(self):
+        """
+        遠端實際放置檔案的資料夾（目標路徑 + 來源資料夾名稱，例如 .../dist/pspf）
+        """
+        folder_name = os.path.basename(self.cmd_copy_source.rstrip("/\\"))
+        return os.path.join(self.sftp_target_path, folder_name).replace("\\", "/")
+
+    def record_upload(self, report, skipped=0, deleted=0):
+        self.upload_stats = {
+            "uploaded": len(report.uploaded),
+            "failed": len(report.failed),
+            "skipped": skipped,
+            "deleted": deleted,
+            "bytes": report.total_bytes,
+            "elapsed": round(report.elapsed, 3),
+            "failed_files": [r.local_path for r in report.failed],
+        }
+        if len(report.workers_history) > 1:
+            self.upload_stats["workers_history"] = report.workers_history
+            self.log(f"🎚 並行數調整：{' → '.join(map(str, report.workers_history))}\n")
+        self.metrics.record_upload(report, self.label)
+
+    def run_remote_command(self, command, description="執行指令", stage="remote_command"):
+        """
+        執行遠端指令，輸出逐行寫入 log；結束代碼為 0 才算成功
+        """
+        def on_output(stream, line):
+            self.log(f"  {'│' if stream == 'stdout' else '!'} {line}\n")
+
+        result = run_command(self.ssh, command, timeout=None, on_output=on_output, cancel_event=self.cancel_event)
+        self.metrics.add_stage(stage, result.elapsed, result.ok, self.label)
+        if result.ok:
+            self.log(f"{description} 成功\n")
+        elif result.error is not None:
+            self.log(f"❌ 遠端指令失敗：{command} - {result.error}\n")
+        else:
+            self.log(f"❌ 遠端指令失敗：{command}（結束代碼 {result.exit_status}）\n")
+        return result.ok
+
+    def run_hooks(self, phase):
+        """
+        執行 pre_deploy / post_deploy 遠端指令：各組依序執行，同一組內的指令在同一條 SSH 連線上同時執行
+
+        :return: 沒有設定指令，或所有不允許失敗的指令都成功時為 True
+        """
+        groups = self.hooks[phase]
+        if not groups:
+            return True
+        count = sum(len(items) for items in groups)
+        self.log(f"🔧 執行{'部署前' if phase == 'pre_deploy' else '部署後'}遠端指令（{count} 個）\n")
+        executor = RemoteExecutor(self.ssh, self.remote_max_parallel, self.log, self.cancel_event)
+        ok, results = executor.run_groups(groups)
+        self.upload_stats[f"{phase}_commands"] = [
+            {
+                "name": r.name,
+                "exit_status": r.exit_status,
+                "elapsed": round(r.elapsed, 3),
+                "timed_out": r.timed_out,
+            }
+            for r in results
+        ]
+        return ok
+
+    def run_pre_commit_hooks(self):
+        """
+        pipelined 模式切換版本前執行部署前指令（耗時計入 upload 步驟）
+        """
+        ok = self.run_hooks("pre_deploy")
+        if not ok:
+            self.failed_step = "pre_deploy"
+        return ok
+
+    def upload_folder_sftp(self, local_path, remote_path):
+        folder_name = os.path.basename(local_path.rstrip("/\\"))
+        target_root = os.path.join(remote_path, folder_name).replace("\\", "/")
+
+        # sftp：建立所有資料夾後以多個 channel 並行上傳；tar：壓縮成單一串流於遠端解開
+        self.uploader = make_uploader(
+            self.ssh, self.sftp_workers, self.cancel_event, self.transfer_mode, self.session.dir_cache, self.scheduler
+        )
+        return self.uploader.upload_tree(local_path, target_root, self.log_upload_result)
+
+    def log_transfer_mode(self, uploader):
+        if not isinstance(uploader, TarUploader):
+            return
+        if uploader.fell_back:
+            self.log("⚠️ 遠端沒有 tar，已改用 SFTP 逐檔上傳\n")
+        elif uploader.stream_sha256:
+            verified = "與遠端計算結果一致" if uploader.stream_verified else "遠端沒有 sha256sum，未比對"
+            self.log(
+                f"📦 tar.gz 串流 {uploader.stream_bytes / 1024 / 1024:.2f} MB，"
+                f"sha256 {uploader.stream_sha256[:16]}…（{verified}），解開的檔案清單核對通過\n"
+            )
+
+    def log_upload_result(self, result):
+        if isinstance(result.error, UploadCancelled):
+            return
+        if result.ok:
+            self.log(f"📤 上傳：{result.local_path} ➜ {result.remote_path}\n")
+        else:
+            self.log(f"❌ 上傳失敗：{result.local_path} ➜ {result.remote_path}：{result.error}\n")
+
+
+class DeployPipeline:
+    """
+    JSON 自動化部署流程：連線 → 切換資料夾 → build（只執行一次）→ 並行清除並上傳到每台主機
+
+    不依賴 Qt，可由 SettingsTab 的背景工作或命令列（python cmd_tool.py run）執行。
+    """
+
+    def __init__(self, config, log=None, cancel_event=None):
+        """
+        :param config: deploy_config.normalize_config() 的結果
+        :param log: 接收訊息的函式，可於任何執行緒呼叫
+        :param cancel_event: threading.Event，設定後於下一個步驟前中止
+        """
+        self.config = config
+        self.log = log or (lambda message: None)
+        self.cancel_event = cancel_event
+
+        self.cmd_working_dir = config["cmd_working_dir"]
+        self.cmd_command = config["cmd_command"]
+        self.cmd_timeout = config["cmd_timeout"]
+        self.max_parallel_targets = config["max_parallel_targets"]
+        self.build_cached = False
+        self.metrics = RunMetrics("deploy")
+        self.scheduler = TransferScheduler.from_config(config)
+
+        multi = len(config["targets"]) > 1
+        self.targets = [
+            TargetDeploy(
+                config, target, self.target_log(target) if multi else self.log, cancel_event, self.metrics,
+                self.scheduler
+            )
+            for target in config["targets"]
+        ]
+        self.steps = []
+
+    @property
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def target_log(self, target):
+        prefix = f"[{target['sftp_host']}:{target['sftp_port']}] "
+        return lambda message: self.log(prefix + message)
+
+    def for_each_target(self, name, step, targets):
+        """
+        以 max_parallel_targets 為上限，同時對多台主機執行 step，回傳成功的目標
+        """
+        with ThreadPoolExecutor(max_workers=self.max_parallel_targets, thread_name_prefix="deploy-target") as pool:
+            results = list(pool.map(lambda t: t.timed(name, lambda: step(t)), targets))
+        return [t for t, ok in zip(targets, results) if ok]
+
+    def add_step(self, name, ok, step_start):
+        """
+        記錄整體流程的一個步驟（各主機的細項由 TargetDeploy 記錄）
+        """
+        elapsed = time.monotonic() - step_start
+        self.steps.append({"name": name, "ok": ok, "elapsed": round(elapsed, 3)})
+        if name in ("chdir", "build"):
+            extra = {"cached": self.build_cached} if name == "build" else {}
+            self.metrics.add_stage(name, elapsed, ok, **extra)
+
+    def run(self):
+        """
+        執行完整流程
+
+        :return: 可直接輸出成 JSON 的結果 dict
+        """
+        start = time.monotonic()
+        failed_step = None
+        if not self.scheduler.is_default:
+            self.log(self.scheduler.describe() + "\n")
+        try:
+            # 先連線所有主機，全部失敗時不必 build
+            step_start = time.monotonic()
+            active = self.for_each_target("connect", TargetDeploy.connect_ssh, self.targets)
+            self.add_step("connect", len(active) == len(self.targets), step_start)
+            if not active:
+                failed_step = "connect"
+            pipelined = self.config["deploy_mode"] == "pipelined"
+            for name, step in (
+                ("chdir", self.change_working_directory),
+                ("build", lambda: self.run_pipelined(active) if pipelined else self.run_cmd_command()),
+            ):
+                if failed_step or self.cancelled:
+                    break
+                step_start = time.monotonic()
+                ok = step()
+                self.add_step(name, ok, step_start)
+                if not ok:
+                    failed_step = name
+
+            if not failed_step and not self.cancelled and not pipelined:
+                ready = active
+                if self.config["pre_deploy_commands"]:
+                    step_start = time.monotonic()
+                    ready = self.for_each_target("pre_deploy", lambda t: t.run_hooks("pre_deploy"), active)
+                    self.add_step("pre_deploy", len(ready) == len(self.targets), step_start)
+                step_start = time.monotonic()
+                done = self.for_each_target("upload", TargetDeploy.remote_cleanup_and_upload, ready)
+                for target in done:
+                    target.status = "success"
+                self.add_step("upload", len(done) == len(self.targets), step_start)
+
+            deployed = [t for t in self.targets if t.status == "success"]
+            if self.config["post_deploy_commands"] and deployed and not self.cancelled:
+                step_start = time.monotonic()
+                done = self.for_each_target("post_deploy", lambda t: t.run_hooks("post_deploy"), deployed)
+                self.add_step("post_deploy", len(done) == len(self.targets), step_start)
+        finally:
+            # 將連線歸還共用連線池，供下次套用或 CMD 上傳重複使用
+            for target in self.targets:
+                target.release_ssh()
+
+        succeeded = [t for t in self.targets if t.status == "success"]
+        if self.cancelled:
+            status = "cancelled"
+            self.log("⏹ 已取消套用設定\n")
+        elif failed_step or not succeeded:
+            status = "failed"
+        elif len(succeeded) < len(self.targets):
+            status = "partial"
+        else:
+            status = "success"
+
+        for target in self.targets:
+            if target.status == "pending":
+                target.status = "cancelled" if self.cancelled else "skipped"
+        self.log_target_report()
+        self.metrics.finish(status)
+        self.metrics.save_history()
+        self.log("\n".join(self.metrics.summary_lines()) + "\n")
+        if status == "success":
+            self.log("✅ 設定已成功套用！\n")
+
+        return {
+            "status": status,
+            "ok": status == "success",
+            "failed_step": failed_step,
+            "deploy_mode": self.config["deploy_mode"],
+            "build_cached": self.build_cached,
+            "elapsed": round(time.monotonic() - start, 3),
+            "steps": self.steps,
+            "targets": [t.result() for t in self.targets],
+            "metrics": self.metrics.to_dict(),
+        }
+
+    def rollback(self, release_id=None):
+        """
+        將每台主機切換回前一個版本（或指定版本），不執行 build 也不上傳
+
+        :return: 格式同 run() 的結果 dict
+        """
+        start = time.monotonic()
+        try:
+            active = self.for_each_target("connect", TargetDeploy.connect_ssh, self.targets)
+            done = self.for_each_target("rollback", lambda t: t.rollback(release_id), active)
+            for target in done:
+                target.status = "success"
+        finally:
+            for target in self.targets:
+                target.release_ssh()
+
+        if not done:
+            status = "failed"
+        elif len(done) < len(self.targets):
+            status = "partial"
+        else:
+            status = "success"
+        self.log_target_report()
+        if status == "success":
+            self.log("✅ 已回復版本！\n")
+        return {
+            "status": status,
+            "ok": status == "success",
+            "action": "rollback",
+            "elapsed": round(time.monotonic() - start, 3),
+            "targets": [t.result() for t in self.targets],
+        }
+
+    def log_target_report(self):
+        if len(self.targets) < 2:
+            return
+        lines = ["📋 各主機部署結果："]
+        for target in self.targets:
+            result = target.result()
+            icon = "✅" if result["ok"] else "❌"
+            failed = f"，失敗步驟：{result['failed_step']}" if result["failed_step"] else ""
+            lines.append(
+                f"{icon} {result['host']}:{result['port']} {result['status']}，"
+                f"耗時 {result['elapsed']:.1f} 秒{failed}"
+            )
+        self.log("\n".join(lines) + "\n")
+
+    def build_cache(self):
+        """
+        未停用快取時回傳 BuildCache；指紋計算失敗時不使用快取
+        """
+        if not self.config["build_cache"]:
+            return None
+        return BuildCache(
+            self.cmd_working_dir, self.cmd_command, self.config["cmd_copy_source"],
+            self.config["build_inputs"], self.config["build_exclude"]
+        )
+
+    def check_build_cache(self, cache):
+        if self.config["force_rebuild"]:
+            self.log("🔨 強制重新 build\n")
+            return False
+        try:
+            hit, reason = cache.check()
+        except OSError as e:
+            self.log(f"⚠️ 無法計算 build 指紋，將重新 build：{e}\n")
+            return False
+        if hit:
+            self.log(f"♻️ {reason}，略過 build，沿用既有輸出：{self.config['cmd_copy_source']}\n")
+        else:
+            self.log(f"🔨 {reason}，執行 build\n")
+        return hit
+
+    def run_pipelined(self, active):
+        """
+        pipelined 模式：build 的同時把已完成的檔案上傳到各主機的暫存資料夾，
+        build 成功後補傳剩下的檔案並切換資料夾；build 失敗時保留原本的遠端資料夾
+        """
+        stager = PipelinedUpload(
+            active, self.config["cmd_copy_source"], self.log, self.cancel_event, self.max_parallel_targets
+        )
+        stager.start()
+        build_ok = False
+        try:
+            build_ok = self.run_cmd_command()
+        finally:
+            step_start = time.monotonic()
+            # 部署前遠端指令在各主機補傳完成、切換版本前執行
+            done = stager.finish(build_ok, TargetDeploy.run_pre_commit_hooks)
+        for target in done:
+            target.status = "success"
+        if build_ok:
+            self.add_step("upload", len(done) == len(self.targets), step_start)
+        return build_ok
+
+    def run_cmd_command(self):
+        cache = self.build_cache()
+        if cache is not None and self.check_build_cache(cache):
+            self.build_cached = True
+            return True
+
+        self.log(f"> {self.cmd_command}")
+        try:
+            runner = StreamingCommand(self.cmd_command, cwd=self.cmd_working_dir, timeout=self.cmd_timeout)
+            result = runner.run(self.log, self.cancel_event)
+            if result.timed_out:
+                self.log(f"❌ CMD 指令逾時（{self.cmd_timeout} 秒），已終止\n")
+                return False
+            if result.killed:
+                self.log("⏹ CMD 指令已終止\n")
+                return False
+            if result.returncode != 0:
+                self.log(f"❌ CMD 指令失敗（結束代碼 {result.returncode}），停止部署\n")
+                return False
+            self.log(f"✅ CMD 指令完成（耗時 {result.elapsed:.1f} 秒）\n")
+            if cache is not None:
+                try:
+                    cache.record()
+                except OSError as e:
+                    self.log(f"⚠️ 無法寫入 build 快取：{e}\n")
+            return True
+        except Exception as e:
+            self.log(f"❌ 執行 CMD 指令時發生錯誤：{e}\n")
+            return False
+
+    def change_working_directory(self):
+        try:
+            os.chdir(self.cmd_working_dir)
+            self.log(f"✅ 切換至資料夾：{self.cmd_working_dir}\n")
+            return True
+        except Exception:
+            self.log(f"❌ 找不到資料夾：{self.cmd_working_dir}\n")
+            return False
@@ -0,0 +1,263 @@
+# deploy_sync.py
+import hashlib
+import json
+import os
+import posixpath
+import stat
+import time
+
+from remote_cache import RemoteDirCache
+from sftp_uploader import plan_tree
+from tar_transfer import make_uploader
+
+# 存放於遠端部署資料夾內的檔案清單
+MANIFEST_NAME = ".deploy_manifest.json"
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_local(local_dir):
+    """
+    掃描本地資料夾，回傳 {相對路徑: {"size", "mtime"}}（相對路徑一律使用 /）
+    """
+    entries = {}
+    for root, dirs, files in os.walk(local_dir):
+        for name in files:
+            local_file = os.path.join(root, name)
+            rel_path = os.path.relpath(local_file, local_dir).replace("\\", "/")
+            if rel_path == MANIFEST_NAME:
+                continue
+            st = os.stat(local_file)
+            entries[rel_path] = {"size": st.st_size, "mtime": int(st.st_mtime)}
+    return entries
+
+
+def read_remote_manifest(sftp, remote_root):
+    """
+    讀取遠端清單；找不到時回傳 None
+    """
+    try:
+        with sftp.open(posixpath.join(remote_root, MANIFEST_NAME), "r") as f:
+            return json.loads(f.read().decode("utf-8"))["files"]
+    except (IOError, ValueError, KeyError):
+        return None
+
+
+def scan_remote(sftp, remote_root):
+    """
+    以 listdir_attr 重建遠端清單（沒有雜湊值，只有 size/mtime）
+
+    :return: (files, dirs)；遠端資料夾不存在時回傳 ({}, [])
+    """
+    files = {}
+    dirs = []
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            entries = sftp.listdir_attr(posixpath.join(remote_root, rel_dir) if rel_dir else remote_root)
+        except IOError:
+            continue
+        for attr in entries:
+            rel_path = posixpath.join(rel_dir, attr.filename) if rel_dir else attr.filename
+            if stat.S_ISDIR(attr.st_mode or 0):
+                dirs.append(rel_path)
+                pending.append(rel_path)
+            elif rel_path != MANIFEST_NAME:
+                files[rel_path] = {"size": attr.st_size, "mtime": int(attr.st_mtime or 0)}
+    return files, dirs
+
+
+def verify_sizes(sftp, results):
+    """
+    每個資料夾一次 listdir_attr，確認上傳後的遠端檔案大小與本地相同；不符或找不到的檔案改為失敗
+
+    :param results: 成功上傳的 FileResult 清單
+    :return: 大小不符的 FileResult 清單
+    """
+    by_dir = {}
+    for item in results:
+        by_dir.setdefault(posixpath.dirname(item.remote_path), []).append(item)
+    mismatched = []
+    for remote_dir, items in by_dir.items():
+        try:
+            sizes = {attr.filename: attr.st_size for attr in sftp.listdir_attr(remote_dir)}
+        except IOError:
+            sizes = {}
+        for item in items:
+            remote_size = sizes.get(posixpath.basename(item.remote_path))
+            if remote_size != item.size:
+                item.error = IOError(f"大小不符：遠端 {remote_size} bytes，預期 {item.size} bytes")
+                mismatched.append(item)
+    return mismatched
+
+
+def write_remote_manifest(sftp, remote_root, files):
+    """
+    先寫入暫存檔再改名，避免中斷時留下不完整的清單
+    """
+    manifest_path = posixpath.join(remote_root, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with sftp.open(tmp_path, "w") as f:
+        f.write(json.dumps({"version": 1, "files": files}, ensure_ascii=False))
+    sftp.posix_rename(tmp_path, manifest_path)
+
+
+class SyncResult:
+    """
+    一次差異同步的結果
+    """
+
+    def __init__(self):
+        self.report = None
+        self.skipped = 0
+        self.deleted = []
+        self.manifest_source = "manifest"
+        # 各階段耗時（秒）：scan 比對清單、verify 核對遠端大小、delete 刪除過期檔案、manifest 寫入清單
+        self.timings = {}
+
+    @property
+    def failed(self):
+        return self.report.failed if self.report else []
+
+    def summary(self):
+        uploaded = len(self.report.uploaded) if self.report else 0
+        return (
+            f"🔁 差異同步：上傳 {uploaded} 個、略過 {self.skipped} 個未變更、"
+            f"刪除 {len(self.deleted)} 個過期檔案（遠端清單來源：{self.manifest_source}）"
+        )
+
+
+class DeploySync:
+    """
+    比對本地與遠端清單，只上傳新增/變更的檔案並刪除遠端多餘的檔案
+    """
+
+    def __init__(self, ssh, sftp, workers=4, cancel_event=None, transfer_mode="sftp", dir_cache=None,
+                 scheduler=None):
+        self.ssh = ssh
+        self.sftp = sftp
+        self.workers = workers
+        self.cancel_event = cancel_event
+        self.transfer_mode = transfer_mode
+        self.dir_cache = dir_cache if dir_cache is not None else RemoteDirCache()
+        self.scheduler = scheduler
+        self.uploader = None
+
+    def diff(self, local_dir, local_files, remote_files, has_hash):
+        """
+        :return: (changed, unchanged)；unchanged 為 {相對路徑: 清單項目}
+        """
+        changed = []
+        unchanged = {}
+        for rel_path, entry in local_files.items():
+            remote = remote_files.get(rel_path)
+            if remote is None or remote.get("size") != entry["size"]:
+                changed.append(rel_path)
+            elif remote.get("mtime") == entry["mtime"]:
+                unchanged[rel_path] = dict(entry, sha256=remote.get("sha256"))
+            elif has_hash and remote.get("sha256"):
+                # 重新 build 常會改寫 mtime 但內容不變，以雜湊值判斷
+                sha256 = file_sha256(os.path.join(local_dir, rel_path))
+                if sha256 == remote["sha256"]:
+                    unchanged[rel_path] = dict(entry, sha256=sha256)
+                else:
+                    changed.append(rel_path)
+            else:
+                changed.append(rel_path)
+        return changed, unchanged
+
+    def sync(self, local_dir, remote_root, on_result=None):
+        """
+        將 local_dir 同步到 remote_root
+
+        :return: SyncResult
+        """
+        result = SyncResult()
+        start = time.perf_counter()
+        local_files = scan_local(local_dir)
+
+        remote_files = read_remote_manifest(self.sftp, remote_root)
+        remote_dirs = None
+        has_hash = remote_files is not None
+        if remote_files is None:
+            remote_files, remote_dirs = scan_remote(self.sftp, remote_root)
+            result.manifest_source = "listdir_attr"
+            if remote_files or remote_dirs:
+                self.dir_cache.learn(remote_root)
+            for rel_dir in remote_dirs:
+                self.dir_cache.learn(posixpath.join(remote_root, rel_dir))
+        else:
+            # 清單中的檔案所在資料夾視為已存在，上傳時不必逐一確認
+            self.dir_cache.learn_files(remote_root, remote_files)
+
+        changed, unchanged = self.diff(local_dir, local_files, remote_files, has_hash)
+        result.skipped = len(unchanged)
+        result.timings["scan"] = time.perf_counter() - start
+
+        all_dirs, all_files = plan_tree(local_dir, remote_root)
+        changed_set = set(changed)
+        prefix = len(remote_root.rstrip("/")) + 1
+        upload_items = [item for item in all_files if item[1][prefix:] in changed_set]
+
+        self.uploader = make_uploader(
+            self.ssh, self.workers, self.cancel_event, self.transfer_mode, self.dir_cache, self.scheduler
+        )
+        result.report = self.uploader.upload_files(upload_items, all_dirs, on_result)
+
+        # 上傳時不逐檔 stat（confirm=False），改在這裡每個資料夾核對一次遠端大小；不符的檔案不寫入清單，下次重新上傳
+        start = time.perf_counter()
+        verify_sizes(self.sftp, result.report.uploaded)
+        result.timings["verify"] = time.perf_counter() - start
+
+        # 刪除本地已不存在的遠端檔案，再由深到淺移除空資料夾（取消時保留）
+        start = time.perf_counter()
+        cancelled = self.cancel_event is not None and self.cancel_event.is_set()
+        stale = [] if cancelled else sorted(set(remote_files) - set(local_files))
+        for rel_path in stale:
+            try:
+                self.sftp.remove(posixpath.join(remote_root, rel_path))
+                result.deleted.append(rel_path)
+            except IOError:
+                pass
+
+        local_dirs = {d[prefix:] for d in all_dirs}
+        if remote_dirs is None:
+            remote_dirs = set()
+            for rel_path in stale:
+                rel_dir = posixpath.dirname(rel_path)
+                while rel_dir:
+                    remote_dirs.add(rel_dir)
+                    rel_dir = posixpath.dirname(rel_dir)
+        for rel_dir in sorted(set(remote_dirs) - local_dirs, key=lambda d: d.count("/"), reverse=True):
+            try:
+                self.sftp.rmdir(posixpath.join(remote_root, rel_dir))
+                self.dir_cache.forget(posixpath.join(remote_root, rel_dir))
+            except IOError:
+                pass
+
+        result.timings["delete"] = time.perf_counter() - start
+        start = time.perf_counter()
+
+        # 只記錄成功上傳與未變更的檔案，失敗的檔案下次會重新上傳；
+        # 尚未刪除的過期檔案保留在清單中，下次同步時再刪除
+        manifest = {
+            rel_path: entry for rel_path, entry in remote_files.items()
+            if rel_path not in local_files and rel_path not in result.deleted and entry.get("sha256")
+        }
+        manifest.update(unchanged)
+        for rel_path, entry in manifest.items():
+            if not entry.get("sha256"):
+                entry["sha256"] = file_sha256(os.path.join(local_dir, rel_path))
+        for item in result.report.uploaded:
+            rel_path = item.remote_path[prefix:]
+            manifest[rel_path] = dict(local_files[rel_path], sha256=file_sha256(item.local_path))
+        write_remote_manifest(self.sftp, remote_root, manifest)
+        result.timings["manifest"] = time.perf_counter() - start
+        return result
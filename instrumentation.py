@@ -0,0 +1,217 @@
+# instrumentation.py
+import csv
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# 每次執行的結果另外附加到此檔（每行一筆 JSON），方便匯入儀表板或比較不同次執行
+METRICS_DIR = os.path.join(os.path.expanduser("~"), ".cmd_tool", "metrics")
+HISTORY_FILE = os.path.join(METRICS_DIR, "runs.jsonl")
+# 報告中保留最慢的檔案數
+SLOWEST_FILES = 10
+
+CSV_FIELDS = ("run_id", "kind", "row", "target", "name", "ok", "elapsed", "files", "bytes",
+              "files_per_sec", "mb_per_sec")
+
+
+class StageRecord:
+    """
+    單一階段的耗時與傳輸量
+    """
+
+    def __init__(self, name, target=None):
+        self.name = name
+        self.target = target
+        self.elapsed = 0.0
+        self.files = 0
+        self.bytes = 0
+        self.ok = True
+        self.extra = {}
+
+    @property
+    def files_per_sec(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_sec(self):
+        return self.bytes / 1024 / 1024 / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "target": self.target,
+            "ok": self.ok,
+            "elapsed": round(self.elapsed, 3),
+            "files": self.files,
+            "bytes": self.bytes,
+            "files_per_sec": round(self.files_per_sec, 2),
+            "mb_per_sec": round(self.mb_per_sec, 3),
+        }
+        data.update(self.extra)
+        return data
+
+
+class RunMetrics:
+    """
+    一次執行（部署、單檔上傳…）的結構化統計，可於多個執行緒同時記錄
+    """
+
+    def __init__(self, kind, slowest=SLOWEST_FILES):
+        """
+        :param kind: 執行種類，例如 deploy、upload_file
+        :param slowest: 保留最慢的檔案數
+        """
+        self.kind = kind
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self.status = None
+        self.stages = []
+        self.elapsed = 0.0
+        self.slowest = slowest
+        self._start = time.monotonic()
+        self._files = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, elapsed, ok=True, target=None, files=0, bytes=0, **extra):
+        record = StageRecord(name, target)
+        record.elapsed = elapsed
+        record.ok = ok
+        record.files = files
+        record.bytes = bytes
+        record.extra = extra
+        with self._lock:
+            self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name, target=None):
+        """
+        計時區塊；區塊內可設定 record.files / record.bytes，發生例外時記錄為失敗
+        """
+        record = StageRecord(name, target)
+        start = time.monotonic()
+        try:
+            yield record
+        except BaseException:
+            record.ok = False
+            raise
+        finally:
+            record.elapsed = time.monotonic() - start
+            with self._lock:
+                self.stages.append(record)
+
+    def record_file(self, path, size, elapsed, target=None):
+        """
+        只保留最慢的幾個檔案（以 heap 維護，不會隨檔案數增加而佔用記憶體）
+        """
+        item = (elapsed, size, path, target)
+        with self._lock:
+            if len(self._files) < self.slowest:
+                heapq.heappush(self._files, item)
+            elif item > self._files[0]:
+                heapq.heapreplace(self._files, item)
+
+    def record_upload(self, report, target=None):
+        """
+        由 sftp_uploader.UploadReport 記錄建立資料夾與檔案傳輸兩個階段
+        """
+        dirs_elapsed = getattr(report, "dirs_elapsed", 0.0)
+        if report.dirs_created or dirs_elapsed:
+            self.add_stage("mkdirs", dirs_elapsed, target=target, dirs=report.dirs_created)
+        self.add_stage(
+            "transfer", max(0.0, report.elapsed - dirs_elapsed), not report.failed, target,
+            files=len(report.uploaded), bytes=report.total_bytes, failed=len(report.failed)
+        )
+        for result in report.uploaded:
+            self.record_file(result.local_path, result.size, result.elapsed, target)
+
+    def finish(self, status):
+        self.status = status
+        self.elapsed = time.monotonic() - self._start
+
+    def slowest_files(self):
+        with self._lock:
+            items = sorted(self._files, reverse=True)
+        return [
+            {"path": path, "target": target, "bytes": size, "elapsed": round(elapsed, 3)}
+            for elapsed, size, path, target in items
+        ]
+
+    def to_dict(self):
+        with self._lock:
+            stages = [s.to_dict() for s in self.stages]
+        return {
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "status": self.status,
+            "elapsed": round(self.elapsed, 3),
+            "stages": stages,
+            "slowest_files": self.slowest_files(),
+        }
+
+    def summary_lines(self):
+        """
+        給摘要面板與輸出區使用的文字
+        """
+        data = self.to_dict()
+        lines = [f"⏱ {data['kind']} {data['status'] or ''}，總耗時 {data['elapsed']:.2f} 秒"]
+        for stage in data["stages"]:
+            target = f"[{stage['target']}] " if stage["target"] else ""
+            icon = "✅" if stage["ok"] else "❌"
+            rate = ""
+            if stage["files"] or stage["bytes"]:
+                rate = (f"，{stage['files']} 檔 / {stage['bytes'] / 1024 / 1024:.2f} MB，"
+                        f"{stage['files_per_sec']:.1f} 檔/秒，{stage['mb_per_sec']:.2f} MB/秒")
+            lines.append(f"{icon} {target}{stage['name']}：{stage['elapsed']:.2f} 秒{rate}")
+        if data["slowest_files"]:
+            lines.append("🐢 最慢的檔案：")
+            for item in data["slowest_files"]:
+                lines.append(f"   {item['elapsed']:.2f} 秒  {item['bytes'] / 1024:.1f} KB  {item['path']}")
+        return lines
+
+    def csv_rows(self):
+        data = self.to_dict()
+        for stage in data["stages"]:
+            yield {
+                "run_id": data["run_id"], "kind": data["kind"], "row": "stage",
+                "target": stage["target"] or "", "name": stage["name"], "ok": stage["ok"],
+                "elapsed": stage["elapsed"], "files": stage["files"], "bytes": stage["bytes"],
+                "files_per_sec": stage["files_per_sec"], "mb_per_sec": stage["mb_per_sec"],
+            }
+        for item in data["slowest_files"]:
+            yield {
+                "run_id": data["run_id"], "kind": data["kind"], "row": "slow_file",
+                "target": item["target"] or "", "name": item["path"], "ok": True,
+                "elapsed": item["elapsed"], "files": 1, "bytes": item["bytes"],
+                "files_per_sec": "", "mb_per_sec": "",
+            }
+
+    def export(self, path):
+        """
+        依副檔名匯出 .csv 或 .json
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.csv_rows())
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def save_history(self, path=HISTORY_FILE):
+        """
+        附加到執行記錄檔；無法寫入時略過，不影響部署結果
+        """
+        line = json.dumps(self.to_dict(), ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
@@ -0,0 +1,169 @@
+# job_cli.py
+import argparse
+import json
+import os
+import sys
+import threading
+
+from deploy_cli import EXIT_CANCELLED, EXIT_CONFIG_ERROR, EXIT_FAILED, EXIT_OK, emit_result, stderr_log
+from job_queue import ACTIVE_STATUSES, JobRunner, JobStore, describe_job, describe_trend
+from sftp_pool import shared_pool
+
+
+def build_parser(command):
+    if command == "profile":
+        parser = argparse.ArgumentParser(prog="cmd_tool.py profile", description="管理具名設定檔")
+        sub = parser.add_subparsers(dest="action", required=True)
+        save = sub.add_parser("save", help="以 JSON 設定檔建立或覆寫設定檔")
+        save.add_argument("name")
+        save.add_argument("config", help="JSON 設定檔路徑（格式同 input_config.json）")
+        sub.add_parser("list", help="列出設定檔")
+        show = sub.add_parser("show", help="輸出設定檔內容（JSON）")
+        show.add_argument("name")
+        delete = sub.add_parser("delete", help="刪除設定檔（執行記錄保留）")
+        delete.add_argument("name")
+        return parser
+
+    parser = argparse.ArgumentParser(prog="cmd_tool.py queue", description="部署工作佇列")
+    sub = parser.add_subparsers(dest="action", required=True)
+    add = sub.add_parser("add", help="排入工作（可一次排入多個設定檔，依序執行）")
+    add.add_argument("profiles", nargs="+", metavar="PROFILE")
+    add.add_argument("--rollback", action="store_true", help="回復上一版而非部署")
+    add.add_argument("--force-rebuild", action="store_true", help="忽略 build 快取，一定執行 cmd_command")
+    add.add_argument("--retune", action="store_true", help="\"transport\": \"auto\" 時忽略快取，重新調校傳輸設定")
+    add.add_argument("--run", action="store_true", help="排入後立即執行佇列")
+    add_run_options(add)
+    run = sub.add_parser("run", help="執行佇列中的工作直到清空")
+    add_run_options(run)
+    listing = sub.add_parser("list", help="列出等待中與執行中的工作")
+    listing.add_argument("--all", action="store_true", help="包含已結束的工作")
+    listing.add_argument("-n", "--limit", type=int, default=20)
+    cancel = sub.add_parser("cancel", help="取消尚未開始的工作")
+    cancel.add_argument("ids", nargs="+", type=int, metavar="ID")
+    sub.add_parser("recover", help="將未正常結束（停在 running）的工作標示為 interrupted；確認沒有其他佇列在執行時使用")
+    history = sub.add_parser("history", help="列出執行記錄與耗時趨勢")
+    history.add_argument("profile", nargs="?")
+    history.add_argument("-n", "--limit", type=int, default=20)
+    return parser
+
+
+def add_run_options(parser):
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="同時執行的工作數（不同設定檔才會同時執行，預設 1）")
+    parser.add_argument("-o", "--output", help="另將 JSON 結果寫入此檔案")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不輸出執行過程，只輸出最後結果")
+
+
+def print_lines(lines):
+    for line in lines:
+        print(line)
+
+
+def run_queue(store, args):
+    """
+    執行佇列直到清空；結果以 JSON 輸出到 stdout，與 run 子命令相同
+    """
+    log = (lambda message: None) if args.quiet else stderr_log
+    runner = JobRunner(store, args.jobs, log)
+    worker = threading.Thread(target=runner.run_pending, name="deploy-queue", daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.2)
+    except KeyboardInterrupt:
+        stderr_log("⏹ 收到中斷訊號，正在取消…")
+        runner.cancel_event.set()
+        worker.join()
+    finally:
+        shared_pool.close_all()
+
+    jobs = sorted(runner.results, key=lambda job: job["id"])
+    statuses = [job["status"] for job in jobs]
+    if runner.cancel_event.is_set():
+        status = "cancelled"
+    elif all(s == "success" for s in statuses):
+        status = "success"
+    elif any(s == "success" for s in statuses):
+        status = "partial"
+    else:
+        status = "failed"
+    emit_result({
+        "status": status,
+        "ok": status == "success",
+        "jobs": [
+            {"id": job["id"], "profile": job["profile"], "action": job["action"], "result": job["result"]}
+            for job in jobs
+        ],
+    }, args.output)
+    return {"success": EXIT_OK, "cancelled": EXIT_CANCELLED}.get(status, EXIT_FAILED)
+
+
+def main(argv, command="queue"):
+    """
+    :param command: profile 管理設定檔；queue 排入、執行與查詢工作
+    """
+    for stream in (sys.stdout, sys.stderr):
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(errors="replace")
+
+    args = build_parser(command).parse_args(argv)
+    store = JobStore()
+    try:
+        if command == "profile":
+            return profile_command(store, args)
+        return queue_command(store, args)
+    except (OSError, ValueError, KeyError) as e:
+        stderr_log(f"❌ {e.args[0] if isinstance(e, KeyError) else e}")
+        return EXIT_CONFIG_ERROR
+
+
+def profile_command(store, args):
+    if args.action == "save":
+        with open(args.config, "r", encoding="utf-8") as f:
+            # 相對的 cmd_working_dir 以 JSON 檔所在資料夾為基準
+            store.save_profile(args.name, json.load(f), os.path.dirname(os.path.abspath(args.config)))
+        stderr_log(f"💾 已儲存設定檔：{args.name}")
+    elif args.action == "list":
+        print_lines(profile["name"] for profile in store.list_profiles())
+    elif args.action == "show":
+        print(json.dumps(store.load_profile(args.name), ensure_ascii=False, indent=2))
+    elif args.action == "delete":
+        if not store.delete_profile(args.name):
+            raise KeyError(f"找不到設定檔：{args.name}")
+        stderr_log(f"🗑️ 已刪除設定檔：{args.name}")
+    return EXIT_OK
+
+
+def queue_command(store, args):
+    if args.action == "add":
+        options = {}
+        if args.force_rebuild:
+            options["force_rebuild"] = True
+        if args.retune:
+            options["transport_retune"] = True
+        action = "rollback" if args.rollback else "run"
+        for profile in args.profiles:
+            job_id = store.enqueue(profile, action, options)
+            stderr_log(f"⏳ 已排入工作 #{job_id}：{profile}")
+        if args.run:
+            return run_queue(store, args)
+    elif args.action == "run":
+        return run_queue(store, args)
+    elif args.action == "list":
+        statuses = None if args.all else ACTIVE_STATUSES
+        print_lines(describe_job(job) for job in store.jobs(limit=args.limit, statuses=statuses))
+    elif args.action == "cancel":
+        for job_id in args.ids:
+            if store.cancel(job_id):
+                stderr_log(f"⏹ 已取消工作 #{job_id}")
+            else:
+                stderr_log(f"⚠️ 工作 #{job_id} 不存在或已開始執行")
+    elif args.action == "recover":
+        stderr_log(f"🩹 已將 {store.recover()} 個未正常結束的工作標示為 interrupted")
+    elif args.action == "history":
+        jobs = store.jobs(args.profile, args.limit)
+        print_lines(describe_job(job) for job in jobs)
+        for profile in sorted({job["profile"] for job in jobs}):
+            trend = describe_trend(profile, store.duration_trend(profile))
+            if trend:
+                print(trend)
+    return EXIT_OK
@@ -0,0 +1,369 @@
+# job_queue.py
+import json
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from deploy_config import normalize_config
+from deploy_pipeline import DeployPipeline
+
+# 設定檔（profile）、佇列與執行記錄
+JOB_DB = os.path.join(os.path.expanduser("~"), ".cmd_tool", "jobs.db")
+JOB_ACTIONS = ("run", "rollback")
+# 尚未結束的工作狀態；其餘為 DeployPipeline 回傳的 status 或 error / interrupted
+ACTIVE_STATUSES = ("queued", "running")
+# 最近一次比之前的中位數慢超過此比例且超過此秒數時提醒（忽略短時間部署的誤差）
+SLOWDOWN_THRESHOLD = 0.2
+SLOWDOWN_MIN_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile TEXT NOT NULL,
+    action TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    elapsed REAL,
+    failed_step TEXT,
+    run_id TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_profile ON jobs (profile, id);
+"""
+
+
+class JobStore:
+    """
+    以 SQLite 保存具名設定檔與部署工作佇列；可同時由 GUI 與命令列存取
+    """
+
+    def __init__(self, path=JOB_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """
+        每次操作使用獨立連線（可於任何執行緒呼叫）；區塊結束時 commit
+        """
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # ---- 設定檔 ----
+
+    def save_profile(self, name, config, base_dir=None):
+        """
+        儲存或覆寫設定檔；保存原始 JSON 內容，執行時才正規化
+
+        相對的 cmd_working_dir 於儲存時展開成絕對路徑：佇列執行時部署流程會 chdir，
+        同時執行多個工作時不能依賴目前目錄。
+
+        :param base_dir: 展開相對 cmd_working_dir 的基準（通常為 JSON 檔所在資料夾），None 表示目前目錄
+        :raises ValueError: 名稱空白或設定內容不正確
+        """
+        name = (name or "").strip()
+        if not name:
+            raise ValueError("設定檔名稱不可空白")
+        normalize_config(config)
+        working_dir = config.get("cmd_working_dir")
+        if isinstance(working_dir, str) and not os.path.isabs(working_dir):
+            config = dict(config, cmd_working_dir=os.path.abspath(os.path.join(base_dir or os.getcwd(), working_dir)))
+        now = time.time()
+        with self.connect() as db:
+            db.execute(
+                "INSERT INTO profiles (name, config, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                (name, json.dumps(config, ensure_ascii=False), now, now),
+            )
+
+    def load_profile(self, name):
+        """
+        :raises KeyError: 設定檔不存在
+        """
+        with self.connect() as db:
+            row = db.execute("SELECT config FROM profiles WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"找不到設定檔：{name}")
+        return json.loads(row["config"])
+
+    def list_profiles(self):
+        with self.connect() as db:
+            rows = db.execute("SELECT name, updated_at FROM profiles ORDER BY name").fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_profile(self, name):
+        """
+        :return: 是否有刪除；執行記錄保留
+        """
+        with self.connect() as db:
+            return db.execute("DELETE FROM profiles WHERE name = ?", (name,)).rowcount > 0
+
+    # ---- 佇列 ----
+
+    def enqueue(self, profile, action="run", options=None):
+        """
+        排入一個工作
+
+        :param options: 套用在設定檔上的覆寫值（例如 {"force_rebuild": true}）
+        :return: 工作編號
+        """
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"不支援的動作：{action}（可用：{', '.join(JOB_ACTIONS)}）")
+        self.load_profile(profile)
+        with self.connect() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (profile, action, options, status, queued_at) VALUES (?, ?, ?, 'queued', ?)",
+                (profile, action, json.dumps(options or {}, ensure_ascii=False), time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim_next(self, busy_profiles=()):
+        """
+        取出最早排入的工作並標示為 running；同一個設定檔不會同時執行兩個工作
+
+        :param busy_profiles: 正在執行中的設定檔名稱
+        :return: 工作 dict，沒有可執行的工作時為 None
+        """
+        with self.connect() as db:
+            # BEGIN IMMEDIATE 先取得寫入鎖，避免兩個執行者取到同一個工作
+            db.execute("BEGIN IMMEDIATE")
+            for row in db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id").fetchall():
+                if row["profile"] in busy_profiles:
+                    continue
+                db.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"])
+                )
+                return self._job(row)
+        return None
+
+    def finish(self, job_id, result):
+        """
+        記錄工作結果（DeployPipeline.run() / rollback() 的回傳值）
+        """
+        with self.connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, elapsed = ?, failed_step = ?, run_id = ?, result = ? "
+                "WHERE id = ?",
+                (
+                    result.get("status", "error"),
+                    time.time(),
+                    result.get("elapsed"),
+                    result.get("failed_step"),
+                    (result.get("metrics") or {}).get("run_id"),
+                    json.dumps(result, ensure_ascii=False),
+                    job_id,
+                ),
+            )
+
+    def cancel(self, job_id):
+        """
+        取消尚未開始的工作（執行中的工作由執行者的 cancel_event 取消）
+
+        :return: 是否有取消
+        """
+        with self.connect() as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            ).rowcount > 0
+
+    def recover(self):
+        """
+        程式異常結束時留下的 running 工作標示為 interrupted（不自動重跑，避免重複部署）
+
+        只應在確定沒有其他執行者（GUI 或另一個 queue run）時呼叫。
+
+        :return: 標示的工作數
+        """
+        with self.connect() as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status = 'running'", (time.time(),)
+            ).rowcount
+
+    def pending_count(self):
+        with self.connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def jobs(self, profile=None, limit=20, statuses=None):
+        """
+        :return: 最近的工作（新到舊）
+        """
+        query = "SELECT * FROM jobs"
+        clauses, params = [], []
+        if profile:
+            clauses.append("profile = ?")
+            params.append(profile)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self.connect() as db:
+            return [self._job(row) for row in db.execute(query, params).fetchall()]
+
+    def duration_trend(self, profile, window=10):
+        """
+        比較最近一次成功部署與之前 window 次成功部署的耗時中位數
+
+        :return: {"runs", "latest", "median", "change"}，成功次數不足 2 次時為 None
+        """
+        with self.connect() as db:
+            rows = db.execute(
+                "SELECT elapsed FROM jobs WHERE profile = ? AND action = 'run' AND status = 'success' "
+                "AND elapsed IS NOT NULL ORDER BY id DESC LIMIT ?",
+                (profile, window + 1),
+            ).fetchall()
+        if len(rows) < 2:
+            return None
+        latest = rows[0]["elapsed"]
+        median = statistics.median(row["elapsed"] for row in rows[1:])
+        return {
+            "runs": len(rows),
+            "latest": latest,
+            "median": median,
+            "change": (latest - median) / median if median else 0.0,
+        }
+
+    @staticmethod
+    def _job(row):
+        job = dict(row)
+        job["options"] = json.loads(job["options"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+def describe_job(job):
+    """
+    一行摘要，供命令列與 GUI 顯示
+    """
+    icon = {
+        "success": "✅", "partial": "⚠️", "queued": "⏳", "running": "🏃", "cancelled": "⏹",
+    }.get(job["status"], "❌")
+    queued = time.strftime("%m-%d %H:%M", time.localtime(job["queued_at"]))
+    action = "" if job["action"] == "run" else f" {job['action']}"
+    text = f"{icon} #{job['id']} {job['profile']}{action} {job['status']}（排入 {queued}"
+    if job["elapsed"] is not None:
+        text += f"，耗時 {job['elapsed']:.1f} 秒"
+    if job["failed_step"]:
+        text += f"，失敗步驟：{job['failed_step']}"
+    return text + "）"
+
+
+def describe_trend(profile, trend):
+    if trend is None:
+        return None
+    text = (
+        f"最近一次 {trend['latest']:.1f} 秒，前 {trend['runs'] - 1} 次中位數 {trend['median']:.1f} 秒"
+        f"（{trend['change'] * 100:+.0f}%）"
+    )
+    if trend["change"] > SLOWDOWN_THRESHOLD and trend["latest"] - trend["median"] > SLOWDOWN_MIN_SECONDS:
+        return f"🐢 {profile} 變慢：{text}"
+    return f"📈 {profile}：{text}"
+
+
+class JobRunner:
+    """
+    依序（或以 max_concurrent 為上限同時）執行佇列中的工作，直到佇列清空
+
+    所有工作在同一個行程中執行，連線歸還到 sftp_pool.shared_pool 後由下一個工作直接沿用，
+    build 快取也跨工作保留；同一個設定檔的工作不會同時執行。
+    """
+
+    def __init__(self, store, max_concurrent=1, log=None, cancel_event=None):
+        """
+        :param log: 接收訊息的函式，可於任何執行緒呼叫；訊息前會加上工作編號
+        :param cancel_event: threading.Event，設定後取消執行中的工作並停止取出新工作
+        """
+        self.store = store
+        self.max_concurrent = max(1, max_concurrent)
+        self.log = log or (lambda message: None)
+        self.cancel_event = cancel_event or threading.Event()
+        self.results = []
+        # 最近一個完成的部署流程的 RunMetrics（GUI 顯示統計用）
+        self.last_metrics = None
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def run_pending(self):
+        """
+        :return: 本次執行的工作清單（含結果）
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="deploy-job") as pool:
+            for _ in range(self.max_concurrent):
+                pool.submit(self._worker)
+        return self.results
+
+    def _worker(self):
+        while not self.cancel_event.is_set():
+            with self._lock:
+                job = self.store.claim_next(self._busy)
+                if job is None:
+                    return
+                self._busy.add(job["profile"])
+            try:
+                self.run_job(job)
+            finally:
+                with self._lock:
+                    self._busy.discard(job["profile"])
+
+    def run_job(self, job):
+        prefix = f"[#{job['id']} {job['profile']}] "
+        log = (lambda message: self.log(prefix + message)) if self.max_concurrent > 1 else self.log
+        self.log(f"▶️ 開始工作 #{job['id']}：{job['profile']}{'' if job['action'] == 'run' else ' ' + job['action']}\n")
+        try:
+            config = job_config(self.store.load_profile(job["profile"]), job["options"])
+            pipeline = DeployPipeline(config, log, self.cancel_event)
+            result = pipeline.rollback() if job["action"] == "rollback" else pipeline.run()
+            self.last_metrics = pipeline.metrics
+        except (KeyError, ValueError) as e:
+            result = {"status": "config_error", "ok": False, "error": str(e)}
+        except Exception as e:
+            result = {"status": "error", "ok": False, "error": str(e)}
+        self.store.finish(job["id"], result)
+        job.update(status=result.get("status"), elapsed=result.get("elapsed"),
+                   failed_step=result.get("failed_step"), result=result)
+        with self._lock:
+            self.results.append(job)
+        if result.get("error"):
+            self.log(f"❌ 工作 #{job['id']} 錯誤：{result['error']}\n")
+        self.log(describe_job(job) + "\n")
+        if job["action"] == "run" and result.get("status") == "success":
+            trend = describe_trend(job["profile"], self.store.duration_trend(job["profile"]))
+            if trend:
+                self.log(trend + "\n")
+        return result
+
+
+def job_config(data, options=None):
+    """
+    設定檔內容套上工作的覆寫值後正規化
+
+    cmd_copy_source 為相對路徑時改以 cmd_working_dir 為基準展開：部署流程會 chdir，
+    同時執行多個工作時不能依賴目前目錄。
+    """
+    config = normalize_config(dict(data, **(options or {})))
+    config["cmd_copy_source"] = os.path.join(config["cmd_working_dir"], config["cmd_copy_source"])
+    return config
@@ -0,0 +1,95 @@
+# log_sink.py
+import logging
+import os
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from PyQt6.QtCore import QObject, QTimer
+
+# 輸出區最多保留的行數（QTextDocument block 數）
+MAX_BLOCKS = 5000
+# 每隔多少毫秒把累積的訊息一次寫入輸出區
+FLUSH_INTERVAL_MS = 100
+# 完整記錄另存到磁碟，單檔 5 MB、保留 5 份
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".cmd_tool", "logs")
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+_file_logger = None
+_file_logger_lock = threading.Lock()
+
+
+def file_logger():
+    """
+    寫入輪替記錄檔的 logger；無法建立記錄檔時只保留畫面輸出
+    """
+    global _file_logger
+    with _file_logger_lock:
+        if _file_logger is None:
+            logger = logging.getLogger("cmd_tool.output")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            try:
+                os.makedirs(LOG_DIR, exist_ok=True)
+                handler = RotatingFileHandler(
+                    os.path.join(LOG_DIR, "cmd_tool.log"),
+                    maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger.addHandler(handler)
+            except OSError:
+                logger.addHandler(logging.NullHandler())
+            _file_logger = logger
+        return _file_logger
+
+
+class LogSink(QObject):
+    """
+    執行緒安全的輸出區寫入器
+
+    write() 可於任何執行緒呼叫，訊息先暫存，再由 GUI 執行緒的計時器
+    每 FLUSH_INTERVAL_MS 毫秒合併成一次 append；輸出區只保留最後 MAX_BLOCKS 行，
+    完整內容另寫入輪替記錄檔。
+    """
+
+    def __init__(self, widgets, max_blocks=MAX_BLOCKS, interval_ms=FLUSH_INTERVAL_MS, parent=None):
+        """
+        :param widgets: 要輸出的 QTextEdit 清單（None 會被略過）
+        :param max_blocks: 每個輸出區保留的最多行數
+        :param interval_ms: 合併寫入的間隔
+        """
+        super().__init__(parent)
+        self.widgets = [w for w in widgets if w is not None]
+        for widget in self.widgets:
+            widget.document().setMaximumBlockCount(max_blocks)
+        # 待寫入的訊息同樣有上限，來不及顯示的舊訊息只保留在記錄檔
+        self._pending = deque(maxlen=max_blocks)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._logger = file_logger()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def write(self, message):
+        self._logger.info(message.rstrip("\n"))
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(message)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            batch = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            batch.insert(0, f"…（略過 {dropped} 則訊息，完整內容請見記錄檔 {LOG_DIR}）")
+        text = "\n".join(batch)
+        for widget in self.widgets:
+            widget.append(text)
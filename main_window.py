@@ -0,0 +1,104 @@
+# main_window.py
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTabWidget, QTextEdit, QLabel, QPushButton
+from cmd_tab import CmdTab
+from startup_profile import profile
+from task_runner import shared_executor
+
+
+class LazyTab(QWidget):
+    """
+    分頁的佔位元件：第一次切換到該分頁（或其他分頁需要用到）時才建立實際內容
+    """
+
+    def __init__(self, name, factory):
+        """
+        :param name: 分頁名稱（啟動量測報告用）
+        :param factory: 建立實際分頁的函式；模組也在此時才 import
+        """
+        super().__init__()
+        self.name = name
+        self.factory = factory
+        self.content = None
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+    def widget(self):
+        if self.content is None:
+            with profile.step(self.name):
+                self.content = self.factory()
+                self.layout().addWidget(self.content)
+        return self.content
+
+
+class CMDTool(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("CMD 控制工具 - 模組化版")
+        self.resize(800, 700)
+
+        layout = QVBoxLayout()
+        self.output = QTextEdit()
+        self.output.setReadOnly(True)
+
+        self.tabs = QTabWidget()
+
+        # SFTP / json 自動化分頁延後建立，縮短啟動時間
+        self.sftp_page = LazyTab("SftpTab", self.create_sftp_tab)
+        self.settings_page = LazyTab("SettingsTab", self.create_settings_tab)
+
+        # 初始化 CMD Tab，傳入 output 及取得 sftp_tab 的函式（用來使用 FTP 功能）
+        with profile.step("CmdTab"):
+            self.cmd_tab = CmdTab(self.output, self.sftp_page.widget)
+
+        self.tabs.addTab(self.cmd_tab, "CMD 控制")
+        self.tabs.addTab(self.sftp_page, "SFTP 設定")
+        self.tabs.addTab(self.settings_page, "json自動化 設定")
+        self.tabs.currentChanged.connect(self.load_tab)
+
+        # 各分頁共用的背景工作佇列：顯示尚未結束的工作數，可一次全部取消
+        executor = shared_executor()
+        self.queue_label = QLabel()
+        self.cancel_all_button = QPushButton("⏹ 全部取消")
+        self.cancel_all_button.clicked.connect(executor.cancel_all)
+        executor.queue_changed.connect(self.update_queue_status)
+        self.update_queue_status(executor.pending)
+        queue_row = QHBoxLayout()
+        queue_row.addWidget(QLabel("輸出結果："))
+        queue_row.addStretch(1)
+        queue_row.addWidget(self.queue_label)
+        queue_row.addWidget(self.cancel_all_button)
+
+        layout.addWidget(self.tabs)
+        layout.addLayout(queue_row)
+        layout.addWidget(self.output)
+
+        self.setLayout(layout)
+
+    def update_queue_status(self, pending):
+        """
+        :param pending: 共用佇列中尚未結束（執行中與等待中）的工作數
+        """
+        self.queue_label.setText(f"⏳ 背景工作：{pending}" if pending else "")
+        self.cancel_all_button.setEnabled(pending > 0)
+
+    def create_sftp_tab(self):
+        from sftp_tab import SftpTab
+        return SftpTab(self.output)
+
+    def create_settings_tab(self):
+        from settings_tab import SettingsTab
+        return SettingsTab(self.output)
+
+    def load_tab(self, index):
+        page = self.tabs.widget(index)
+        if isinstance(page, LazyTab):
+            page.widget()
+
+    @property
+    def sftp_tab(self):
+        return self.sftp_page.widget()
+
+    @property
+    def settings_tab(self):
+        return self.settings_page.widget()
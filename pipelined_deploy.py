@@ -0,0 +1,309 @@
+# pipelined_deploy.py
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from deploy_sync import file_sha256, write_remote_manifest
+from releases import ReleaseManager
+from sftp_uploader import UploadCancelled, UploadReport
+from tar_transfer import make_uploader
+
+# 輪詢 build 輸出資料夾的間隔（秒）
+POLL_INTERVAL = 0.5
+# 檔案大小與修改時間維持不變多久才視為已寫完（秒）
+SETTLE_SECONDS = 1.0
+# 比對 build 開始時間的容許誤差（FAT / 網路磁碟的時間精度較粗）
+MTIME_SLACK_NS = 2 * 10 ** 9
+
+
+class OutputWatcher:
+    """
+    輪詢 build 輸出資料夾，找出已寫完（大小與修改時間穩定）的檔案
+    """
+
+    def __init__(self, source_dir, since_ns, settle=SETTLE_SECONDS):
+        """
+        :param source_dir: build 輸出資料夾（cmd_copy_source）
+        :param since_ns: build 開始的時間（time.time_ns()），更早的檔案是上次 build 留下的
+        :param settle: 檔案需穩定的秒數
+        """
+        self.source_dir = source_dir
+        self.since_ns = since_ns - MTIME_SLACK_NS
+        self.settle = settle
+        self.seen = {}
+        self.emitted = {}
+
+    def scan(self):
+        current = {}
+        for root, dirs, files in os.walk(self.source_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # build 可能正在刪除或改名
+                    continue
+                rel_path = os.path.relpath(path, self.source_dir).replace("\\", "/")
+                current[rel_path] = (st.st_size, st.st_mtime_ns)
+        return current
+
+    def poll(self, final=False):
+        """
+        :param final: build 已結束，剩下的檔案一律視為完成（包含 build 未改寫的舊檔）
+        :return: (需要上傳的相對路徑, 已上傳但本地已不存在的相對路徑)
+        """
+        now = time.monotonic()
+        current = self.scan()
+        ready = []
+        for rel_path, signature in current.items():
+            if self.emitted.get(rel_path) == signature:
+                continue
+            if not final:
+                # 舊檔可能馬上被 build 清除或覆寫，等 build 結束再決定
+                if signature[1] < self.since_ns:
+                    continue
+                first = self.seen.get(rel_path)
+                if first is None or first[0] != signature:
+                    self.seen[rel_path] = (signature, now)
+                    continue
+                if now - first[1] < self.settle:
+                    continue
+            ready.append(rel_path)
+            self.emitted[rel_path] = signature
+
+        missing = [rel_path for rel_path in self.emitted if rel_path not in current] if final else []
+        for rel_path in missing:
+            del self.emitted[rel_path]
+        return ready, missing
+
+    def manifest(self):
+        """
+        最後上傳的檔案清單（格式同 deploy_sync 的遠端清單），供之後的 sync 部署比對
+        """
+        return {
+            rel_path: {
+                "size": size,
+                "mtime": mtime_ns // 10 ** 9,
+                "sha256": file_sha256(os.path.join(self.source_dir, rel_path)),
+            }
+            for rel_path, (size, mtime_ns) in self.emitted.items()
+        }
+
+
+class RemoteStage:
+    """
+    單一主機上的新版本資料夾；build 成功後才以 ReleaseManager 切換 symlink
+    """
+
+    def __init__(self, target):
+        """
+        :param target: deploy_pipeline.TargetDeploy（已連線）
+        """
+        self.target = target
+        self.root = target.target_root()
+        self.manager = ReleaseManager(target.ssh, target.sftp, self.root, target.keep_releases)
+        self.release_id = None
+        self.staging_root = None
+        self.report = UploadReport()
+        self.retry = set()
+        self.staged_early = 0
+        self.error = None
+
+    def begin(self):
+        # build 會產生全新的檔案，不必複製目前版本
+        self.release_id = self.manager.new_release_id()
+        self.staging_root, _ = self.manager.prepare(self.release_id, seed=False)
+
+    def upload(self, rel_paths, source_dir, final=False):
+        """
+        上傳到暫存資料夾；build 進行中失敗的檔案留待最後一輪重傳
+
+        :return: 這一輪失敗的檔案數
+        """
+        rel_paths = sorted(set(rel_paths) | (self.retry if final else set()))
+        if not rel_paths:
+            return 0
+        # 已建立的資料夾記錄在 session 的 dir_cache，之後的批次直接略過
+        rel_dirs = set()
+        for rel_path in rel_paths:
+            rel_dir = posixpath.dirname(rel_path)
+            while rel_dir and rel_dir not in rel_dirs:
+                rel_dirs.add(rel_dir)
+                rel_dir = posixpath.dirname(rel_dir)
+        remote_dirs = [self.staging_root] + [
+            posixpath.join(self.staging_root, d) for d in sorted(rel_dirs, key=lambda d: d.count("/"))
+        ]
+        files = []
+        for rel_path in rel_paths:
+            local_path = os.path.join(source_dir, *rel_path.split("/"))
+            try:
+                size = os.path.getsize(local_path)
+            except OSError:
+                size = 0
+            files.append((local_path, posixpath.join(self.staging_root, rel_path), size))
+
+        uploader = make_uploader(
+            self.target.ssh, self.target.sftp_workers, self.target.cancel_event, self.target.transfer_mode,
+            self.target.session.dir_cache, self.target.scheduler
+        )
+        self.target.uploader = uploader
+        try:
+            batch = uploader.upload_files(files, remote_dirs, self.log_failure if final else None)
+        except Exception:
+            # watcher 已將這批檔案視為送出，整批留到最後一輪重傳
+            self.retry.update(rel_paths)
+            raise
+        # build 進行中失敗的檔案會在最後一輪重傳，只計入最後一輪的失敗
+        self.report.results.extend(batch.results if final else batch.uploaded)
+        self.report.elapsed += batch.elapsed
+        if not final:
+            self.staged_early += len(batch.uploaded)
+
+        # 跨批次累計：之前失敗、這一輪成功的檔案才移出，否則 watcher 不會再回報而漏傳
+        prefix = len(self.staging_root) + 1
+        failed = {r.remote_path[prefix:] for r in batch.results if not r.ok}
+        self.retry = (self.retry - {r.remote_path[prefix:] for r in batch.uploaded}) | failed
+        return len(failed)
+
+    def log_failure(self, result):
+        if not result.ok and not isinstance(result.error, UploadCancelled):
+            self.target.log(f"❌ 上傳失敗：{result.local_path} ➜ {result.remote_path}：{result.error}\n")
+
+    def remove(self, rel_paths):
+        for rel_path in rel_paths:
+            try:
+                self.target.sftp.remove(posixpath.join(self.staging_root, rel_path))
+            except IOError:
+                pass
+
+    def commit(self, manifest):
+        """
+        寫入檔案清單後切換到新版本，並刪除超過保留數量的舊版本
+        """
+        write_remote_manifest(self.target.sftp, self.staging_root, manifest)
+        self.target.activate_release(self.manager, self.release_id)
+
+    def abort(self):
+        if self.release_id is not None:
+            self.manager.remove(self.release_id)
+
+
+class PipelinedUpload:
+    """
+    build 進行中就把已寫完的檔案上傳到各主機的暫存資料夾，build 成功後再一次切換
+
+    使用方式：start() → 執行 build → finish(build 是否成功)
+    """
+
+    def __init__(self, targets, source_dir, log, cancel_event=None, max_parallel_targets=4):
+        self.source_dir = source_dir
+        self.log = log
+        self.cancel_event = cancel_event
+        self.max_parallel_targets = max_parallel_targets
+        self.stages = [RemoteStage(target) for target in targets]
+        self.watcher = None
+        # build 期間的預先上傳發生例外時記錄於此（之後改為 build 完成後一次上傳）
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def for_each_stage(self, fn, stages=None):
+        stages = self.stages if stages is None else stages
+        with ThreadPoolExecutor(max_workers=self.max_parallel_targets, thread_name_prefix="deploy-stage") as pool:
+            return list(pool.map(fn, stages))
+
+    def start(self):
+        def begin(stage):
+            try:
+                stage.begin()
+                stage.target.log(f"📂 已建立遠端新版本資料夾：{stage.staging_root}\n")
+            except Exception as e:
+                stage.error = e
+                stage.target.log(f"❌ 無法建立遠端新版本資料夾：{e}\n")
+
+        self.for_each_stage(begin)
+        self.watcher = OutputWatcher(self.source_dir, time.time_ns())
+        self._thread = threading.Thread(target=self._watch, name="deploy-watch", daemon=True)
+        self._thread.start()
+
+    @property
+    def active(self):
+        return [stage for stage in self.stages if stage.error is None]
+
+    def _watch(self):
+        try:
+            while not self._stop.wait(POLL_INTERVAL):
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    return
+                ready, _ = self.watcher.poll()
+                if ready:
+                    self.for_each_stage(lambda stage: stage.upload(ready, self.source_dir), self.active)
+                    self.log(f"⚡ build 進行中，已先上傳 {len(ready)} 個完成的檔案\n")
+        except Exception as e:
+            self.error = e
+            self.log(f"⚠️ build 期間的預先上傳已停止，剩下的檔案於 build 完成後上傳：{e}\n")
+
+    def finish(self, build_ok, before_commit=None):
+        """
+        停止監看並補傳剩下的檔案；build 成功時切換各主機的版本，否則刪除新版本資料夾
+
+        :param before_commit: before_commit(target)，切換版本前呼叫（部署前遠端指令），回傳 False 時維持目前版本
+
+        :return: 成功切換的 TargetDeploy 清單
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        cancelled = self.cancel_event is not None and self.cancel_event.is_set()
+        if not build_ok or cancelled:
+            self.for_each_stage(RemoteStage.abort)
+            return []
+
+        if self.error is not None:
+            self.log(f"⚠️ build 期間的預先上傳曾中斷（{self.error}），已改為 build 完成後上傳\n")
+        ready, missing = self.watcher.poll(final=True)
+        manifest = self.watcher.manifest()
+
+        def complete(stage):
+            target = stage.target
+            if stage.error is not None:
+                target.status = "failed"
+                target.failed_step = "stage"
+                return False
+
+            def step():
+                # build 最後刪除的檔案不必重傳
+                stage.retry.difference_update(missing)
+                failed = stage.upload(ready, self.source_dir, final=True)
+                stage.remove(missing)
+                target.log_transfer_mode(target.uploader)
+                target.record_upload(stage.report)
+                target.upload_stats["staged_during_build"] = stage.staged_early
+                if self.error is not None:
+                    target.upload_stats["staging_error"] = str(self.error)
+                target.log(stage.report.summary() + "\n")
+                if failed:
+                    target.log(f"❌ 有 {failed} 個檔案上傳失敗，維持目前版本\n")
+                    stage.abort()
+                    return False
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    stage.abort()
+                    return False
+                if before_commit is not None and not before_commit(target):
+                    stage.abort()
+                    return False
+                try:
+                    stage.commit(manifest)
+                except Exception as e:
+                    target.log(f"❌ 切換版本失敗：{e}\n")
+                    stage.abort()
+                    return False
+                target.log(f"⚡ build 期間已先上傳 {stage.staged_early} 個檔案\n")
+                return True
+
+            return target.timed("upload", step)
+
+        results = self.for_each_stage(complete)
+        return [stage.target for stage, ok in zip(self.stages, results) if ok]
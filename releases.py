@@ -0,0 +1,198 @@
+# releases.py
+import posixpath
+import shlex
+import stat
+import time
+
+from remote_exec import run_command
+
+# 預設保留的版本數（不含目前使用中的版本）
+KEEP_RELEASES = 5
+
+
+class RemoteCommandError(Exception):
+    """
+    遠端指令結束代碼不為 0
+    """
+
+
+def run_checked(ssh, command):
+    """
+    執行遠端指令並等待結束，失敗時丟出 RemoteCommandError
+    """
+    result = run_command(ssh, command, timeout=None)
+    if result.error is not None:
+        raise result.error
+    if not result.ok:
+        raise RemoteCommandError(f"{command}（結束代碼 {result.exit_status}）：{result.stderr.strip()}")
+
+
+class ReleaseManager:
+    """
+    版本化部署：每次部署放到獨立的版本資料夾，再以 symlink 切換
+
+    以 dist/pspf 為例：
+        dist/.pspf-releases/20260101-120000/   各版本
+        dist/pspf -> .pspf-releases/20260101-120000
+
+    切換時先建立暫存 symlink，再以 posix_rename 覆蓋 dist/pspf，rename(2) 為原子操作，
+    網站不會看到半套檔案；回復上一版也只是再切換一次 symlink。
+    """
+
+    def __init__(self, ssh, sftp, root, keep=KEEP_RELEASES):
+        """
+        :param root: 對外使用的路徑（例如 dist/pspf），部署後會是 symlink
+        :param keep: 保留的舊版本數
+        """
+        self.ssh = ssh
+        self.sftp = sftp
+        self.root = root
+        self.keep = keep
+        parent, name = posixpath.split(root.rstrip("/"))
+        self.parent = parent
+        # symlink 使用相對路徑，整個目標資料夾搬移後仍然有效
+        self.link_prefix = f".{name}-releases"
+        self.releases_dir = posixpath.join(parent, self.link_prefix)
+
+    def release_path(self, release_id):
+        return posixpath.join(self.releases_dir, release_id)
+
+    def list_releases(self):
+        """
+        由舊到新排列的版本名稱
+        """
+        try:
+            entries = self.sftp.listdir_attr(self.releases_dir)
+        except IOError:
+            return []
+        return sorted(e.filename for e in entries if stat.S_ISDIR(e.st_mode or 0))
+
+    def root_stat(self):
+        try:
+            return self.sftp.lstat(self.root)
+        except IOError:
+            return None
+
+    def current(self):
+        """
+        目前 symlink 指向的版本；尚未使用版本化部署時回傳 None
+        """
+        st = self.root_stat()
+        if st is None or not stat.S_ISLNK(st.st_mode or 0):
+            return None
+        return posixpath.basename(self.sftp.readlink(self.root).rstrip("/"))
+
+    def new_release_id(self, timestamp=None):
+        base = time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+        existing = set(self.list_releases())
+        release_id = base
+        suffix = 2
+        while release_id in existing:
+            release_id = f"{base}-{suffix}"
+            suffix += 1
+        return release_id
+
+    def prepare(self, release_id, seed=True):
+        """
+        建立新版本資料夾
+
+        :param seed: 以目前版本（cp -a）為基礎，之後的差異同步只需上傳變更的檔案
+        :return: (版本資料夾路徑, 是否已複製目前版本)
+        """
+        path = self.release_path(release_id)
+        source = None
+        if seed:
+            current = self.current()
+            st = self.root_stat()
+            if current:
+                source = self.release_path(current)
+            elif st is not None and stat.S_ISDIR(st.st_mode or 0):
+                source = self.root
+
+        command = f"mkdir -p {shlex.quote(path)}"
+        if source:
+            command += f" && cp -a {shlex.quote(source + '/.')} {shlex.quote(path)}"
+        run_checked(self.ssh, command)
+        return path, source is not None
+
+    def activate(self, release_id):
+        """
+        將 root 原子性地切換到指定版本
+
+        root 原本是一般資料夾（舊的部署方式）時，先搬進版本資料夾成為一個版本；
+        這第一次切換需要兩次 rename，中間會有一瞬間 root 不存在，之後的切換才是原子性的。
+        第二次 rename 失敗時會把原本的資料夾搬回 root。
+
+        :return: 搬移的舊資料夾版本名稱，沒有時為 None
+        """
+        link_tmp = f"{self.root}.tmp-link"
+        target = posixpath.join(self.link_prefix, release_id)
+        run_checked(self.ssh, f"rm -f {shlex.quote(link_tmp)} && ln -s {shlex.quote(target)} {shlex.quote(link_tmp)}")
+
+        migrated = None
+        st = self.root_stat()
+        if st is not None and not stat.S_ISLNK(st.st_mode or 0):
+            migrated = self.new_release_id(self.legacy_timestamp(st.st_mtime, release_id))
+            self.sftp.posix_rename(self.root, self.release_path(migrated))
+        try:
+            self.sftp.posix_rename(link_tmp, self.root)
+        except Exception:
+            if migrated:
+                self.sftp.posix_rename(self.release_path(migrated), self.root)
+            try:
+                self.sftp.remove(link_tmp)
+            except Exception:
+                pass
+            raise
+        return migrated
+
+    @staticmethod
+    def legacy_timestamp(mtime, release_id):
+        """
+        舊資料夾以修改時間命名；需早於要切換的版本，list_releases / prune / rollback 的排序才會把它當成前一版
+        """
+        try:
+            before = time.mktime(time.strptime(release_id[:15], "%Y%m%d-%H%M%S")) - 1
+        except ValueError:
+            return mtime
+        return min(mtime, before)
+
+    def remove(self, release_id):
+        try:
+            run_checked(self.ssh, f"rm -rf {shlex.quote(self.release_path(release_id))}")
+        except Exception:
+            pass
+
+    def prune(self, keep=None):
+        """
+        刪除超過保留數量的舊版本，目前使用中的版本一定保留
+
+        :return: 已刪除的版本名稱
+        """
+        keep = self.keep if keep is None else keep
+        current = self.current()
+        older = [r for r in self.list_releases() if r != current]
+        removed = older[:max(0, len(older) - keep)]
+        if removed:
+            paths = " ".join(shlex.quote(self.release_path(r)) for r in removed)
+            run_checked(self.ssh, f"rm -rf {paths}")
+        return removed
+
+    def rollback(self, release_id=None):
+        """
+        切換回指定版本，未指定時切換到目前版本的前一版
+
+        :return: (原本的版本, 切換後的版本)
+        :raises ValueError: 找不到可回復的版本
+        """
+        releases = self.list_releases()
+        current = self.current()
+        if release_id is None:
+            older = [r for r in releases if current is None or r < current]
+            if not older:
+                raise ValueError("沒有可回復的舊版本")
+            release_id = older[-1]
+        elif release_id not in releases:
+            raise ValueError(f"找不到版本：{release_id}（可用：{', '.join(releases) or '無'}）")
+        self.activate(release_id)
+        return current, release_id
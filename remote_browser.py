@@ -0,0 +1,138 @@
+# remote_browser.py
+import fnmatch
+import posixpath
+import stat
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# 快取的資料夾數與項目總數上限（最久未使用的先移除），以及清單有效秒數
+LISTING_CACHE_SIZE = 64
+LISTING_CACHE_ENTRIES = 200000
+LISTING_TTL = 60
+# 樹狀清單每次加入的項目數，大資料夾其餘項目以「載入更多…」分頁顯示
+PAGE_SIZE = 500
+
+# key 為小寫檔名，篩選時不必每次轉換
+RemoteEntry = namedtuple("RemoteEntry", "name path is_dir size mtime key")
+
+
+def list_directory(sftp, path):
+    """
+    以一次 listdir_attr 取得資料夾內容（資料夾在前，其餘依檔名排序）
+
+    :return: RemoteEntry 清單
+    """
+    entries = [
+        RemoteEntry(
+            attr.filename,
+            posixpath.join(path, attr.filename),
+            stat.S_ISDIR(attr.st_mode or 0),
+            attr.st_size or 0,
+            attr.st_mtime or 0,
+            attr.filename.lower(),
+        )
+        for attr in sftp.listdir_attr(path)
+    ]
+    entries.sort(key=lambda e: (not e.is_dir, e.key))
+    return entries
+
+
+def match_filter(text):
+    """
+    將篩選文字轉成比對函式：含 * ? [ 時視為萬用字元，否則為不分大小寫的部分比對
+
+    :return: fn(entry) -> bool；text 空白時為 None
+    """
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+    if any(c in text for c in "*?["):
+        return lambda entry: fnmatch.fnmatchcase(entry.key, text)
+    return lambda entry: text in entry.key
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ListingCache:
+    """
+    遠端資料夾清單的 LRU 快取；超過 ttl 秒的清單視為過期，需重新 listdir_attr
+    """
+
+    def __init__(self, max_dirs=LISTING_CACHE_SIZE, max_entries=LISTING_CACHE_ENTRIES, ttl=LISTING_TTL):
+        self.max_dirs = max_dirs
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entry_count = 0
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, allow_stale=False):
+        """
+        :param allow_stale: 過期的清單也回傳（先顯示，背景再重新取得）
+        :return: (RemoteEntry 清單, 是否仍有效)；沒有快取時為 (None, False)
+        """
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is None:
+                return None, False
+            self._listings.move_to_end(path)
+            fetched_at, entries = cached
+        fresh = time.monotonic() - fetched_at < self.ttl
+        if not fresh and not allow_stale:
+            return None, False
+        return entries, fresh
+
+    def put(self, path, entries):
+        with self._lock:
+            self._remove(path)
+            self._listings[path] = (time.monotonic(), entries)
+            self.entry_count += len(entries)
+            # 至少保留剛放入的清單
+            while len(self._listings) > 1 and (
+                len(self._listings) > self.max_dirs or self.entry_count > self.max_entries
+            ):
+                self._remove(next(iter(self._listings)))
+
+    def _remove(self, path):
+        cached = self._listings.pop(path, None)
+        if cached is not None:
+            self.entry_count -= len(cached[1])
+
+    def invalidate(self, path=None):
+        """
+        移除 path 與其底下資料夾的清單；path 為 None 時全部清除
+        """
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+                self.entry_count = 0
+                return
+            prefix = path.rstrip("/") + "/"
+            for key in [k for k in self._listings if k == path or k.startswith(prefix)]:
+                self._remove(key)
+
+    def search(self, text, limit=PAGE_SIZE):
+        """
+        在所有已快取（含過期）的清單中依檔名篩選，不會連線
+
+        :return: 符合的 RemoteEntry 清單（最多 limit 筆）
+        """
+        matches = match_filter(text)
+        if matches is None:
+            return []
+        with self._lock:
+            listings = [entries for _, entries in self._listings.values()]
+        results = []
+        for entries in listings:
+            for entry in entries:
+                if matches(entry):
+                    results.append(entry)
+                    if len(results) >= limit:
+                        return results
+        return results
@@ -0,0 +1,114 @@
+# remote_cache.py
+import posixpath
+import stat
+import threading
+
+
+def _normalize(path):
+    path = posixpath.normpath(path.replace("\\", "/"))
+    return "" if path == "." else path
+
+
+def _parents(path):
+    """
+    path 本身與所有上層（不含 "" 與 "/"）
+    """
+    while path and path not in ("/", "."):
+        yield path
+        path = posixpath.dirname(path)
+
+
+class RemoteDirCache:
+    """
+    記錄已知存在的遠端資料夾，省去每個資料夾 stat / chdir 的來回
+
+    資料來源：DeploySync 走訪遠端（scan_remote）時看到的資料夾、遠端清單中的檔案路徑（learn_files），
+    或本次建立的資料夾（learn）。
+    只在同一組連線借用期間有效（SftpConnectionPool 歸還時清空），遠端被其他指令改動時以 forget 移除。
+    """
+
+    def __init__(self):
+        self._dirs = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        with self._lock:
+            return _normalize(path) in self._dirs
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dirs)
+
+    def learn(self, path):
+        """
+        記錄 path（與其所有上層）存在
+        """
+        with self._lock:
+            self._dirs.update(_parents(_normalize(path)))
+
+    def learn_files(self, remote_root, rel_paths):
+        """
+        由遠端清單中的檔案路徑推得存在的資料夾
+        """
+        root = _normalize(remote_root)
+        with self._lock:
+            self._dirs.update(_parents(root))
+            for rel_path in rel_paths:
+                self._dirs.update(_parents(posixpath.dirname(posixpath.join(root, rel_path))))
+
+    def forget(self, path):
+        """
+        移除 path 與其底下所有資料夾（例如遠端執行 rm -rf 之後）
+        """
+        path = _normalize(path)
+        prefix = path.rstrip("/") + "/"
+        with self._lock:
+            self._dirs = {d for d in self._dirs if d != path and not d.startswith(prefix)}
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+
+    def ensure_dirs(self, remote_dirs, channel, executor=None):
+        """
+        建立尚未確認存在的資料夾：直接 mkdir（新資料夾只需一次來回），失敗時才 stat 確認是否已存在；
+        有 executor 時同一層的資料夾分給多個 channel 同時建立
+
+        :param remote_dirs: 遠端資料夾清單（父層在前）
+        :param channel: 回傳目前執行緒可用 SFTPClient 的函式
+        :param executor: 共用的 ThreadPoolExecutor（例如上傳用的執行緒），None 表示依序建立
+        :return: 實際新建的資料夾數
+        """
+        levels = {}
+        for remote_dir in remote_dirs:
+            if remote_dir not in self:
+                path = _normalize(remote_dir)
+                levels.setdefault(path.count("/"), []).append(path)
+        if not levels:
+            return 0
+
+        def make(path):
+            sftp = channel()
+            try:
+                sftp.mkdir(path)
+                created = 1
+            except IOError as e:
+                # 已存在則沿用；不是資料夾或上層不存在時保留 mkdir 的錯誤
+                try:
+                    is_dir = stat.S_ISDIR(sftp.stat(path).st_mode or 0)
+                except IOError:
+                    is_dir = False
+                if not is_dir:
+                    raise e
+                created = 0
+            self.learn(path)
+            return created
+
+        created = 0
+        for depth in sorted(levels):
+            paths = levels[depth]
+            if executor is None or len(paths) == 1:
+                created += sum(make(path) for path in paths)
+            else:
+                created += sum(executor.map(make, paths))
+        return created
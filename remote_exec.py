@@ -0,0 +1,234 @@
+# remote_exec.py
+import codecs
+import select
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 未指定 timeout 時每個遠端指令的上限（秒）
+DEFAULT_TIMEOUT = 300
+# 結果中保留的輸出量（每個串流只留最後這麼多字元），完整輸出由 on_output 逐行取得
+OUTPUT_LIMIT = 64 * 1024
+# 每次 select 等待的秒數，也是檢查取消與逾時的間隔
+POLL_INTERVAL = 0.2
+
+
+class CommandResult:
+    """
+    一個遠端指令的結果
+    """
+
+    def __init__(self, command, name=None):
+        self.command = command
+        self.name = name or command
+        self.exit_status = None
+        self.stdout = ""
+        self.stderr = ""
+        self.elapsed = 0.0
+        self.timed_out = False
+        self.cancelled = False
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.exit_status == 0 and not (self.timed_out or self.cancelled or self.error)
+
+    def describe(self):
+        if self.error:
+            return f"❌ {self.name}：{self.error}"
+        if self.timed_out:
+            return f"⏰ {self.name}：逾時（{self.elapsed:.1f} 秒）"
+        if self.cancelled:
+            return f"⏹ {self.name}：已取消"
+        icon = "✅" if self.ok else "❌"
+        return f"{icon} {self.name}：結束代碼 {self.exit_status}（{self.elapsed:.1f} 秒）"
+
+
+class _LineBuffer:
+    """
+    將收到的位元組解碼成行，並只保留最後 limit 個字元
+    """
+
+    def __init__(self, limit):
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.partial = ""
+        self.tail = deque()
+        self.tail_size = 0
+        self.limit = limit
+
+    def feed(self, data, final=False):
+        text = self.partial + self.decoder.decode(data, final)
+        lines = text.split("\n")
+        self.partial = "" if final else lines.pop()
+        if final and lines and lines[-1] == "":
+            lines.pop()
+        for line in lines:
+            self.tail.append(line)
+            self.tail_size += len(line) + 1
+            while self.tail_size > self.limit and len(self.tail) > 1:
+                self.tail_size -= len(self.tail.popleft()) + 1
+        return [line.rstrip("\r") for line in lines]
+
+    def text(self):
+        return "\n".join(self.tail)
+
+
+def run_command(ssh, command, timeout=DEFAULT_TIMEOUT, on_output=None, cancel_event=None,
+                name=None, limit=OUTPUT_LIMIT):
+    """
+    在新的 channel 上執行遠端指令，同時讀取 stdout 與 stderr（不會因其中一邊塞滿而互相等待）
+
+    :param ssh: 已連線的 paramiko.SSHClient；多個指令可同時在同一條連線上執行
+    :param timeout: 秒數，逾時會關閉 channel；None 表示不限制
+    :param on_output: on_output(stream, line)，stream 為 "stdout" 或 "stderr"，於本執行緒呼叫
+    :param cancel_event: threading.Event，設定後關閉 channel
+    :return: CommandResult（連線錯誤記錄在 result.error，不會丟出例外）
+    """
+    result = CommandResult(command, name)
+    buffers = {"stdout": _LineBuffer(limit), "stderr": _LineBuffer(limit)}
+    start = time.monotonic()
+
+    def emit(stream, data, final=False):
+        for line in buffers[stream].feed(data, final):
+            if on_output:
+                on_output(stream, line)
+
+    channel = None
+    try:
+        channel = ssh.get_transport().open_session()
+        channel.exec_command(command)
+        channel.shutdown_write()
+        while True:
+            if channel.recv_ready():
+                emit("stdout", channel.recv(32768))
+            elif channel.recv_stderr_ready():
+                emit("stderr", channel.recv_stderr(32768))
+            elif channel.exit_status_ready() and channel.eof_received:
+                break
+            else:
+                if cancel_event is not None and cancel_event.is_set():
+                    result.cancelled = True
+                    break
+                if timeout is not None and time.monotonic() - start > timeout:
+                    result.timed_out = True
+                    break
+                select.select([channel], [], [], POLL_INTERVAL)
+        # 讀完 channel 關閉前剩下的資料
+        while channel.recv_ready():
+            emit("stdout", channel.recv(32768))
+        while channel.recv_stderr_ready():
+            emit("stderr", channel.recv_stderr(32768))
+        if not (result.timed_out or result.cancelled):
+            result.exit_status = channel.recv_exit_status()
+    except Exception as e:
+        result.error = e
+    finally:
+        if channel is not None:
+            channel.close()
+        emit("stdout", b"", final=True)
+        emit("stderr", b"", final=True)
+        result.stdout = buffers["stdout"].text()
+        result.stderr = buffers["stderr"].text()
+        result.elapsed = time.monotonic() - start
+    return result
+
+
+def normalize_commands(value, key="commands"):
+    """
+    正規化 pre_deploy_commands / post_deploy_commands
+
+    每一項可以是字串、{"command", "name", "timeout", "continue_on_error"}，
+    或是上述項目的清單（同一組內的指令同時執行）；各組依序執行。
+
+    :return: [[{"command", "name", "timeout", "continue_on_error"}, ...], ...]
+    :raises ValueError: 格式錯誤
+    """
+    if not value:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"{key} 必須是清單")
+
+    def item(entry):
+        if isinstance(entry, str):
+            entry = {"command": entry}
+        if not isinstance(entry, dict) or not str(entry.get("command") or "").strip():
+            raise ValueError(f"{key} 中的項目缺少 command：{entry!r}")
+        timeout = entry.get("timeout", DEFAULT_TIMEOUT)
+        try:
+            timeout = None if timeout is None else float(timeout)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} 的 timeout 格式錯誤：{timeout!r}")
+        return {
+            "command": entry["command"],
+            "name": entry.get("name") or entry["command"],
+            "timeout": timeout,
+            "continue_on_error": bool(entry.get("continue_on_error", False)),
+        }
+
+    return [[item(e) for e in entry] if isinstance(entry, list) else [item(entry)] for entry in value]
+
+
+class RemoteExecutor:
+    """
+    在同一條 SSH 連線上同時開啟多個 channel 執行遠端指令
+    """
+
+    def __init__(self, ssh, max_parallel=4, log=None, cancel_event=None):
+        """
+        :param max_parallel: 同一組內同時執行的指令數上限
+        :param log: 接收輸出的函式，可於任何執行緒呼叫
+        """
+        self.ssh = ssh
+        self.max_parallel = max(1, max_parallel)
+        self.log = log or (lambda message: None)
+        self.cancel_event = cancel_event
+        self._log_lock = threading.Lock()
+
+    def run(self, command, timeout=DEFAULT_TIMEOUT, name=None, prefix=""):
+        """
+        執行單一指令，輸出逐行寫入 log
+
+        :param prefix: 每行輸出前加上的標示（同時執行多個指令時用來分辨來源）
+        """
+        def on_output(stream, line):
+            marker = "│" if stream == "stdout" else "!"
+            with self._log_lock:
+                self.log(f"  {marker} {prefix}{line}\n")
+
+        return run_command(self.ssh, command, timeout, on_output, self.cancel_event, name)
+
+    def run_group(self, items):
+        """
+        同時執行一組指令
+
+        :param items: normalize_commands() 的一組
+        :return: CommandResult 清單（與 items 順序相同）
+        """
+        if len(items) == 1:
+            entry = items[0]
+            return [self.run(entry["command"], entry["timeout"], entry["name"])]
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(items)), thread_name_prefix="remote-exec") as pool:
+            futures = [
+                pool.submit(self.run, e["command"], e["timeout"], e["name"], f"[{e['name'][:24]}] ")
+                for e in items
+            ]
+            return [future.result() for future in futures]
+
+    def run_groups(self, groups):
+        """
+        依序執行各組；某組中有不允許失敗（continue_on_error 為 false）的指令失敗時停止
+
+        :return: (是否全部成功, CommandResult 清單)
+        """
+        results = []
+        for items in groups:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                return False, results
+            group_results = self.run_group(items)
+            results.extend(group_results)
+            for entry, result in zip(items, group_results):
+                self.log(result.describe() + "\n")
+            if any(not r.ok and not e["continue_on_error"] for e, r in zip(items, group_results)):
+                return False, results
+        return True, results
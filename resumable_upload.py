@@ -0,0 +1,157 @@
+# resumable_upload.py
+import hashlib
+import os
+import shlex
+import time
+
+from sftp_uploader import UploadCancelled
+
+# 上傳中的檔案先寫到 <目的檔>.part，完成驗證後才改名
+PART_SUFFIX = ".part"
+# 每次從本地讀取並送出的大小；paramiko 會再切成 32 KB 的 SFTP 請求並以 pipeline 送出
+CHUNK_SIZE = 1024 * 1024
+# 小於此大小的檔案直接 put，不值得多花 stat/驗證/改名的來回
+RESUMABLE_MIN_SIZE = 8 * 1024 * 1024
+
+
+class ChecksumMismatch(Exception):
+    """
+    上傳後遠端內容與本地不一致
+    """
+
+
+class ResumeResult:
+    def __init__(self, size, resumed_from, elapsed, verified_by, sha256, verify_elapsed=0.0):
+        self.size = size
+        self.resumed_from = resumed_from
+        self.elapsed = elapsed
+        self.verify_elapsed = verify_elapsed
+        self.verified_by = verified_by
+        self.sha256 = sha256
+
+
+def local_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_sha256(sftp, remote_path, ssh=None):
+    """
+    取得遠端檔案的 sha256，依序嘗試：遠端 sha256sum、SFTP check-file 擴充、重新讀回計算
+
+    :return: (hex digest, 驗證方式)
+    """
+    if ssh is not None:
+        try:
+            stdin, stdout, stderr = ssh.exec_command(f"sha256sum {shlex.quote(remote_path)}")
+            output = stdout.read().decode("utf-8", "replace")
+            if stdout.channel.recv_exit_status() == 0 and output:
+                return output.split()[0].lower(), "sha256sum"
+        except Exception:
+            pass
+
+    with sftp.open(remote_path, "rb") as f:
+        try:
+            return f.check("sha256").hex(), "check-file"
+        except Exception:
+            # 多數伺服器（包含 OpenSSH）不支援 check-file，改為讀回計算
+            pass
+        f.prefetch()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+        return digest.hexdigest(), "re-read"
+
+
+def upload_resumable(sftp, local_path, remote_path, ssh=None, on_progress=None, cancel_event=None):
+    """
+    可續傳的單檔上傳
+
+    寫入 remote_path + ".part"；若已有部分內容則從該位置繼續。完成後驗證 sha256，
+    一致才以 posix_rename 原子性地取代目的檔；不一致時刪除暫存檔並丟出 ChecksumMismatch。
+
+    :param on_progress: on_progress(已傳送位元組, 總大小)
+    :return: ResumeResult
+    """
+    start = time.perf_counter()
+    size = os.path.getsize(local_path)
+    part_path = remote_path + PART_SUFFIX
+
+    try:
+        offset = sftp.stat(part_path).st_size or 0
+    except IOError:
+        offset = 0
+    if offset > size:
+        offset = 0
+
+    with open(local_path, "rb") as src, sftp.open(part_path, "r+b" if offset else "wb") as dst:
+        dst.set_pipelined(True)
+        if offset:
+            src.seek(offset)
+            dst.seek(offset)
+        sent = offset
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            if cancel_event is not None and cancel_event.is_set():
+                raise UploadCancelled("已取消，已上傳的部分會保留供下次續傳")
+            dst.write(chunk)
+            sent += len(chunk)
+            if on_progress:
+                on_progress(sent, size)
+
+    verify_start = time.perf_counter()
+    expected = local_sha256(local_path)
+    actual, verified_by = remote_sha256(sftp, part_path, ssh)
+    if actual != expected:
+        sftp.remove(part_path)
+        raise ChecksumMismatch(f"sha256 不一致（本地 {expected[:12]}…，遠端 {actual[:12]}…）")
+
+    try:
+        sftp.posix_rename(part_path, remote_path)
+    except IOError:
+        # 伺服器不支援 posix-rename 擴充時，退回先刪除再改名
+        try:
+            sftp.remove(remote_path)
+        except IOError:
+            pass
+        sftp.rename(part_path, remote_path)
+
+    end = time.perf_counter()
+    return ResumeResult(size, offset, end - start, verified_by, expected, end - verify_start)
+
+
+def upload_with_retry(open_session, local_path, remote_path, retries=3, log=None,
+                      on_progress=None, cancel_event=None):
+    """
+    連線中斷時重新取得連線並從斷點續傳
+
+    :param open_session: 回傳 context manager 的函式，with 內可取得帶 .ssh/.sftp 的連線
+    :param retries: 最多重試次數
+    :param log: 接收重試訊息的函式
+    """
+    log = log or (lambda message: None)
+    attempt = 0
+    while True:
+        try:
+            with open_session() as session:
+                return upload_resumable(
+                    session.sftp, local_path, remote_path, session.ssh, on_progress, cancel_event
+                )
+        except (UploadCancelled, FileNotFoundError, PermissionError):
+            raise
+        except Exception as e:
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = min(30, 2 ** attempt)
+            if isinstance(e, ChecksumMismatch):
+                log(f"⚠️ {e}，重新上傳（第 {attempt}/{retries} 次重試）\n")
+            else:
+                log(f"⚠️ 上傳中斷：{e}，{delay} 秒後從斷點續傳（第 {attempt}/{retries} 次重試）\n")
+                if cancel_event is not None:
+                    if cancel_event.wait(delay):
+                        raise UploadCancelled("已取消，已上傳的部分會保留供下次續傳")
+                else:
+                    time.sleep(delay)
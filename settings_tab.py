@@ -1,19 +1,30 @@
 import json
 import os
-import subprocess
-import paramiko
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QLabel, QPushButton,
-    QLineEdit, QFileDialog, QGroupBox
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+    QLineEdit, QFileDialog, QGroupBox, QCheckBox, QTextEdit, QComboBox, QInputDialog
 )
 
+from deploy_config import normalize_config
+from deploy_pipeline import DeployPipeline
+from job_queue import JobRunner, JobStore, describe_job
+from log_sink import LogSink
+from task_runner import shared_executor
+
 class SettingsTab(QWidget):
     def __init__(self, output_display):
         super().__init__()
         self.output = output_display
-        self.ssh = None
-        self.sftp = None
+        self.loaded_config = {}
+        self.loaded_config_dir = None
+        self.tasks = []
+        self.last_metrics = None
+        self.store = JobStore()
+        self.queue_task = None
         self.init_ui()
+        self.sink = LogSink([self.output], parent=self)
+        self.refresh_profiles()
+        self.refresh_jobs()
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -21,6 +32,28 @@ class SettingsTab(QWidget):
         load_button.clicked.connect(self.load_json_file)
         layout.addWidget(load_button)
 
+        # 具名設定檔：不必每次開檔即可重複部署，並可排入佇列依序執行
+        profile_group = QGroupBox("📋 設定檔與部署佇列")
+        profile_layout = QVBoxLayout()
+        profile_row = QHBoxLayout()
+        self.profile_combo = QComboBox()
+        load_profile_button = QPushButton("📂 載入")
+        load_profile_button.clicked.connect(self.load_profile)
+        save_profile_button = QPushButton("💾 存為設定檔")
+        save_profile_button.clicked.connect(self.save_profile)
+        enqueue_button = QPushButton("⏳ 排入佇列")
+        enqueue_button.clicked.connect(self.enqueue_profile)
+        profile_row.addWidget(self.profile_combo, 1)
+        for button in (load_profile_button, save_profile_button, enqueue_button):
+            profile_row.addWidget(button)
+        self.jobs_display = QTextEdit()
+        self.jobs_display.setReadOnly(True)
+        self.jobs_display.setMaximumHeight(100)
+        profile_layout.addLayout(profile_row)
+        profile_layout.addWidget(self.jobs_display)
+        profile_group.setLayout(profile_layout)
+        layout.addWidget(profile_group)
+
         # SFTP/SSH 設定區塊
         sftp_group = QGroupBox("SSH 設定")
         sftp_layout = QVBoxLayout()
@@ -28,8 +61,11 @@ class SettingsTab(QWidget):
         self.sftp_port_input = QLineEdit()
         self.sftp_user_input = QLineEdit()
         self.sftp_pass_input = QLineEdit()
+        self.sftp_workers_input = QLineEdit()
+        self.targets_input = QLineEdit()
 
-        for widget in (self.sftp_host_input, self.sftp_port_input, self.sftp_user_input, self.sftp_pass_input):
+        for widget in (self.sftp_host_input, self.sftp_port_input, self.sftp_user_input, self.sftp_pass_input,
+                       self.sftp_workers_input, self.targets_input):
             widget.setReadOnly(True)
 
         sftp_layout.addWidget(QLabel("SSH 主機名稱："))
@@ -40,6 +76,10 @@ class SettingsTab(QWidget):
         sftp_layout.addWidget(self.sftp_user_input)
         sftp_layout.addWidget(QLabel("密碼："))
         sftp_layout.addWidget(self.sftp_pass_input)
+        sftp_layout.addWidget(QLabel("並行上傳數："))
+        sftp_layout.addWidget(self.sftp_workers_input)
+        sftp_layout.addWidget(QLabel("部署目標（targets，同時上傳；有填寫時取代上方主機，上方欄位只作為預設值）："))
+        sftp_layout.addWidget(self.targets_input)
         sftp_group.setLayout(sftp_layout)
         layout.addWidget(sftp_group)
 
@@ -50,12 +90,16 @@ class SettingsTab(QWidget):
         self.cmd_command_input = QLineEdit()
         self.cmd_copy_source_input = QLineEdit()
         self.sftp_target_path_input = QLineEdit()
+        self.deploy_mode_input = QLineEdit()
+        self.transfer_mode_input = QLineEdit()
 
         for widget in (
             self.cmd_working_dir_input,
             self.cmd_command_input,
             self.cmd_copy_source_input,
-            self.sftp_target_path_input
+            self.sftp_target_path_input,
+            self.deploy_mode_input,
+            self.transfer_mode_input
         ):
             widget.setReadOnly(True)
 
@@ -67,15 +111,51 @@ class SettingsTab(QWidget):
         cmd_layout.addWidget(self.cmd_copy_source_input)
         cmd_layout.addWidget(QLabel("遠端目標路徑："))
         cmd_layout.addWidget(self.sftp_target_path_input)
+        cmd_layout.addWidget(QLabel("部署模式（sync 差異同步 / full 全部重傳 / release 版本切換 / pipelined 邊 build 邊上傳）："))
+        cmd_layout.addWidget(self.deploy_mode_input)
+        cmd_layout.addWidget(QLabel("傳輸方式（sftp 逐檔上傳 / tar 壓縮串流）："))
+        cmd_layout.addWidget(self.transfer_mode_input)
+        # 輸入檔案與指令都沒變時會略過 build，勾選後一定重新執行
+        self.force_rebuild_checkbox = QCheckBox("🔨 強制重新 build（忽略 build 快取）")
+        cmd_layout.addWidget(self.force_rebuild_checkbox)
         cmd_group.setLayout(cmd_layout)
         layout.addWidget(cmd_group)
 
+        button_layout = QHBoxLayout()
         self.apply_button = QPushButton("✅ 套用設定")
-        layout.addWidget(self.apply_button)
         self.apply_button.clicked.connect(self.apply_settings)
+        self.cancel_button = QPushButton("⏹ 取消執行")
+        self.cancel_button.clicked.connect(self.cancel_tasks)
+        # release / pipelined 模式部署過的主機可直接切換回前一版
+        self.rollback_button = QPushButton("↩️ 回復上一版")
+        self.rollback_button.clicked.connect(self.rollback_release)
+        button_layout.addWidget(self.apply_button)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addWidget(self.rollback_button)
+        layout.addLayout(button_layout)
+
+        # 最近一次部署的各階段耗時、傳輸量與最慢的檔案
+        metrics_group = QGroupBox("📊 執行統計")
+        metrics_layout = QVBoxLayout()
+        self.metrics_display = QTextEdit()
+        self.metrics_display.setReadOnly(True)
+        self.metrics_display.setMaximumHeight(160)
+        self.export_button = QPushButton("💾 匯出統計（JSON / CSV）")
+        self.export_button.setEnabled(False)
+        self.export_button.clicked.connect(self.export_metrics)
+        metrics_layout.addWidget(self.metrics_display)
+        metrics_layout.addWidget(self.export_button)
+        metrics_group.setLayout(metrics_layout)
+        layout.addWidget(metrics_group)
 
         self.setLayout(layout)
 
+    def log(self, message):
+        """
+        可於任何執行緒呼叫，訊息會批次附加到輸出區並寫入記錄檔
+        """
+        self.sink.write(message)
+
     def load_json_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "選擇 JSON 檔案", "", "JSON Files (*.json)"
@@ -84,152 +164,204 @@ class SettingsTab(QWidget):
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                self.fill_fields(data)
+                self.fill_fields(data, os.path.dirname(file_path))
             except Exception as e:
-                self.output.append(f"❌ 讀取 JSON 錯誤: {e}\n")
+                self.log(f"❌ 讀取 JSON 錯誤: {e}\n")
 
-    def fill_fields(self, data):
+    def fill_fields(self, data, base_dir=None):
+        """
+        :param base_dir: JSON 檔所在資料夾，存為設定檔時用來展開相對的 cmd_working_dir
+        """
+        # 保留完整設定，介面上沒有欄位的選項（例如 cmd_timeout）於套用時讀取
+        self.loaded_config = data
+        self.loaded_config_dir = base_dir
         self.sftp_host_input.setText(data.get("sftp_host", ""))
         self.sftp_port_input.setText(str(data.get("sftp_port", "")))
         self.sftp_user_input.setText(data.get("sftp_user", ""))
         self.sftp_pass_input.setText(data.get("sftp_pass", ""))
+        self.sftp_workers_input.setText(str(data.get("sftp_workers", 4)))
         self.cmd_working_dir_input.setText(data.get("cmd_working_dir", ""))
         self.cmd_command_input.setText(data.get("cmd_command", ""))
         self.cmd_copy_source_input.setText(data.get("cmd_copy_source", ""))
         self.sftp_target_path_input.setText(data.get("sftp_target_path", ""))
+        self.deploy_mode_input.setText(data.get("deploy_mode", "sync"))
+        self.transfer_mode_input.setText(data.get("transfer_mode", "sftp"))
+        self.force_rebuild_checkbox.setChecked(bool(data.get("force_rebuild", False)))
+        targets = data.get("targets") or []
+        self.targets_input.setText(
+            f"{len(targets)} 台：" + ", ".join(str(t.get("sftp_host", "")) for t in targets) if targets else ""
+        )
+
+    def current_config(self):
+        """
+        以匯入的 JSON 為基礎，套上介面欄位的值（需於 GUI 執行緒呼叫）
+        """
+        data = dict(self.loaded_config)
+        data.update({
+            # SSH/SFTP 主機名稱、連接埠（空白時預設 22）、帳號與密碼
+            "sftp_host": self.sftp_host_input.text(),
+            "sftp_port": self.sftp_port_input.text().strip(),
+            "sftp_user": self.sftp_user_input.text(),
+            "sftp_pass": self.sftp_pass_input.text(),
+            # 並行上傳的 SFTP channel 數，未設定時預設為 4
+            "sftp_workers": self.sftp_workers_input.text().strip(),
+            # 本機要執行命令的工作目錄與指令（例如 build、打包指令）
+            "cmd_working_dir": self.cmd_working_dir_input.text(),
+            "cmd_command": self.cmd_command_input.text(),
+            # 要上傳的資料來源資料夾（通常是 build 完的資料夾）
+            "cmd_copy_source": self.cmd_copy_source_input.text(),
+            # 遠端主機上要儲存的目標路徑
+            "sftp_target_path": self.sftp_target_path_input.text(),
+            # 部署模式：sync 只上傳變更檔案，full 先刪除遠端再全部重傳
+            "deploy_mode": self.deploy_mode_input.text().strip(),
+            "transfer_mode": self.transfer_mode_input.text().strip(),
+            "force_rebuild": self.force_rebuild_checkbox.isChecked(),
+        })
+        return normalize_config(data)
 
     def apply_settings(self):
-        # 從介面取得 SSH/SFTP 主機名稱
-        self.sftp_host = self.sftp_host_input.text()
-        
-        # 取得連接埠，若欄位為空則預設為 22（SSH 預設 port）
-        self.sftp_port = int(self.sftp_port_input.text().strip() or "22")
-        
-        # 取得使用者帳號
-        self.sftp_user = self.sftp_user_input.text()
-        
-        # 取得密碼
-        self.sftp_pass = self.sftp_pass_input.text()
-        
-        # 取得本機要執行命令的工作目錄
-        self.cmd_working_dir = self.cmd_working_dir_input.text()
-        
-        # 取得要執行的本機命令（例如 build、打包指令）
-        self.cmd_command = self.cmd_command_input.text()
-        
-        # 取得要上傳的資料來源資料夾（通常是 build 完的資料夾）
-        self.cmd_copy_source = self.cmd_copy_source_input.text()
-        
-        # 設定遠端主機上要儲存的目標路徑
-        self.sftp_target_path = self.sftp_target_path_input.text()
-
-        # 建立 SSH 連線，若失敗則中止
-        if not self.connect_ssh(): return
-
-        # 切換至本機指定的工作目錄（避免 CMD 指令失效）
-        if not self.change_working_directory(): return
-
-        # 執行本機 CMD 指令（例如打包指令）
-        if not self.run_cmd_command(): return
-
-        # 清除遠端舊檔並上傳新檔案（透過 SFTP 處理）
-        if not self.remote_cleanup_and_upload(): return
-
-        # 若以上步驟皆成功，顯示成功訊息
-        self.output.append("✅ 設定已成功套用！\n")
-
-    def connect_ssh(self):
-        try:
-            self.ssh = paramiko.SSHClient()
-            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self.ssh.connect(
-                self.sftp_host,
-                port=self.sftp_port,
-                username=self.sftp_user,
-                password=self.sftp_pass
-            )
-            self.sftp = self.ssh.open_sftp()
-            self.output.append(f"✅ SSH & SFTP 連線成功（port: {self.sftp_port}）\n")
-            return True
-        except Exception as e:
-            self.output.append(f"❌ SSH/SFTP 連線失敗：{e}\n")
-            return False
-
-    def run_cmd_command(self):
-        try:
-            result = subprocess.run(
-                self.cmd_command, shell=True, capture_output=True, text=True, cwd=self.cmd_working_dir
-            )
-            self.output.append(f"> {self.cmd_command}\n{result.stdout}{result.stderr}\n")
-            return True
-        except Exception as e:
-            self.output.append(f"❌ 執行 CMD 指令時發生錯誤：{e}\n")
-            return False
-
-    def change_working_directory(self):
+        # 在 GUI 執行緒讀取欄位，交給背景工作執行，避免長時間的 build/上傳凍結視窗
+        self.submit(self.run_pipeline, "套用設定", on_finished=self.show_metrics)
+
+    def rollback_release(self):
+        self.submit(self.run_rollback, "回復上一版")
+
+    def submit(self, fn, name, on_finished=None):
         try:
-            os.chdir(self.cmd_working_dir)
-            self.output.append(f"✅ 切換至資料夾：{self.cmd_working_dir}\n")
-            return True
-        except Exception:
-            self.output.append(f"❌ 找不到資料夾：{self.cmd_working_dir}\n")
-            return False
-
-    def remote_cleanup_and_upload(self):
-        cleanup_cmd = f"rm -rf {self.sftp_target_path}/pspf"
-        if not self.run_remote_command(cleanup_cmd, "🗑️ 刪除遠端 pspf 資料夾"):
-            return False
-
-        mkdir_cmd = f"mkdir -p {self.sftp_target_path}"
-        if not self.run_remote_command(mkdir_cmd, "✅ 建立遠端目標資料夾"):
-            return False
+            config = self.current_config()
+        except ValueError as e:
+            self.log(f"❌ {e}\n")
+            return
+
+        executor = shared_executor()
+        if executor.pending:
+            self.log(f"⏳ 已排入佇列（前方還有 {executor.pending} 個工作）\n")
+        task = executor.submit(
+            fn, config, name=name, on_finished=on_finished,
+            on_failed=lambda error: self.log(f"❌ {name}失敗：{error}\n")
+        )
+        task.signals.cancelled.connect(lambda: self.log(f"⏹ 已取消{name}\n"))
+        task.signals.done.connect(lambda: self.tasks.remove(task))
+        self.tasks.append(task)
+
+    def cancel_tasks(self):
+        for task in self.tasks:
+            task.cancel()
 
+    def refresh_profiles(self):
+        current = self.profile_combo.currentText()
+        self.profile_combo.clear()
+        self.profile_combo.addItems([profile["name"] for profile in self.store.list_profiles()])
+        if current:
+            self.profile_combo.setCurrentText(current)
+
+    def refresh_jobs(self):
+        self.jobs_display.setPlainText("\n".join(describe_job(job) for job in self.store.jobs(limit=10)))
+
+    def load_profile(self):
+        name = self.profile_combo.currentText()
+        if not name:
+            return
         try:
-            self.upload_folder_sftp(self.cmd_copy_source, self.sftp_target_path)
-            self.output.append(f"✅ 資料夾已透過 SFTP 上傳至遠端：{self.sftp_target_path}\n")
-            return True
-        except Exception as e:
-            self.output.append(f"❌ SFTP 上傳失敗：{e}\n")
-            return False
-
-    def run_remote_command(self, command, description="執行指令"):
+            self.fill_fields(self.store.load_profile(name))
+            self.log(f"📂 已載入設定檔：{name}\n")
+        except KeyError as e:
+            self.log(f"❌ {e.args[0]}\n")
+            self.refresh_profiles()
+
+    def save_profile(self):
+        if not self.loaded_config:
+            self.log("❌ 請先匯入 JSON 設定檔\n")
+            return
+        name, ok = QInputDialog.getText(self, "存為設定檔", "設定檔名稱：", text=self.profile_combo.currentText())
+        if not ok:
+            return
         try:
-            stdin, stdout, stderr = self.ssh.exec_command(command)
-            out = stdout.read().decode()
-            err = stderr.read().decode()
-            if out:
-                self.output.append(f"{description} 成功：\n{out}")
-            if err:
-                self.output.append(f"{description} 錯誤：\n{err}")
-            return True
-        except Exception as e:
-            self.output.append(f"❌ 遠端指令失敗：{command} - {e}\n")
-            return False
-
-    def upload_folder_sftp(self, local_path, remote_path):
-        folder_name = os.path.basename(local_path.rstrip("/\\"))
-        target_root = os.path.join(remote_path, folder_name).replace("\\", "/")
-
-        # 建立 root 資料夾（即 pspf）
+            self.store.save_profile(name, self.loaded_config, self.loaded_config_dir)
+        except ValueError as e:
+            self.log(f"❌ {e}\n")
+            return
+        self.log(f"💾 已儲存設定檔：{name.strip()}\n")
+        self.refresh_profiles()
+        self.profile_combo.setCurrentText(name.strip())
+
+    def enqueue_profile(self):
+        name = self.profile_combo.currentText()
+        if not name:
+            self.log("❌ 尚未建立設定檔\n")
+            return
+        options = {"force_rebuild": True} if self.force_rebuild_checkbox.isChecked() else {}
         try:
-            self.sftp.chdir(target_root)
-        except IOError:
-            self.sftp.mkdir(target_root)
-            self.output.append(f"📁 建立遠端資料夾：{target_root}\n")
+            job_id = self.store.enqueue(name, options=options)
+        except KeyError as e:
+            self.log(f"❌ {e.args[0]}\n")
+            return
+        self.log(f"⏳ 已排入工作 #{job_id}：{name}\n")
+        self.refresh_jobs()
+        self.start_queue()
 
-        # 遞迴上傳子檔案與子資料夾
-        for root, dirs, files in os.walk(local_path):
-            rel_path = os.path.relpath(root, local_path)
-            remote_dir = os.path.join(target_root, rel_path).replace("\\", "/")
+    def start_queue(self):
+        """
+        佇列執行中時新工作會被同一個背景工作取出；否則排入共用工作佇列開始執行
+        """
+        if self.queue_task is not None:
+            return
+        task = shared_executor().submit(
+            self.run_queue, name="部署佇列", on_finished=self.show_metrics,
+            on_failed=lambda error: self.log(f"❌ 部署佇列失敗：{error}\n")
+        )
+        task.signals.cancelled.connect(lambda: self.log("⏹ 已取消部署佇列\n"))
+        task.signals.done.connect(lambda: self.queue_finished(task))
+        self.queue_task = task
+        self.tasks.append(task)
 
-            try:
-                self.sftp.chdir(remote_dir)
-            except IOError:
-                self.sftp.mkdir(remote_dir)
-                self.output.append(f"📁 建立遠端資料夾：{remote_dir}\n")
-
-            for file in files:
-                local_file = os.path.join(root, file)
-                remote_file = os.path.join(remote_dir, file).replace("\\", "/")
-                self.sftp.put(local_file, remote_file)
-                self.output.append(f"📤 上傳：{local_file} ➜ {remote_file}\n")
+    def queue_finished(self, task):
+        self.tasks.remove(task)
+        self.queue_task = None
+        self.refresh_jobs()
+        # 最後一個工作結束後才排入的工作
+        if not task.is_cancelled and self.store.pending_count():
+            self.start_queue()
+
+    def run_queue(self, task):
+        runner = JobRunner(self.store, 1, self.log, task.cancel_event)
+        runner.run_pending()
+        # 交給 on_finished 在 GUI 執行緒更新 last_metrics；沒有執行任何工作時為 None，沿用上一次的結果
+        return runner.last_metrics
+
+    def run_pipeline(self, task, config):
+        """
+        於背景執行緒執行部署流程（與命令列模式共用 DeployPipeline）
+        """
+        pipeline = DeployPipeline(config, self.log, task.cancel_event)
+        pipeline.run()
+        # 交給 on_finished 在 GUI 執行緒更新 last_metrics
+        return pipeline.metrics
+
+    def run_rollback(self, task, config):
+        return DeployPipeline(config, self.log, task.cancel_event).rollback()
+
+    def show_metrics(self, metrics=None):
+        """
+        :param metrics: 背景工作回傳的 RunMetrics，None 時沿用上一次的結果
+        """
+        if metrics is not None:
+            self.last_metrics = metrics
+        if self.last_metrics is None:
+            return
+        self.metrics_display.setPlainText("\n".join(self.last_metrics.summary_lines()))
+        self.export_button.setEnabled(True)
+
+    def export_metrics(self):
+        if self.last_metrics is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "匯出執行統計", f"deploy_{self.last_metrics.run_id}.json", "JSON Files (*.json);;CSV Files (*.csv)"
+        )
+        if not file_path:
+            return
+        try:
+            self.last_metrics.export(file_path)
+            self.log(f"💾 已匯出執行統計：{file_path}\n")
+        except OSError as e:
+            self.log(f"❌ 匯出執行統計失敗：{e}\n")
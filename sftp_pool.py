@@ -0,0 +1,156 @@
+# sftp_pool.py
+import threading
+import time
+from contextlib import contextmanager
+
+from remote_cache import RemoteDirCache
+from ssh_transport import connect, transport_key
+
+
+class PooledSession:
+    """
+    連線池中的一組 SSHClient / SFTPClient
+    """
+
+    def __init__(self, key, password, ssh, sftp):
+        self.key = key
+        self.password = password
+        self.ssh = ssh
+        self.sftp = sftp
+        self.last_used = time.monotonic()
+        # 借用期間已確認存在的遠端資料夾；歸還時清空，避免沿用其他程式改動前的狀態
+        self.dir_cache = RemoteDirCache()
+
+    def is_alive(self, probe=False):
+        """
+        檢查連線是否仍可用
+
+        :param probe: 是否額外送出一次 SFTP stat 做實際探測
+        """
+        transport = self.ssh.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        if probe:
+            try:
+                self.sftp.stat(".")
+            except Exception:
+                return False
+        return True
+
+    def close(self):
+        for client in (self.sftp, self.ssh):
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+class SftpConnectionPool:
+    """
+    以 (host, port, user, 傳輸設定) 為鍵的 SSH/SFTP 連線池
+
+    取出時會檢查連線是否存活，失效則自動重新連線；
+    閒置超過 idle_timeout 秒的連線會在背景關閉。
+    """
+
+    def __init__(self, idle_timeout=300, probe_after=15):
+        """
+        :param idle_timeout: 閒置連線保留秒數
+        :param probe_after: 閒置超過此秒數，取出前先以 stat 探測連線
+        """
+        self.idle_timeout = idle_timeout
+        self.probe_after = probe_after
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def acquire(self, host, port, user, password, transport=None):
+        """
+        取出一組可用連線，沒有閒置連線時建立新連線
+
+        :param transport: ssh_transport.normalize_transport() 的結果，None 表示預設值
+        """
+        key = (host, int(port), user, transport_key(transport))
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                session = idle.pop() if idle else None
+            if session is None:
+                break
+            idle_for = time.monotonic() - session.last_used
+            if session.password == password and session.is_alive(probe=idle_for > self.probe_after):
+                session.last_used = time.monotonic()
+                return session
+            session.close()
+
+        ssh, sftp = connect(host, int(port), user, password, transport)
+        self._ensure_reaper()
+        return PooledSession(key, password, ssh, sftp)
+
+    def release(self, session):
+        """
+        歸還連線；已斷線的連線直接關閉
+        """
+        if not session.is_alive():
+            session.close()
+            return
+        # 重設 SFTP 目前目錄，避免 chdir 狀態影響下一個使用者；
+        # 連線剛好中斷時直接關閉，不可讓例外蓋過呼叫端原本的錯誤
+        try:
+            session.sftp.chdir(None)
+        except Exception:
+            session.close()
+            return
+        session.dir_cache.clear()
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(session.key, []).append(session)
+
+    @contextmanager
+    def session(self, host, port, user, password, transport=None):
+        """
+        with 區塊內借用一組連線，離開時自動歸還
+        """
+        session = self.acquire(host, port, user, password, transport)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def close_idle(self, max_idle=None):
+        """
+        關閉閒置超過 max_idle 秒的連線（預設為 idle_timeout）
+        """
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, sessions in list(self._idle.items()):
+                keep = [s for s in sessions if now - s.last_used < max_idle]
+                expired.extend(s for s in sessions if now - s.last_used >= max_idle)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for session in expired:
+            session.close()
+
+    def close_all(self):
+        self.close_idle(max_idle=0)
+
+    def _ensure_reaper(self):
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="sftp-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1, min(30, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            self.close_idle()
+
+
+# CmdTab / SftpTab / SettingsTab 共用的連線池
+shared_pool = SftpConnectionPool()
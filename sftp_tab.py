@@ -1,10 +1,27 @@
 #sftp_tab.py
+import json
+import time
+from contextlib import contextmanager
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtWidgets import (
     QWidget, QLineEdit, QPushButton,
-    QFormLayout, QTextEdit
+    QFormLayout, QTextEdit, QHBoxLayout, QLabel, QTreeWidget, QTreeWidgetItem
 )
-import paramiko
-from os.path import basename
+from os.path import basename, getsize
+
+from instrumentation import RunMetrics
+from log_sink import LogSink
+from remote_browser import PAGE_SIZE, ListingCache, format_size, list_directory
+from resumable_upload import RESUMABLE_MIN_SIZE, upload_with_retry
+from sftp_pool import shared_pool
+from sftp_uploader import UploadCancelled
+from ssh_transport import normalize_transport, tuned_options
+from tar_transfer import TarUploader, make_uploader
+from task_runner import TaskExecutor, shared_executor
+
+# 遠端樹狀清單項目的路徑與種類（dir / file / more / loading）
+ROLE_PATH = Qt.ItemDataRole.UserRole
+ROLE_KIND = Qt.ItemDataRole.UserRole + 1
 
 
 class SftpTab(QWidget):
@@ -18,7 +35,18 @@ class SftpTab(QWidget):
         self.sftp = None
         self.ssh_client = None
         self.output = output_display
+        # 遠端瀏覽：清單快取、各資料夾項目與已顯示的筆數
+        self.listing_cache = ListingCache()
+        self.browse_settings = None
+        self.browse_generation = 0
+        self.dir_items = {}
+        self.listings = {}
+        self.shown = {}
+        self.fetching = set()
+        # 列出遠端資料夾不必排在部署等長時間工作後面，使用獨立的背景佇列
+        self.browse_executor = TaskExecutor(max_concurrent=2)
         self.init_ui()
+        self.sink = LogSink([self.output], parent=self)
 
     def init_ui(self):
         layout = QFormLayout()
@@ -28,6 +56,10 @@ class SftpTab(QWidget):
         self.sftp_pass_input = QLineEdit()
         self.sftp_port_input = QLineEdit()
         self.sftp_port_input.setText("22")  # 預設 SFTP 使用 port 22
+        self.sftp_workers_input = QLineEdit()
+        self.sftp_workers_input.setText("4")  # 資料夾上傳的並行 channel 數
+        self.transport_input = QLineEdit()
+        self.transport_input.setPlaceholderText('空白為預設；"auto" 或 {"compress": true, "window_size": 8388608}')
         self.sftp_pass_input.setEchoMode(QLineEdit.EchoMode.Password)
 
         test_button = QPushButton("測試 SFTP 連線")
@@ -37,20 +69,63 @@ class SftpTab(QWidget):
         layout.addRow("連接埠:", self.sftp_port_input)
         layout.addRow("使用者名稱:", self.sftp_user_input)
         layout.addRow("密碼:", self.sftp_pass_input)
+        layout.addRow("並行上傳數:", self.sftp_workers_input)
+        layout.addRow("傳輸設定:", self.transport_input)
         layout.addRow(test_button)
 
+        # 遠端檔案瀏覽：展開時才列出資料夾，大資料夾分頁顯示
+        self.remote_path_input = QLineEdit()
+        self.remote_path_input.setText(".")
+        browse_button = QPushButton("📂 瀏覽")
+        browse_button.clicked.connect(self.browse_remote)
+        refresh_button = QPushButton("🔄 重新整理")
+        refresh_button.clicked.connect(self.refresh_remote)
+        path_row = QHBoxLayout()
+        path_row.addWidget(self.remote_path_input, 1)
+        path_row.addWidget(browse_button)
+        path_row.addWidget(refresh_button)
+
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("檔名（可用 * ?），只搜尋已載入過的資料夾")
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(self.filter_timer.start)
+
+        self.remote_tree = QTreeWidget()
+        self.remote_tree.setHeaderLabels(["名稱", "大小", "修改時間"])
+        self.remote_tree.setColumnWidth(0, 320)
+        self.remote_tree.setUniformRowHeights(True)
+        self.remote_tree.itemExpanded.connect(self.on_item_expanded)
+        self.remote_tree.itemClicked.connect(self.on_item_clicked)
+        self.search_results = QTreeWidget()
+        self.search_results.setHeaderLabels(["路徑", "大小", "修改時間"])
+        self.search_results.setColumnWidth(0, 320)
+        self.search_results.setUniformRowHeights(True)
+        self.search_results.setRootIsDecorated(False)
+        self.search_results.hide()
+        self.browse_status = QLabel()
+
+        layout.addRow("遠端路徑:", path_row)
+        layout.addRow("篩選:", self.filter_input)
+        layout.addRow(self.remote_tree)
+        layout.addRow(self.search_results)
+        layout.addRow(self.browse_status)
+
         self.setLayout(layout)
 
     def log(self, message):
         """
-        輸出訊息到主畫面
+        輸出訊息到主畫面（可於任何執行緒呼叫）
         """
-        if self.output:
-            self.output.append(message)
+        self.sink.write(message)
 
-    def get_sftp_connection(self):
+    def connection_settings(self):
         """
-        建立並回傳 SFTP 連線物件
+        讀取 SFTP 欄位（需於 GUI 執行緒呼叫），回傳 (host, port, user, password, transport)
+
+        transport 欄位格式同設定檔的 "transport"（JSON 物件或 "auto"），與部署共用同一組連線池設定
         """
         host = self.sftp_host_input.text().strip()
         port = int(self.sftp_port_input.text().strip())
@@ -59,44 +134,340 @@ class SftpTab(QWidget):
 
         if not host or not user or not password:
             raise ValueError("⚠️ 請完整填寫 SFTP 資訊！")
+        text = self.transport_input.text().strip()
+        try:
+            transport = normalize_transport(text if text in ("", "auto") else json.loads(text))
+        except ValueError as e:
+            raise ValueError(f"⚠️ 傳輸設定格式錯誤：{e}")
+        return host, port, user, password, transport
+
+    def acquire_session(self, settings):
+        """
+        依 connection_settings() 的結果從共用連線池取出連線；"auto" 時讀取（或重新）調校結果
+
+        需於背景執行緒呼叫，用完以 shared_pool.release() 歸還
+        """
+        host, port, user, password, transport = settings
+        if transport == "auto":
+            transport = tuned_options(host, port, user, password, log=self.log)
+        return shared_pool.acquire(host, port, user, password, transport)
+
+    @contextmanager
+    def get_sftp_connection(self, settings=None):
+        """
+        從共用連線池借出 SFTP 連線（需搭配 with 使用，離開時自動歸還）
+
+        :param settings: connection_settings() 的結果；背景執行緒中必須事先傳入
+        """
+        session = self.acquire_session(settings or self.connection_settings())
+        try:
+            yield session
+        finally:
+            shared_pool.release(session)
 
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, port=port, username=user, password=password)
-        sftp = ssh.open_sftp()
-        return ssh, sftp
+    def submit(self, fn, *args, name=""):
+        """
+        讀取欄位後將工作排入背景佇列，回傳 BackgroundTask；欄位不完整時回傳 None
+        """
+        try:
+            settings = self.connection_settings()
+        except ValueError as e:
+            self.log(f"{e}\n")
+            return None
+        return shared_executor().submit(
+            fn, settings, *args, name=name,
+            on_failed=lambda error: self.log(f"❌ {name}失敗：{error}\n")
+        )
 
     def test_sftp_connection(self):
         """
         測試 SFTP 是否能連線成功
         """
+        return self.submit(self.run_test_connection, name="SFTP 連線測試")
+
+    def run_test_connection(self, task, settings):
         try:
-            ssh, sftp = self.get_sftp_connection()
-            self.log("✅ SFTP 連線成功！\n")
-            sftp.close()
-            ssh.close()
+            with self.get_sftp_connection(settings):
+                self.log("✅ SFTP 連線成功！\n")
         except Exception as e:
             self.log(f"❌ SFTP 連線失敗：{e}\n")
 
+    def browse_remote(self):
+        """
+        以「遠端路徑」為根重新建立樹狀清單；連線設定改變時清除清單快取
+        """
+        try:
+            settings = self.connection_settings()
+        except ValueError as e:
+            self.log(f"{e}\n")
+            return
+        if settings != self.browse_settings:
+            self.listing_cache.invalidate()
+            self.browse_settings = settings
+        root = self.remote_path_input.text().strip().rstrip("/") or "/"
+        self.browse_generation += 1
+        self.remote_tree.clear()
+        self.dir_items.clear()
+        self.listings.clear()
+        self.shown.clear()
+        item = self.make_entry_item(root, root, True)
+        self.remote_tree.addTopLevelItem(item)
+        item.setExpanded(True)
+
+    def refresh_remote(self):
+        """
+        重新列出選取的資料夾（未選取時為根目錄），其底下的快取一併清除
+        """
+        item = self.remote_tree.currentItem()
+        while item is not None and item.data(0, ROLE_KIND) != "dir":
+            item = item.parent()
+        if item is None:
+            item = self.remote_tree.topLevelItem(0)
+        if item is None:
+            self.browse_remote()
+            return
+        path = item.data(0, ROLE_PATH)
+        self.listing_cache.invalidate(path)
+        self.fetch_listing(path)
+
+    def make_entry_item(self, name, path, is_dir, size=0, mtime=0):
+        item = QTreeWidgetItem([
+            f"📁 {name}" if is_dir else name,
+            "" if is_dir else format_size(size),
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime)) if mtime else "",
+        ])
+        item.setData(0, ROLE_PATH, path)
+        item.setData(0, ROLE_KIND, "dir" if is_dir else "file")
+        if is_dir:
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            self.dir_items[path] = item
+        return item
+
+    def on_item_expanded(self, item):
+        """
+        展開資料夾：有快取時直接顯示，快取過期或沒有快取時才於背景重新列出
+        """
+        path = item.data(0, ROLE_PATH)
+        entries, fresh = self.listing_cache.get(path, allow_stale=True)
+        if entries is not None and self.listings.get(path) is not entries:
+            self.populate(item, entries)
+        if not fresh:
+            self.fetch_listing(path)
+
+    def on_item_clicked(self, item):
+        if item.data(0, ROLE_KIND) == "more":
+            parent = item.parent()
+            parent.removeChild(item)
+            self.add_page(parent)
+
+    def fetch_listing(self, path):
+        # 以 (generation, path) 記錄進行中的工作：重新瀏覽後，舊的工作不會擋住新根目錄的載入
+        key = (self.browse_generation, path)
+        if key in self.fetching or self.browse_settings is None:
+            return
+        item = self.dir_items.get(path)
+        if item is not None and item.childCount() == 0:
+            placeholder = QTreeWidgetItem(["⏳ 載入中…"])
+            placeholder.setData(0, ROLE_KIND, "loading")
+            item.addChild(placeholder)
+        self.fetching.add(key)
+        self.browse_executor.submit(
+            self.run_list_directory, self.browse_settings, path, self.browse_generation,
+            name="列出遠端資料夾", on_finished=self.listing_loaded,
+            on_failed=lambda error: self.listing_failed(key, error)
+        )
+
+    def run_list_directory(self, task, settings, path, generation):
+        start = time.monotonic()
+        with self.get_sftp_connection(settings) as session:
+            entries = list_directory(session.sftp, path)
+        return generation, path, entries, time.monotonic() - start
+
+    def listing_loaded(self, result):
+        generation, path, entries, elapsed = result
+        self.fetching.discard((generation, path))
+        # 舊的瀏覽（可能是不同的連線設定）取得的清單不放入快取
+        if generation != self.browse_generation:
+            return
+        self.listing_cache.put(path, entries)
+        item = self.dir_items.get(path)
+        if item is None:
+            return
+        self.populate(item, entries)
+        self.browse_status.setText(f"📂 {path}：{len(entries)} 項（listdir_attr {elapsed:.2f} 秒）")
+        if self.filter_input.text().strip():
+            self.apply_filter()
+
+    def listing_failed(self, key, error):
+        generation, path = key
+        self.fetching.discard(key)
+        self.log(f"❌ 無法列出遠端資料夾 {path}：{error}\n")
+        if generation != self.browse_generation:
+            return
+        item = self.dir_items.get(path)
+        if item is not None:
+            for index in range(item.childCount()):
+                child = item.child(index)
+                if child.data(0, ROLE_KIND) == "loading":
+                    child.setText(0, f"❌ {error}")
+
+    def populate(self, item, entries):
+        """
+        以新的清單取代資料夾的子項目，先顯示第一頁
+        """
+        path = item.data(0, ROLE_PATH)
+        # 根目錄為 "/" 時 prefix 也是 "/"，需排除資料夾本身，否則會移除自己的項目
+        prefix = path if path.endswith("/") else path + "/"
+        for key in [k for k in self.dir_items if k != path and k.startswith(prefix)]:
+            del self.dir_items[key]
+            self.listings.pop(key, None)
+            self.shown.pop(key, None)
+        item.takeChildren()
+        self.listings[path] = entries
+        self.shown[path] = 0
+        self.add_page(item)
+
+    def add_page(self, item):
+        path = item.data(0, ROLE_PATH)
+        entries = self.listings[path]
+        start = self.shown[path]
+        page = entries[start:start + PAGE_SIZE]
+        item.addChildren([self.make_entry_item(e.name, e.path, e.is_dir, e.size, e.mtime) for e in page])
+        self.shown[path] = start + len(page)
+        if self.shown[path] < len(entries):
+            more = QTreeWidgetItem([f"⬇ 載入更多…（已顯示 {self.shown[path]} / {len(entries)}）"])
+            more.setData(0, ROLE_KIND, "more")
+            item.addChild(more)
+
+    def apply_filter(self):
+        """
+        在已快取的清單中依檔名篩選（不連線）；清空篩選時回到樹狀清單
+        """
+        text = self.filter_input.text().strip()
+        if not text:
+            self.search_results.hide()
+            self.remote_tree.show()
+            return
+        matches = self.listing_cache.search(text)
+        self.search_results.clear()
+        self.search_results.addTopLevelItems([
+            self.make_result_item(entry) for entry in matches
+        ])
+        self.remote_tree.hide()
+        self.search_results.show()
+        limit = f"（只顯示前 {PAGE_SIZE} 筆）" if len(matches) >= PAGE_SIZE else ""
+        self.browse_status.setText(
+            f"🔍 已載入的 {self.listing_cache.entry_count} 個項目中找到 {len(matches)} 筆{limit}"
+        )
+
+    @staticmethod
+    def make_result_item(entry):
+        return QTreeWidgetItem([
+            f"📁 {entry.path}" if entry.is_dir else entry.path,
+            "" if entry.is_dir else format_size(entry.size),
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.mtime)) if entry.mtime else "",
+        ])
+
     def upload_file(self, local_path: str, remote_dir: str = "."):
         """
-        將本地檔案上傳到 SFTP 指定目錄
+        將本地檔案上傳到 SFTP 指定目錄（於背景執行）
 
         :param local_path: 本地檔案完整路徑
         :param remote_dir: SFTP 目的資料夾（預設為目前目錄）
         """
-        try:
-            ssh, sftp = self.get_sftp_connection()
+        return self.submit(self.run_upload_file, local_path, remote_dir, name="上傳")
 
+    def run_upload_file(self, task, settings, local_path, remote_dir):
+        metrics = RunMetrics("upload_file")
+        status = "failed"
+        try:
             remote_path = f"{remote_dir}/{basename(local_path)}"
+            size = getsize(local_path)
 
-            sftp.chdir(remote_dir)
-            sftp.put(local_path, remote_path)
+            if size >= RESUMABLE_MIN_SIZE:
+                # 大檔案：寫入 .part 暫存檔，斷線後從斷點續傳，驗證 sha256 後才改名
+                result = upload_with_retry(
+                    lambda: self.get_sftp_connection(settings), local_path, remote_path,
+                    log=self.log, on_progress=self.progress_logger(local_path), cancel_event=task.cancel_event
+                )
+                sent = size - result.resumed_from
+                metrics.add_stage("transfer", result.elapsed - result.verify_elapsed, files=1, bytes=sent,
+                                  resumed_from=result.resumed_from)
+                metrics.add_stage("verify", result.verify_elapsed, verified_by=result.verified_by)
+                metrics.record_file(local_path, sent, result.elapsed - result.verify_elapsed)
+                resumed = f"，自 {result.resumed_from / 1024 / 1024:.1f} MB 續傳" if result.resumed_from else ""
+                self.log(f"🔒 sha256 驗證通過（{result.verified_by}）{resumed}\n")
+            else:
+                with metrics.stage("connect"):
+                    session = self.acquire_session(settings)
+                try:
+                    with metrics.stage("transfer") as stage:
+                        session.sftp.put(local_path, remote_path)
+                        stage.files, stage.bytes = 1, size
+                finally:
+                    shared_pool.release(session)
+                metrics.record_file(local_path, size, stage.elapsed)
 
+            status = "success"
             self.log(f"✅ 上傳成功：{local_path} ➡️ SFTP:{remote_path}\n")
 
-            sftp.close()
-            ssh.close()
+        except UploadCancelled as e:
+            status = "cancelled"
+            self.log(f"⏹ {e}\n")
+        except Exception as e:
+            self.log(f"❌ 上傳失敗：{e}\n")
+        finally:
+            metrics.finish(status)
+            metrics.save_history()
+            self.log("\n".join(metrics.summary_lines()) + "\n")
+
+    def progress_logger(self, local_path):
+        """
+        回傳 on_progress 函式，每 10% 輸出一次進度
+        """
+        last = [-1]
+
+        def on_progress(sent, total):
+            percent = sent * 100 // total if total else 100
+            if percent // 10 > last[0]:
+                last[0] = percent // 10
+                self.log(f"⏫ {basename(local_path)}：{percent}%（{sent / 1024 / 1024:.1f} MB）")
+        return on_progress
+
+    def upload_directory(self, local_dir: str, remote_dir: str, transfer_mode: str = "sftp"):
+        """
+        上傳整個資料夾的內容到 remote_dir（於背景執行）
 
+        :param local_dir: 本地資料夾
+        :param remote_dir: SFTP 目的資料夾，子資料夾會依序建立
+        :param transfer_mode: sftp 以多個 channel 並行逐檔上傳；tar 壓縮成單一串流於遠端解開
+        :return: BackgroundTask；並行上傳數或連線欄位不正確時為 None
+        """
+        text = self.sftp_workers_input.text().strip() or "4"
+        workers = int(text) if text.isdigit() else 0
+        if workers < 1:
+            self.log(f"❌ 並行上傳數必須是 1 以上的整數：{text}\n")
+            return None
+        return self.submit(
+            self.run_upload_directory, local_dir, remote_dir, workers, transfer_mode, name="資料夾上傳"
+        )
+
+    def run_upload_directory(self, task, settings, local_dir, remote_dir, workers, transfer_mode):
+        try:
+            with self.get_sftp_connection(settings) as session:
+                uploader = make_uploader(session.ssh, workers, task.cancel_event, transfer_mode, session.dir_cache)
+                report = uploader.upload_tree(local_dir, remote_dir, self.log_upload_result)
+            if isinstance(uploader, TarUploader) and uploader.fell_back:
+                self.log("⚠️ 遠端沒有 tar，已改用 SFTP 逐檔上傳\n")
+            self.log(report.summary() + "\n")
         except Exception as e:
             self.log(f"❌ 上傳失敗：{e}\n")
+        task.check_cancelled()
+
+    def log_upload_result(self, result):
+        if isinstance(result.error, UploadCancelled):
+            return
+        if result.ok:
+            self.log(f"✅ 上傳成功：{result.local_path} ➡️ SFTP:{result.remote_path}\n")
+        else:
+            self.log(f"❌ 上傳失敗：{result.local_path}：{result.error}\n")
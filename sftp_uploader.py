@@ -0,0 +1,234 @@
+# sftp_uploader.py
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from remote_cache import RemoteDirCache
+
+
+class UploadCancelled(Exception):
+    """
+    上傳在開始前被取消
+    """
+
+
+class FileResult:
+    """
+    單一檔案的上傳結果
+    """
+
+    def __init__(self, local_path, remote_path, size, elapsed=0.0, error=None):
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.size = size
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class UploadReport:
+    """
+    整批上傳的統計結果
+    """
+
+    def __init__(self):
+        self.results = []
+        self.dirs_created = 0
+        self.dirs_elapsed = 0.0
+        self.elapsed = 0.0
+        # 自動調整並行數時，每次調整後的名額
+        self.workers_history = []
+
+    @property
+    def uploaded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok and not isinstance(r.error, UploadCancelled)]
+
+    @property
+    def cancelled(self):
+        return [r for r in self.results if isinstance(r.error, UploadCancelled)]
+
+    @property
+    def total_bytes(self):
+        return sum(r.size for r in self.uploaded)
+
+    @property
+    def files_per_sec(self):
+        return len(self.uploaded) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_sec(self):
+        return self.total_bytes / 1024 / 1024 / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"📊 上傳 {len(self.uploaded)} 個檔案（失敗 {len(self.failed)}），"
+            f"共 {self.total_bytes / 1024 / 1024:.2f} MB，耗時 {self.elapsed:.2f} 秒，"
+            f"{self.files_per_sec:.1f} 檔/秒，{self.mb_per_sec:.2f} MB/秒"
+        )
+
+
+def plan_tree(local_dir, remote_root):
+    """
+    走訪本地資料夾，產生上傳計畫
+
+    :param local_dir: 本地來源資料夾
+    :param remote_root: 對應的遠端根目錄
+    :return: (remote_dirs, files)；remote_dirs 依父層在前排序，
+             files 為 (local_path, remote_path, size) 清單
+    """
+    remote_dirs = [remote_root]
+    files = []
+    for root, dirs, names in os.walk(local_dir):
+        dirs.sort()
+        rel_path = os.path.relpath(root, local_dir)
+        remote_dir = remote_root if rel_path == "." else posixpath.join(
+            remote_root, rel_path.replace("\\", "/")
+        )
+        for d in dirs:
+            remote_dirs.append(posixpath.join(remote_dir, d))
+        for name in sorted(names):
+            local_file = os.path.join(root, name)
+            files.append((local_file, posixpath.join(remote_dir, name), os.path.getsize(local_file)))
+    return remote_dirs, files
+
+
+class ParallelUploader:
+    """
+    在同一條 SSH 連線上開啟多個 SFTP channel，並行上傳多個檔案
+    """
+
+    def __init__(self, ssh, workers=4, cancel_event=None, dir_cache=None, scheduler=None):
+        """
+        :param ssh: 已連線的 paramiko.SSHClient
+        :param workers: 並行上傳的 channel 數（自動調整並行數時為上限）
+        :param cancel_event: threading.Event，設定後尚未開始的檔案不再上傳
+        :param dir_cache: RemoteDirCache（通常為連線池 session 的 dir_cache），None 表示只在本次上傳內有效
+        :param scheduler: TransferScheduler，決定上傳順序、限速與並行數；None 表示依走訪順序全速上傳
+        """
+        self.ssh = ssh
+        self.workers = max(1, int(workers))
+        self.cancel_event = cancel_event
+        self.dir_cache = dir_cache if dir_cache is not None else RemoteDirCache()
+        self.scheduler = scheduler
+        self._local = threading.local()
+        self._channels = []
+        self._channels_lock = threading.Lock()
+
+    def _channel(self):
+        sftp = getattr(self._local, "sftp", None)
+        if sftp is None:
+            sftp = self.ssh.open_sftp()
+            self._local.sftp = sftp
+            with self._channels_lock:
+                self._channels.append(sftp)
+        return sftp
+
+    def _close_channels(self):
+        with self._channels_lock:
+            channels, self._channels = self._channels, []
+        for sftp in channels:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    def make_dirs(self, remote_dirs, executor=None):
+        """
+        建立遠端資料夾（父層需排在子層之前），已知存在的略過，回傳實際新建的數量
+        """
+        return self.dir_cache.ensure_dirs(remote_dirs, self._channel, executor)
+
+    def _put(self, local_path, remote_path, size, window=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return FileResult(local_path, remote_path, size, error=UploadCancelled("已取消"))
+        if window is not None and not window.acquire(self.cancel_event):
+            return FileResult(local_path, remote_path, size, error=UploadCancelled("已取消"))
+        limiter = self.scheduler.limiter if self.scheduler else None
+        start = time.perf_counter()
+        progress = [0, 0]
+
+        def on_progress(done, total):
+            sent = done - progress[0]
+            progress[:] = (done, total)
+            if limiter is not None and not limiter.consume(sent, self.cancel_event):
+                raise UploadCancelled("已取消")
+            if window is not None:
+                window.record(sent)
+
+        ok = False
+        try:
+            # confirm=False 省去上傳後的 stat；這裡只確認讀取的本地位元組數等於檔案大小，
+            # 遠端大小由 DeploySync 上傳後每個資料夾一次 listdir_attr 核對（整個資料夾上傳的模式不核對）
+            self._channel().put(local_path, remote_path, on_progress, confirm=False)
+            if progress[0] != progress[1]:
+                raise IOError(f"大小不符：送出 {progress[0]} bytes，預期 {progress[1]} bytes")
+            ok = True
+            return FileResult(local_path, remote_path, size, time.perf_counter() - start)
+        except Exception as e:
+            return FileResult(local_path, remote_path, size, time.perf_counter() - start, e)
+        finally:
+            if window is not None:
+                window.release(ok or (self.cancel_event is not None and self.cancel_event.is_set()))
+
+    def upload_files(self, files, remote_dirs=(), on_result=None):
+        """
+        先建立資料夾，再並行上傳檔案；單一檔案失敗不會中止整批
+
+        有 scheduler 時依其順序分批上傳：最後一批（例如 index.html）要等前面全部成功才開始，
+        前面有檔案失敗時最後一批不上傳，避免入口檔指向缺少的檔案。
+
+        :param files: (local_path, remote_path, size) 清單
+        :param remote_dirs: 需事先建立的遠端資料夾（父層在前）
+        :param on_result: 每完成一個檔案呼叫一次，於呼叫端執行緒執行
+        :return: UploadReport
+        """
+        report = UploadReport()
+        start = time.perf_counter()
+        if self.scheduler is not None:
+            phases = self.scheduler.phases(files, remote_dirs[0] if remote_dirs else None)
+            window = self.scheduler.window(self.workers)
+        else:
+            phases = [files] if files else []
+            window = None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sftp-upload") as pool:
+                # 資料夾與檔案共用同一組執行緒與 channel
+                if remote_dirs:
+                    report.dirs_created = self.make_dirs(remote_dirs, pool)
+                    report.dirs_elapsed = time.perf_counter() - start
+                for index, phase in enumerate(phases):
+                    if index and report.failed:
+                        results = [
+                            FileResult(*item, error=IOError("前一批有檔案上傳失敗，未上傳"))
+                            for item in phase
+                        ]
+                    else:
+                        futures = [pool.submit(self._put, *item, window) for item in phase]
+                        results = (future.result() for future in as_completed(futures))
+                    for result in results:
+                        report.results.append(result)
+                        if on_result:
+                            on_result(result)
+        finally:
+            self._close_channels()
+            report.elapsed = time.perf_counter() - start
+            if window is not None:
+                report.workers_history = list(window.history)
+        return report
+
+    def upload_tree(self, local_dir, remote_root, on_result=None):
+        """
+        將整個本地資料夾上傳到 remote_root
+        """
+        remote_dirs, files = plan_tree(local_dir, remote_root)
+        return self.upload_files(files, remote_dirs, on_result)
@@ -0,0 +1,283 @@
+# ssh_transport.py
+import io
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+
+from startup_profile import profile
+
+# 未指定時沿用 paramiko 的預設值
+TRANSPORT_DEFAULTS = {
+    "compress": False,
+    "ciphers": None,
+    "window_size": None,
+    "max_packet_size": None,
+}
+
+# 自動調校結果的快取，以 user@host:port 為鍵
+TUNE_CACHE = os.path.join(os.path.expanduser("~"), ".cmd_tool", "transport_tune.json")
+# 快取有效期限（秒），網路環境改變後可刪除快取檔重新調校
+TUNE_MAX_AGE = 7 * 24 * 3600
+# 每次試傳的資料量
+PROBE_BYTES = 2 * 1024 * 1024
+# 依序嘗試的 cipher 與 window 大小（伺服器不支援的 cipher 會略過）
+CANDIDATE_CIPHERS = ("aes128-gcm@openssh.com", "aes128-ctr", "aes256-ctr")
+CANDIDATE_WINDOWS = (2 * 1024 * 1024, 8 * 1024 * 1024, 32 * 1024 * 1024)
+# 每組設定試傳的次數，取中位數以免單次網路抖動決定結果
+PROBE_REPEAT = 3
+
+_cache_lock = threading.Lock()
+_import_lock = threading.Lock()
+_paramiko = None
+_ciphers = None
+
+
+def load_paramiko():
+    """
+    第一次需要連線時才載入 paramiko（連同 cryptography 約需數百毫秒），GUI 啟動時不必等待
+
+    多個執行緒同時連線時由第一個執行緒載入，其他執行緒等待載入完成，
+    不會取得 sys.modules 中尚未初始化完成的模組。
+    """
+    global _paramiko
+    if _paramiko is None:
+        with _import_lock:
+            if _paramiko is None:
+                with profile.step("import paramiko"):
+                    import paramiko
+                _paramiko = paramiko
+    return _paramiko
+
+
+def supported_ciphers():
+    """
+    paramiko 支援的 cipher（依偏好順序），由公開的 Transport.get_security_options() 取得
+
+    建立 Transport 需要 socket，這裡給一個未連線的 socket，只讀取設定不會送出任何資料。
+    """
+    global _ciphers
+    if _ciphers is None:
+        paramiko = load_paramiko()
+        sock = socket.socket()
+        try:
+            _ciphers = tuple(paramiko.Transport(sock).get_security_options().ciphers)
+        finally:
+            sock.close()
+    return _ciphers
+
+
+def normalize_transport(value):
+    """
+    檢查並補齊傳輸設定
+
+    :param value: None、"auto" 或 dict（compress / ciphers / window_size / max_packet_size）
+    :return: "auto" 或補齊後的 dict
+    :raises ValueError: 欄位或數值不正確
+    """
+    if value in (None, ""):
+        return dict(TRANSPORT_DEFAULTS)
+    if value == "auto":
+        return "auto"
+    if not isinstance(value, dict):
+        raise ValueError(f"transport 須為 \"auto\" 或物件：{value!r}")
+    unknown = set(value) - set(TRANSPORT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"transport 不支援的欄位：{', '.join(sorted(unknown))}")
+
+    options = dict(TRANSPORT_DEFAULTS)
+    options.update({k: v for k, v in value.items() if v is not None})
+    options["compress"] = bool(options["compress"])
+    if options["ciphers"] is not None:
+        ciphers = [options["ciphers"]] if isinstance(options["ciphers"], str) else list(options["ciphers"])
+        supported = supported_ciphers()
+        invalid = [c for c in ciphers if c not in supported]
+        if invalid or not ciphers:
+            raise ValueError(f"不支援的 cipher：{', '.join(invalid) or '（空白）'}（可用：{', '.join(supported)}）")
+        options["ciphers"] = ciphers
+    if options["window_size"] is not None:
+        options["window_size"] = max(32768, int(options["window_size"]))
+    if options["max_packet_size"] is not None:
+        options["max_packet_size"] = min(262144, max(4096, int(options["max_packet_size"])))
+    return options
+
+
+def transport_key(options):
+    """
+    連線池鍵值用：相同設定的連線才能互相共用
+    """
+    options = options or TRANSPORT_DEFAULTS
+    ciphers = tuple(options.get("ciphers") or ())
+    return bool(options.get("compress")), ciphers, options.get("window_size"), options.get("max_packet_size")
+
+
+def describe_transport(options):
+    options = options or TRANSPORT_DEFAULTS
+    parts = [f"壓縮 {'開' if options.get('compress') else '關'}"]
+    if options.get("ciphers"):
+        parts.append(f"cipher {', '.join(options['ciphers'])}")
+    if options.get("window_size"):
+        parts.append(f"window {options['window_size'] / 1024 / 1024:g} MB")
+    if options.get("max_packet_size"):
+        parts.append(f"packet {options['max_packet_size'] // 1024} KB")
+    return "🔧 傳輸設定：" + "、".join(parts)
+
+
+def connect(host, port, user, password, options=None, timeout=None):
+    """
+    依傳輸設定建立 SSH / SFTP 連線（連線池與自動調校共用）
+
+    ciphers 只保留清單中的 cipher，實際使用哪一個由 paramiko 的偏好順序與伺服器決定；
+    window_size / max_packet_size 套用到之後開啟的每個 channel（包含並行上傳的 SFTP channel）。
+
+    :return: (SSHClient, SFTPClient)
+    """
+    paramiko = load_paramiko()
+    options = options or TRANSPORT_DEFAULTS
+    disabled = None
+    if options.get("ciphers"):
+        disabled = {"ciphers": [c for c in supported_ciphers() if c not in options["ciphers"]]}
+
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(
+        host, port=port, username=user, password=password, timeout=timeout,
+        compress=options.get("compress", False), disabled_algorithms=disabled
+    )
+    try:
+        transport = ssh.get_transport()
+        if options.get("window_size"):
+            transport.default_window_size = options["window_size"]
+        if options.get("max_packet_size"):
+            transport.default_max_packet_size = options["max_packet_size"]
+        sftp = ssh.open_sftp()
+    except Exception:
+        ssh.close()
+        raise
+    return ssh, sftp
+
+
+def probe_sample(source_dir=None, size=PROBE_BYTES):
+    """
+    從實際要上傳的資料夾擷取試傳資料，讓壓縮效果接近真實情況；資料夾不存在時產生類似原始碼的文字
+    """
+    chunks = []
+    total = 0
+    if source_dir and os.path.isdir(source_dir):
+        for root, dirs, names in os.walk(source_dir):
+            dirs.sort()
+            for name in sorted(names):
+                try:
+                    with open(os.path.join(root, name), "rb") as f:
+                        data = f.read(min(256 * 1024, size - total))
+                except OSError:
+                    continue
+                chunks.append(data)
+                total += len(data)
+                if total >= size:
+                    return b"".join(chunks)
+    if total < size // 4:
+        line = b"export function render(value, index) { return this.data[index] ?? null; }\n"
+        chunks.append(line * ((size - total) // len(line) + 1))
+    return b"".join(chunks)[:size]
+
+
+def probe(host, port, user, password, options, sample, remote_path, repeat=PROBE_REPEAT):
+    """
+    以指定設定連線並試傳 sample repeat 次
+
+    :return: 傳輸秒數的中位數（不含連線時間）
+    """
+    ssh, sftp = connect(host, port, user, password, options, timeout=15)
+    try:
+        timings = []
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            sftp.putfo(io.BytesIO(sample), remote_path, len(sample), confirm=False)
+            timings.append(time.perf_counter() - start)
+        try:
+            sftp.remove(remote_path)
+        except IOError:
+            pass
+        return statistics.median(timings)
+    finally:
+        sftp.close()
+        ssh.close()
+
+
+def autotune(host, port, user, password, sample, log=None):
+    """
+    逐項試傳並保留較快的設定：先比較 cipher，再比較壓縮開關，最後比較 window 大小；
+    每組設定試傳 PROBE_REPEAT 次取中位數
+
+    :return: 傳輸設定 dict（另含 probe_seconds）
+    """
+    log = log or (lambda message: None)
+    remote_path = f".cmd_tool_probe_{os.getpid()}"
+    best = dict(TRANSPORT_DEFAULTS)
+    best_time = probe(host, port, user, password, best, sample, remote_path)
+
+    def attempt(changes):
+        nonlocal best, best_time
+        candidate = dict(best, **changes)
+        try:
+            elapsed = probe(host, port, user, password, candidate, sample, remote_path)
+        except Exception as e:
+            log(f"⚠️ 略過 {changes}：{e}\n")
+            return
+        if elapsed < best_time:
+            best, best_time = candidate, elapsed
+
+    for cipher in CANDIDATE_CIPHERS:
+        attempt({"ciphers": [cipher]})
+    attempt({"compress": not best["compress"]})
+    for window_size in CANDIDATE_WINDOWS[1:]:
+        attempt({"window_size": window_size})
+
+    best["probe_seconds"] = round(best_time, 3)
+    return best
+
+
+def load_tune_cache(path=TUNE_CACHE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tune_cache(cache, path=TUNE_CACHE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def tuned_options(host, port, user, password, source_dir=None, log=None, retune=False,
+                  cache_path=TUNE_CACHE, max_age=TUNE_MAX_AGE):
+    """
+    "transport": "auto" 時使用：讀取快取的調校結果，沒有或過期時重新調校
+
+    :param source_dir: 擷取試傳資料的本地資料夾（通常為 cmd_copy_source）
+    :param retune: 忽略快取重新調校
+    :return: 可交給 connect() 的傳輸設定
+    """
+    log = log or (lambda message: None)
+    key = f"{user}@{host}:{port}"
+    cache = load_tune_cache(cache_path)
+    entry = cache.get(key)
+    if not retune and entry and time.time() - entry.get("tuned_at", 0) < max_age:
+        return normalize_transport(entry["options"])
+
+    log(f"🧪 調校 {key} 的傳輸設定（試傳 {PROBE_BYTES // 1024 // 1024} MB）…\n")
+    result = autotune(host, port, user, password, probe_sample(source_dir), log)
+    probe_seconds = result.pop("probe_seconds")
+    with _cache_lock:
+        cache = load_tune_cache(cache_path)
+        cache[key] = {"options": result, "probe_seconds": probe_seconds, "tuned_at": time.time()}
+        save_tune_cache(cache, cache_path)
+    log(f"✅ 調校完成（試傳 {probe_seconds:.2f} 秒）\n")
+    return result
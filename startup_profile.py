@@ -0,0 +1,95 @@
+# startup_profile.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 啟動量測結果，每次一行 JSON
+STARTUP_HISTORY = os.path.join(os.path.expanduser("~"), ".cmd_tool", "metrics", "startup.jsonl")
+# 設定此環境變數（任意非空值）等同加上 --startup-profile；值為 exit 時量測完自動結束
+PROFILE_ENV = "CMD_TOOL_STARTUP_PROFILE"
+
+
+class StartupProfile:
+    """
+    記錄啟動各階段（import、建立視窗、第一次繪製）與延後載入項目的耗時
+
+    未啟用時 step() / record() 不做任何事，可安心留在程式中。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.exit_after_report = False
+        self.origin = time.perf_counter()
+        self.steps = []
+        self.reported = False
+        # 報告輸出後，延後載入的項目完成時呼叫 on_deferred(訊息)
+        self.on_deferred = None
+        self._lock = threading.Lock()
+
+    def enable(self, exit_after_report=False):
+        self.enabled = True
+        self.exit_after_report = exit_after_report
+
+    def record(self, name, elapsed):
+        if not self.enabled:
+            return
+        with self._lock:
+            step = {
+                "name": name,
+                "elapsed": round(elapsed, 4),
+                "at": round(time.perf_counter() - self.origin, 4),
+                "deferred": self.reported,
+            }
+            self.steps.append(step)
+        if step["deferred"] and self.on_deferred:
+            self.on_deferred(self.format_deferred(step))
+
+    @staticmethod
+    def format_deferred(step):
+        return f"⏱ 延後載入 {step['name']}：{step['elapsed'] * 1000:.0f} ms"
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report_lines(self, deferred=False):
+        with self._lock:
+            steps = [s for s in self.steps if s["deferred"] == deferred]
+        if deferred:
+            return [self.format_deferred(s) for s in steps]
+        total = time.perf_counter() - self.origin
+        lines = [f"🚀 啟動耗時 {total * 1000:.0f} ms（自載入 cmd_tool 起算，不含 Python 本身啟動）"]
+        lines += [f"   {s['name']:<24} {s['elapsed'] * 1000:>7.0f} ms（第 {s['at'] * 1000:.0f} ms 完成）" for s in steps]
+        return lines
+
+    def finish(self):
+        """
+        視窗第一次顯示後呼叫：之後的紀錄視為延後載入，並附加到啟動紀錄檔
+
+        :return: 報告文字行
+        """
+        lines = self.report_lines()
+        with self._lock:
+            self.reported = True
+            entry = {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "total": round(time.perf_counter() - self.origin, 4),
+                "steps": list(self.steps),
+            }
+        try:
+            os.makedirs(os.path.dirname(STARTUP_HISTORY), exist_ok=True)
+            with open(STARTUP_HISTORY, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+        return lines
+
+
+# 整個程式共用
+profile = StartupProfile()
@@ -0,0 +1,160 @@
+# stream_runner.py
+import codecs
+import locale
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+
+class StreamResult:
+    """
+    串流執行的結果
+    """
+
+    def __init__(self, returncode, tail, elapsed, timed_out=False, killed=False):
+        self.returncode = returncode
+        self.tail = tail
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.killed = killed
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.killed
+
+    def tail_text(self):
+        return "\n".join(self.tail)
+
+
+class StreamingCommand:
+    """
+    以 Popen 執行指令，逐塊讀取 stdout/stderr 並分批回報，不會把完整輸出留在記憶體中
+    """
+
+    def __init__(self, command, cwd=None, timeout=None, tail_lines=200,
+                 flush_interval=0.2, encoding=None):
+        """
+        :param command: 要執行的 shell 指令
+        :param cwd: 執行目錄
+        :param timeout: 逾時秒數，超過時終止整個行程樹；None 表示不限制
+        :param tail_lines: 保留最後幾行輸出，供失敗時顯示
+        :param flush_interval: 每隔幾秒回報一次累積的輸出
+        :param encoding: 輸出編碼，預設為系統編碼
+        """
+        self.command = command
+        self.cwd = cwd
+        self.timeout = timeout
+        self.tail_lines = tail_lines
+        self.flush_interval = flush_interval
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.process = None
+        self._killed = False
+
+    def _start(self):
+        kwargs = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        self.process = subprocess.Popen(
+            self.command, shell=True, cwd=self.cwd,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            **kwargs
+        )
+
+    def kill(self):
+        """
+        終止指令及其所有子行程（shell=True 時實際的 build 是 shell 的子行程）
+        """
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        self._killed = True
+        try:
+            if os.name == "nt":
+                subprocess.run(
+                    ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except (OSError, ProcessLookupError):
+            process.kill()
+
+    def _read_pipe(self, chunks):
+        read = getattr(self.process.stdout, "read1", self.process.stdout.read)
+        while True:
+            chunk = read(65536)
+            if not chunk:
+                break
+            chunks.put(chunk)
+        chunks.put(None)
+
+    def run(self, on_output=None, cancel_event=None):
+        """
+        執行指令並等待結束
+
+        :param on_output: 收到一批完整的輸出行時呼叫（不含結尾換行）
+        :param cancel_event: threading.Event，設定後終止指令
+        :return: StreamResult
+        """
+        start = time.monotonic()
+        tail = deque(maxlen=self.tail_lines)
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        pending = []
+        partial = ""
+        timed_out = False
+        last_flush = start
+
+        def flush(force=False):
+            nonlocal partial, last_flush
+            lines = pending[:]
+            pending.clear()
+            if force and partial:
+                lines.append(partial)
+                partial = ""
+            tail.extend(lines)
+            if lines and on_output:
+                on_output("\n".join(lines))
+            last_flush = time.monotonic()
+
+        self._start()
+        chunks = queue.Queue()
+        reader = threading.Thread(target=self._read_pipe, args=(chunks,), daemon=True)
+        reader.start()
+
+        eof = False
+        while not eof:
+            try:
+                chunk = chunks.get(timeout=self.flush_interval)
+            except queue.Empty:
+                chunk = b""
+            if chunk is None:
+                eof = True
+                text = decoder.decode(b"", final=True)
+            else:
+                text = decoder.decode(chunk)
+            if text:
+                lines = (partial + text.replace("\r\n", "\n")).split("\n")
+                partial = lines.pop()
+                pending.extend(lines)
+
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                # 沒有換行的超長輸出（例如進度列）也定期送出
+                flush(force=len(partial) > 4096)
+
+            if cancel_event is not None and cancel_event.is_set():
+                self.kill()
+            elif self.timeout is not None and now - start > self.timeout and not timed_out:
+                timed_out = True
+                self.kill()
+
+        flush(force=True)
+        returncode = self.process.wait()
+        reader.join()
+        return StreamResult(returncode, list(tail), time.monotonic() - start, timed_out, self._killed)
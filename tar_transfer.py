@@ -0,0 +1,233 @@
+# tar_transfer.py
+import gzip
+import hashlib
+import posixpath
+import shlex
+import tarfile
+import threading
+import time
+
+from sftp_uploader import FileResult, ParallelUploader, UploadCancelled, UploadReport, plan_tree
+
+# 遠端回報串流 sha256 的輸出行前綴
+DIGEST_PREFIX = "CMD_TOOL_SHA256="
+
+
+def extract_command(root):
+    """
+    遠端解開串流的指令：以 tee 經由 FIFO 同時計算收到的串流 sha256（POSIX sh 即可，不需 bash），
+    結束時輸出一行 DIGEST_PREFIX + 雜湊值；遠端沒有 sha256sum / shasum 時只解開不輸出雜湊
+    """
+    target = shlex.quote(root)
+    extract = f"tar -xzvf - -C {target}"
+    return (
+        f"mkdir -p {target} || exit 1; "
+        "if command -v sha256sum >/dev/null 2>&1; then h=sha256sum; "
+        "elif command -v shasum >/dev/null 2>&1; then h='shasum -a 256'; "
+        f"else exec {extract}; fi; "
+        "d=$(mktemp -d) || exit 1; trap 'rm -rf \"$d\"' EXIT; mkfifo \"$d/p\" || exit 1; "
+        "$h < \"$d/p\" > \"$d/h\" & "
+        f"tee \"$d/p\" | {extract}; s=$?; wait $!; "
+        f"echo \"{DIGEST_PREFIX}$(cut -d' ' -f1 \"$d/h\")\"; exit $s"
+    )
+
+
+class TarStreamError(Exception):
+    """
+    遠端解壓縮失敗或驗證不符
+    """
+
+
+def remote_has_tar(ssh):
+    """
+    檢查遠端是否有 tar 可用
+    """
+    try:
+        stdin, stdout, stderr = ssh.exec_command("command -v tar")
+        return stdout.channel.recv_exit_status() == 0
+    except Exception:
+        return False
+
+
+class ChannelWriter:
+    """
+    將 tar/gzip 串流直接寫入 SSH channel，同時計算壓縮後大小與 sha256
+    """
+
+    def __init__(self, channel, cancel_event=None, limiter=None):
+        """
+        :param limiter: transfer_scheduler.RateLimiter，None 表示不限速
+        """
+        self.channel = channel
+        self.cancel_event = cancel_event
+        self.limiter = limiter
+        self.bytes_sent = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise UploadCancelled("已取消")
+        if self.limiter is not None and not self.limiter.consume(len(data), self.cancel_event):
+            raise UploadCancelled("已取消")
+        self.channel.sendall(data)
+        self.digest.update(data)
+        self.bytes_sent += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class TarUploader:
+    """
+    以 tar.gz 串流上傳多個檔案，遠端以 tar 解開；不會在本地產生暫存檔
+
+    介面與 ParallelUploader 相同；遠端沒有 tar 時自動改用逐檔 SFTP 上傳。
+    """
+
+    def __init__(self, ssh, workers=4, cancel_event=None, compresslevel=6, dir_cache=None, scheduler=None):
+        """
+        :param ssh: 已連線的 paramiko.SSHClient
+        :param workers: 改用 SFTP 時的並行 channel 數
+        :param compresslevel: gzip 壓縮等級
+        :param dir_cache: RemoteDirCache，解開成功後記錄建立的資料夾
+        :param scheduler: TransferScheduler，決定 tar 內的檔案順序與限速
+        """
+        self.ssh = ssh
+        self.workers = workers
+        self.cancel_event = cancel_event
+        self.compresslevel = compresslevel
+        self.dir_cache = dir_cache
+        self.scheduler = scheduler
+        self.fell_back = False
+        self.stream_bytes = 0
+        self.stream_sha256 = None
+        # 遠端計算的串流 sha256 與本地一致時為 True；遠端無法計算時為 False（只核對檔案清單）
+        self.stream_verified = False
+
+    def upload_tree(self, local_dir, remote_root, on_result=None):
+        remote_dirs, files = plan_tree(local_dir, remote_root)
+        return self.upload_files(files, remote_dirs, on_result)
+
+    def upload_files(self, files, remote_dirs=(), on_result=None):
+        """
+        :param files: (local_path, remote_path, size) 清單
+        :param remote_dirs: 需建立的遠端資料夾（第一個為根目錄）
+        :return: UploadReport；驗證失敗時所有檔案都標記為失敗
+        """
+        if not remote_has_tar(self.ssh):
+            self.fell_back = True
+            uploader = ParallelUploader(self.ssh, self.workers, self.cancel_event, self.dir_cache, self.scheduler)
+            return uploader.upload_files(files, remote_dirs, on_result)
+
+        report = UploadReport()
+        start = time.perf_counter()
+        error = None
+        if files or remote_dirs:
+            try:
+                self._stream(files, remote_dirs)
+            except Exception as e:
+                error = e
+        report.elapsed = time.perf_counter() - start
+
+        for local_path, remote_path, size in files:
+            result = FileResult(local_path, remote_path, size, 0.0, error)
+            report.results.append(result)
+            if on_result:
+                on_result(result)
+        return report
+
+    def _stream(self, files, remote_dirs):
+        paths = list(remote_dirs) + [posixpath.dirname(remote_path) for _, remote_path, _ in files]
+        root = remote_dirs[0] if remote_dirs else posixpath.commonpath(paths)
+        if self.scheduler is not None:
+            # 遠端 tar 依串流順序寫入，排在後面的檔案（例如 index.html）最後才出現
+            files = [item for phase in self.scheduler.phases(files, root) for item in phase]
+        members = {posixpath.relpath(remote_path, root): local_path for local_path, remote_path, _ in files}
+        dir_members = [posixpath.relpath(d, root) for d in remote_dirs if d != root]
+
+        command = extract_command(root)
+        channel = self.ssh.get_transport().open_session()
+        try:
+            channel.exec_command(command)
+
+            # 邊傳送邊讀取 tar -v 的輸出，避免遠端輸出塞滿視窗造成互相等待
+            output = {"stdout": [], "stderr": []}
+            readers = [
+                threading.Thread(target=self._drain, args=(channel.recv, output["stdout"]), daemon=True),
+                threading.Thread(target=self._drain, args=(channel.recv_stderr, output["stderr"]), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+
+            writer = ChannelWriter(channel, self.cancel_event, self.scheduler.limiter if self.scheduler else None)
+            with gzip.GzipFile(fileobj=writer, mode="wb", compresslevel=self.compresslevel) as gz:
+                with tarfile.open(fileobj=gz, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                    for rel_dir in dir_members:
+                        info = tarfile.TarInfo(rel_dir)
+                        info.type = tarfile.DIRTYPE
+                        info.mode = 0o755
+                        info.mtime = int(time.time())
+                        tar.addfile(info)
+                    for arcname, local_path in members.items():
+                        tar.add(local_path, arcname=arcname, recursive=False)
+            channel.shutdown_write()
+
+            exit_status = channel.recv_exit_status()
+            for reader in readers:
+                reader.join()
+        finally:
+            channel.close()
+
+        stderr = b"".join(output["stderr"]).decode("utf-8", "replace")
+        if exit_status != 0:
+            raise TarStreamError(f"遠端 tar 解壓縮失敗（結束代碼 {exit_status}）：{stderr.strip()}")
+
+        # 遠端收到的串流 sha256 須與送出的一致；再比對 tar -v 列出的檔名，確認每個檔案都已寫入
+        local_digest = writer.digest.hexdigest()
+        remote_digest = None
+        listing = b"".join(output["stdout"]).decode("utf-8", "replace") + "\n" + stderr
+        extracted = set()
+        for line in listing.splitlines():
+            name = line.strip()
+            if name.startswith(DIGEST_PREFIX):
+                remote_digest = name[len(DIGEST_PREFIX):]
+                continue
+            if name.startswith("x "):
+                name = name[2:]
+            if name:
+                extracted.add(posixpath.normpath(name))
+        if remote_digest is not None and remote_digest != local_digest:
+            raise TarStreamError(f"遠端收到的串流 sha256 不符（本地 {local_digest[:16]}…，遠端 {remote_digest[:16]}…）")
+        if members and not extracted - {"."}:
+            raise TarStreamError("遠端 tar 沒有列出解開的檔案，無法確認檔案已寫入")
+        missing = [name for name in members if posixpath.normpath(name) not in extracted]
+        if missing:
+            raise TarStreamError(f"遠端缺少 {len(missing)} 個檔案，例如：{missing[0]}")
+
+        self.stream_bytes = writer.bytes_sent
+        self.stream_sha256 = local_digest
+        self.stream_verified = remote_digest is not None
+        if self.dir_cache is not None:
+            for remote_dir in remote_dirs:
+                self.dir_cache.learn(remote_dir)
+
+    @staticmethod
+    def _drain(recv, chunks):
+        while True:
+            data = recv(32768)
+            if not data:
+                break
+            chunks.append(data)
+
+
+def make_uploader(ssh, workers=4, cancel_event=None, transfer_mode="sftp", dir_cache=None, scheduler=None):
+    """
+    依傳輸方式建立上傳器（皆提供 upload_files / upload_tree）
+
+    :param dir_cache: RemoteDirCache，通常為連線池 session 的 dir_cache
+    :param scheduler: TransferScheduler，None 表示依走訪順序全速上傳
+    """
+    if transfer_mode == "tar":
+        return TarUploader(ssh, workers, cancel_event, dir_cache=dir_cache, scheduler=scheduler)
+    return ParallelUploader(ssh, workers, cancel_event, dir_cache, scheduler)
@@ -0,0 +1,132 @@
+# task_runner.py
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class TaskCancelled(Exception):
+    """
+    工作被使用者取消
+    """
+
+
+class TaskSignals(QObject):
+    """
+    背景工作回報給 GUI 執行緒的訊號
+    """
+    log = pyqtSignal(str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    done = pyqtSignal()
+
+
+class BackgroundTask(QRunnable):
+    """
+    在 QThreadPool 中執行的工作
+
+    fn 的第一個參數會收到此物件本身，可用 task.log() 回報訊息、
+    task.check_cancelled() 檢查是否被取消。
+    """
+
+    def __init__(self, fn, *args, name="", **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name or getattr(fn, "__name__", "task")
+        self.cancel_event = threading.Event()
+        self.signals = TaskSignals()
+
+    @property
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise TaskCancelled(f"{self.name} 已取消")
+
+    def log(self, message):
+        self.signals.log.emit(message)
+
+    def run(self):
+        try:
+            self.check_cancelled()
+            result = self.fn(self, *self.args, **self.kwargs)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            self.signals.done.emit()
+
+
+class TaskExecutor(QObject):
+    """
+    以 QThreadPool 排程背景工作；max_concurrent 為 1 時依序執行佇列中的工作
+    """
+    # 尚未結束的工作數改變時發出（主視窗顯示佇列狀態用）
+    queue_changed = pyqtSignal(int)
+
+    def __init__(self, max_concurrent=1):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_concurrent)
+        self._tasks = []
+
+    @property
+    def pending(self):
+        return len(self._tasks)
+
+    def submit(self, fn, *args, name="", on_log=None, on_finished=None, on_failed=None, **kwargs):
+        """
+        排入一個背景工作
+
+        :param fn: 工作函式，第一個參數為 BackgroundTask
+        :param on_log: 接收 task.log() 訊息的 slot（於 GUI 執行緒呼叫）
+        :param on_finished: 成功時收到 fn 的回傳值
+        :param on_failed: 發生例外時收到錯誤訊息
+        :return: BackgroundTask，可呼叫 cancel() 取消
+        """
+        task = BackgroundTask(fn, *args, name=name, **kwargs)
+        if on_log:
+            task.signals.log.connect(on_log)
+        if on_finished:
+            task.signals.finished.connect(on_finished)
+        if on_failed:
+            task.signals.failed.connect(on_failed)
+        task.signals.done.connect(lambda: self._forget(task))
+        self._tasks.append(task)
+        self.queue_changed.emit(self.pending)
+        self.pool.start(task)
+        return task
+
+    def _forget(self, task):
+        if task in self._tasks:
+            self._tasks.remove(task)
+        self.queue_changed.emit(self.pending)
+
+    def cancel_all(self):
+        """
+        取消所有尚未結束的工作（主視窗的「全部取消」）
+        """
+        for task in list(self._tasks):
+            task.cancel()
+
+
+_shared_executor = None
+
+
+def shared_executor():
+    """
+    各分頁共用的工作佇列；工作依序執行，避免同時 chdir 或搶同一個連線
+    """
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = TaskExecutor(max_concurrent=1)
+    return _shared_executor
@@ -0,0 +1,4 @@
+# tests/__init__.py
+"""
+單元測試（不需連線），於專案根目錄執行：python -m pytest -q tests
+"""
@@ -0,0 +1,110 @@
+# tests/test_pipelined_deploy.py
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pipelined_deploy
+from pipelined_deploy import RemoteStage
+from sftp_uploader import FileResult, UploadReport
+
+
+class FakeTarget:
+    """
+    RemoteStage 需要的 TargetDeploy 屬性（不連線）
+    """
+
+    def __init__(self):
+        self.ssh = None
+        self.sftp = None
+        self.keep_releases = 5
+        self.sftp_workers = 2
+        self.cancel_event = threading.Event()
+        self.transfer_mode = "sftp"
+        self.session = mock.Mock()
+        self.scheduler = None
+        self.uploader = None
+        self.messages = []
+
+    def target_root(self):
+        return "dist/pspf"
+
+    def log(self, message):
+        self.messages.append(message)
+
+
+class FakeUploader:
+    """
+    依序回傳預先安排的結果：fail 中的檔名上傳失敗，raises 為 True 時整批丟出例外
+    """
+
+    def __init__(self, plan, uploaded):
+        self.plan = plan
+        self.uploaded = uploaded
+
+    def upload_files(self, files, remote_dirs=(), on_result=None):
+        fail, raises = self.plan.pop(0)
+        if raises:
+            raise IOError("connection lost")
+        report = UploadReport()
+        for local_path, remote_path, size in files:
+            name = os.path.basename(local_path)
+            error = IOError("write failed") if name in fail else None
+            if error is None:
+                self.uploaded.append(name)
+            report.results.append(FileResult(local_path, remote_path, size, error=error))
+        return report
+
+
+class RemoteStageRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        for name in ("a.js", "b.js", "c.js", "d.js"):
+            with open(os.path.join(self.source, name), "w") as f:
+                f.write(name)
+        self.stage = RemoteStage(FakeTarget())
+        self.stage.staging_root = "dist/.pspf-releases/20260101-120000"
+        self.uploaded = []
+
+    def run_batches(self, plan, batches):
+        uploader = FakeUploader(plan, self.uploaded)
+        results = []
+        with mock.patch.object(pipelined_deploy, "make_uploader", return_value=uploader):
+            for rel_paths, final in batches:
+                try:
+                    results.append(self.stage.upload(rel_paths, self.source, final=final))
+                except IOError:
+                    results.append("raised")
+        return results
+
+    def test_failed_file_survives_later_successful_batch(self):
+        results = self.run_batches(
+            [({"a.js"}, False), (set(), False), (set(), False)],
+            [(["a.js", "b.js"], False), (["c.js"], False), ([], True)],
+        )
+        self.assertEqual(results, [1, 0, 0])
+        self.assertIn("a.js", self.uploaded)
+        self.assertEqual(self.stage.retry, set())
+
+    def test_raised_batch_is_retried_in_final_round(self):
+        results = self.run_batches(
+            [(set(), True), (set(), False), (set(), False)],
+            [(["a.js", "b.js"], False), (["c.js"], False), (["d.js"], True)],
+        )
+        self.assertEqual(results, ["raised", 0, 0])
+        self.assertEqual(sorted(self.uploaded), ["a.js", "b.js", "c.js", "d.js"])
+        self.assertEqual(self.stage.retry, set())
+
+    def test_final_round_reports_files_that_still_fail(self):
+        results = self.run_batches(
+            [({"a.js"}, False), ({"a.js"}, False)],
+            [(["a.js"], False), ([], True)],
+        )
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(self.stage.retry, {"a.js"})
+        self.assertEqual(len(self.stage.report.failed), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+# transfer_scheduler.py
+import posixpath
+import threading
+import time
+
+from build_cache import match_any
+
+# 檔案上傳順序
+UPLOAD_ORDERS = ("walk", "largest_first", "smallest_first")
+
+
+class RateLimiter:
+    """
+    token bucket 限速；同一個實例可由多個 channel、多台主機共用，限制總頻寬
+    """
+
+    def __init__(self, bytes_per_sec, burst=None):
+        """
+        :param bytes_per_sec: 每秒可送出的位元組數
+        :param burst: 閒置後可一次送出的最大位元組數（預設約 0.25 秒的量）
+        """
+        self.rate = float(bytes_per_sec)
+        self.capacity = float(burst or max(self.rate / 4, 256 * 1024))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_mbps(cls, mbps):
+        """
+        :param mbps: Mbit/s；None 或 0 表示不限速，回傳 None
+        """
+        return cls(mbps * 1000 * 1000 / 8) if mbps else None
+
+    def consume(self, amount, cancel_event=None):
+        """
+        取用 amount 個 token，不足時等待（先預支再等待，多個執行緒依序排隊）
+
+        :return: False 表示等待期間已取消
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            if cancel_event is not None and cancel_event.wait(min(remaining, 0.2)):
+                return False
+            if cancel_event is None:
+                time.sleep(remaining)
+
+
+class AdaptiveWindow:
+    """
+    依實際傳輸速度調整同時上傳的檔案數
+
+    每 interval 秒比較一次總傳輸速度：變快就沿同方向再調一格，變慢就反向，差不多則維持；
+    上傳失敗時減半，避免在連線不穩時持續加壓。
+    """
+
+    def __init__(self, maximum, minimum=1, initial=None, interval=1.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = max(self.minimum, min(self.maximum, initial or 2))
+        self.interval = interval
+        self.history = [self.limit]
+        self._active = 0
+        self._direction = 1
+        self._last_rate = None
+        self._bytes = 0
+        self._sample_start = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self, cancel_event=None):
+        """
+        等待可上傳的名額
+
+        :return: False 表示等待期間已取消
+        """
+        with self._cond:
+            while self._active >= self.limit:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                self._cond.wait(0.2)
+            self._active += 1
+            return True
+
+    def record(self, amount):
+        """
+        記錄送出的位元組數，到達取樣間隔時調整名額
+        """
+        with self._cond:
+            self._bytes += amount
+            elapsed = time.monotonic() - self._sample_start
+            if elapsed >= self.interval:
+                self._adjust(self._bytes / elapsed)
+
+    def release(self, ok=True):
+        with self._cond:
+            self._active -= 1
+            if not ok:
+                self._set_limit(self.limit // 2)
+                self._direction = 1
+                self._last_rate = None
+            self._cond.notify_all()
+
+    def _adjust(self, rate):
+        if self._last_rate is not None:
+            if rate < self._last_rate * 0.95:
+                self._direction = -self._direction
+            elif rate <= self._last_rate * 1.05:
+                self._direction = 0
+        if self._direction == 0:
+            # 差不多時維持不動，下一次從增加開始試
+            self._direction = 1
+        else:
+            self._set_limit(self.limit + self._direction)
+        self._last_rate = rate
+        self._bytes = 0
+        self._sample_start = time.monotonic()
+
+    def _set_limit(self, limit):
+        limit = max(self.minimum, min(self.maximum, limit))
+        if limit != self.limit:
+            self.limit = limit
+            self.history.append(limit)
+            self._cond.notify_all()
+
+
+class TransferScheduler:
+    """
+    上傳排程：決定檔案順序、總頻寬上限，以及是否自動調整並行數
+
+    由 ParallelUploader / TarUploader 使用；同一次部署的所有主機共用一個實例（共用限速）。
+    """
+
+    def __init__(self, limiter=None, adaptive=False, order="walk", priority=(), last=()):
+        """
+        :param limiter: RateLimiter，None 表示不限速
+        :param adaptive: 是否依傳輸速度自動調整並行數（上限為 sftp_workers）
+        :param order: UPLOAD_ORDERS 之一
+        :param priority: glob 清單，符合的檔案依清單順序最先上傳
+        :param last: glob 清單，符合的檔案等其他檔案都完成後才上傳（例如 index.html）
+        """
+        if order not in UPLOAD_ORDERS:
+            raise ValueError(f"不支援的 upload_order：{order}（可用：{', '.join(UPLOAD_ORDERS)}）")
+        self.limiter = limiter
+        self.adaptive = adaptive
+        self.order = order
+        self.priority = list(priority or ())
+        self.last = list(last or ())
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            RateLimiter.from_mbps(config.get("bandwidth_limit_mbps")),
+            config.get("adaptive_workers", False),
+            config.get("upload_order", "walk"),
+            config.get("upload_priority"),
+            config.get("upload_last"),
+        )
+
+    @property
+    def is_default(self):
+        return not (self.limiter or self.adaptive or self.order != "walk" or self.priority or self.last)
+
+    def describe(self):
+        parts = []
+        if self.limiter:
+            parts.append(f"限速 {self.limiter.rate * 8 / 1000 / 1000:g} Mbit/s")
+        if self.adaptive:
+            parts.append("自動調整並行數")
+        if self.order != "walk":
+            parts.append(f"順序 {self.order}")
+        if self.priority:
+            parts.append(f"優先 {', '.join(self.priority)}")
+        if self.last:
+            parts.append(f"最後 {', '.join(self.last)}")
+        return "🚦 上傳排程：" + "、".join(parts)
+
+    def phases(self, files, root=None):
+        """
+        排序要上傳的檔案；符合 last 的檔案另成第二批，需等第一批全部完成後才開始
+
+        :param files: (local_path, remote_path, size) 清單
+        :param root: 比對 glob 用的遠端根目錄，預設為所有檔案的共同上層
+        :return: 非空的批次清單
+        """
+        if not files:
+            return []
+        if root is None:
+            root = posixpath.commonpath([posixpath.dirname(item[1]) for item in files])
+
+        def rel(item):
+            return posixpath.relpath(item[1], root)
+
+        def rank(item):
+            path = rel(item)
+            for index, pattern in enumerate(self.priority):
+                if match_any(path, [pattern]):
+                    return index
+            return len(self.priority)
+
+        ordered = list(files)
+        if self.order == "largest_first":
+            ordered.sort(key=lambda item: -item[2])
+        elif self.order == "smallest_first":
+            ordered.sort(key=lambda item: item[2])
+        if self.priority:
+            ordered.sort(key=rank)
+        if not self.last:
+            return [ordered]
+        tail = [item for item in ordered if match_any(rel(item), self.last)]
+        head = [item for item in ordered if not match_any(rel(item), self.last)]
+        return [phase for phase in (head, tail) if phase]
+
+    def window(self, workers):
+        """
+        :return: AdaptiveWindow；未啟用或只有一個 channel 時回傳 None
+        """
+        return AdaptiveWindow(workers) if self.adaptive and workers > 1 else None